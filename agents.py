@@ -1,42 +1,101 @@
+import asyncio
+import logging
+import time
 from typing import TypedDict
 from langchain_core.documents import Document
-from langgraph.prebuilt import ToolNode
-from langchain_core.tools import Tool
 from langchain_core.messages.base import BaseMessage
-from langchain_community.tools.tavily_search import TavilySearchResults
-from vectordb import retriever
+from vectordb import get_retriever
 from dotenv import load_dotenv
-from graders import check_relevance , check_halluc , check_ans
-from llm_utils import run_fallback_chain, question_router
-from llm_utils import rag_chain
+from graders import grade_documents , agrade_documents , check_halluc , acheck_halluc , check_ans , acheck_ans
+from graders import check_verification , acheck_verification , acheck_halluc_and_ans
+from async_utils import run_sync
+from prefilter import prefilter_documents
+from local_router import local_route, log_router_decision
+from search_cache import get_search_cache
+from config import PREFILTER_ENABLED, SEARCH_CACHE_ENABLED, VERIFY_MODE
+from budget import budget_exhausted, get_stats, record_call
+from context import build_context, render
+from tokens import count_tokens
+from llm_utils import run_fallback_chain, arun_fallback_chain, get_question_router
+from llm_utils import get_rag_chain
 from typing import Union
+import registry
 
 load_dotenv()
+logger = logging.getLogger(__name__)
 
-tavily_search = TavilySearchResults()
-tool_executor = ToolNode(
-    tools=[
-        Tool(
-            name="VectorStore",
-            func=retriever.invoke if retriever is not None else lambda x: "Retriever not available",
-            description="Useful to search the vector database",
-        ),
-        Tool(
-            name="SearchEngine", 
-            func=tavily_search, 
-            description="Useful to search the web"
-        ),
-    ]
+# Returned when the budget runs out before any answer passed the hallucination check.
+NO_GROUNDED_ANSWER = (
+    "I could not find a reliable answer to this question in my sources. "
+    "Please try rephrasing it, or ask a medical professional."
 )
 
 
+@registry.register("tavily_search")
+def get_tavily_search():
+    from langchain_community.tools.tavily_search import TavilySearchResults
+
+    return TavilySearchResults()
+
+
+@registry.register("tool_executor")
+def get_tool_executor():
+    from langgraph.prebuilt import ToolNode
+    from langchain_core.tools import Tool
+
+    retriever = get_retriever()
+    return ToolNode(
+        tools=[
+            Tool(
+                name="VectorStore",
+                func=retriever.invoke if retriever is not None else lambda x: "Retriever not available",
+                description="Useful to search the vector database",
+            ),
+            Tool(
+                name="SearchEngine", 
+                func=get_tavily_search(), 
+                description="Useful to search the web"
+            ),
+        ]
+    )
+
+
 class AgentState(TypedDict):
     """The dictionary keeps track of the data required by the various nodes in the graph"""
 
     query: str
+    # The query embedded once per request (see query_embeddings.py), reused by
+    # the router, pre-filter, context compression and semantic cache.
+    query_vector: list
     chat_history:list[BaseMessage]
+    # Summary of the messages older than chat_history (see history.py).
+    history_summary: str
     generation: str
     documents: list[Document]
+    # Compressed context the latest generation was produced from; the
+    # answer graders check the generation against the same text.
+    context: str
+    # Set by the speculative router: the route it picked and the documents
+    # fetched ahead of time for it, consumed by the first visit of that node.
+    route: str
+    prefetched: dict
+    # Execution budget of the request and what it has used so far (see budget.py).
+    budget: dict
+    stats: dict
+    # Outcome of the last answer verification and the latest grounded answer.
+    verdict: str
+    best_generation: str
+
+
+def _use_prefetched(state: dict, node: str) -> dict:
+    """Documents fetched speculatively for `node`; each prefetch is used at most once."""
+    prefetched = dict(state["prefetched"])
+    documents = prefetched.pop(node)
+    logger.info("---USING PREFETCHED %s RESULTS---", node)
+    update = {"documents": documents, "prefetched": prefetched}
+    if node == "SearchEngine":
+        update["stats"] = _count_web_search(state, 0.0)
+    return update
 
 
 def retrieve_node(state: dict) -> dict[str, Union[list[Document], str]]:
@@ -47,6 +106,9 @@ def retrieve_node(state: dict) -> dict[str, Union[list[Document], str]]:
     return list[Document]
     """
     query = state["query"]
+    if "VectorStore" in (state.get("prefetched") or {}):
+        return _use_prefetched(state, "VectorStore")
+    retriever = get_retriever()
     if retriever is None:
         # Invoke Tavily search if retriever is not available
         search_results = web_search_node({"query": query})
@@ -58,131 +120,337 @@ def retrieve_node(state: dict) -> dict[str, Union[list[Document], str]]:
     return {"documents": documents}
 
 
+async def aretrieve_node(state: dict) -> dict[str, Union[list[Document], str]]:
+    query = state["query"]
+    if "VectorStore" in (state.get("prefetched") or {}):
+        return _use_prefetched(state, "VectorStore")
+    retriever = get_retriever()
+    if retriever is None:
+        search_results = await aweb_search_node({"query": query})
+        documents = search_results.get("documents", [])
+        if not documents:
+            return {"documents": [], "error": "No relevant documents found."}
+    else:
+        documents = await retriever.ainvoke(input=query)
+    return {"documents": documents}
+
+
 def fallback_node(state: dict):
     """
     Fallback to this node when there is no tool call
     """
     query = state["query"]
     chat_history = state["chat_history"]
-    generation = run_fallback_chain(query,chat_history)
+    generation = run_fallback_chain(query,chat_history, state.get("history_summary") or "")
     return {"generation": generation}
 
 
-def filter_documents_node(state: dict):
-    filtered_docs = list()
+async def afallback_node(state: dict):
+    generation = await arun_fallback_chain(
+        state["query"], state["chat_history"], state.get("history_summary") or ""
+    )
+    return {"generation": generation}
 
-    query = state["query"]
-    documents = state["documents"]
-    for i, doc in enumerate(documents, start=1):
-        grade = check_relevance(doc, query)
+
+def _prefilter(documents: list, query: str, query_vector=None) -> list:
+    if PREFILTER_ENABLED:
+        return prefilter_documents(documents, query, query_vector=query_vector)
+    return [None] * len(documents)
+
+
+def _keep_relevant(documents: list, grades: list) -> list:
+    filtered_docs = list()
+    for i, (doc, grade) in enumerate(zip(documents, grades), start=1):
         if grade == "relevant":
-            print(f"---CHUCK {i}: RELEVANT---")
+            logger.debug("---CHUNK %d: RELEVANT---", i)
             filtered_docs.append(doc)
         else:
-            print(f"---CHUCK {i}: NOT RELEVANT---")
-    return {"documents": filtered_docs}
+            logger.debug("---CHUNK %d: NOT RELEVANT---", i)
+    return filtered_docs
 
 
-def rag_node(state: dict):
+def _count_grading(state: dict, documents: list, graded: list) -> dict:
+    stats = get_stats(state)
+    query_tokens = count_tokens(state["query"])
+    for i in graded:
+        record_call(stats, "grader", count_tokens(documents[i].page_content) + query_tokens)
+    return stats
+
+
+def filter_documents_node(state: dict):
     query = state["query"]
     documents = state["documents"]
+    grades = _prefilter(documents, query, state.get("query_vector"))
 
-    generation = rag_chain.invoke({"query" : query,"context" : documents})
-    return {"generation": generation}
+    # Only the documents the embedding pre-filter is unsure about go to the LLM grader.
+    uncertain = [i for i, grade in enumerate(grades) if grade is None]
+    logger.info("---PRE-FILTER: %d OF %d CHUNKS DECIDED LOCALLY---", len(documents) - len(uncertain), len(documents))
+    for i, grade in zip(uncertain, grade_documents([documents[i] for i in uncertain], query)):
+        grades[i] = grade
+    return {"documents": _keep_relevant(documents, grades), "stats": _count_grading(state, documents, uncertain)}
 
 
-# def web_search_node(state: dict):
-#     query = state["query"]
-#     results = tavily_search.invoke(query)
-#     documents = [
-#         Document(page_content=doc["content"], metadata={"source": doc["url"]})
-#         for doc in results
-#     ]
-#     print(documents)
-#     return {"documents": documents}
-def web_search_node(state: dict):
+async def afilter_documents_node(state: dict):
     query = state["query"]
-    results = tavily_search.invoke(query)
-    
-    # Debug: Print the raw results before processing
-    print(f"🔍 [DEBUG] Raw results from tavily_search: {type(results)} - {results}")
+    documents = state["documents"]
+    # Embedding is CPU-bound, keep it off the event loop.
+    grades = await asyncio.to_thread(_prefilter, documents, query, state.get("query_vector"))
+
+    uncertain = [i for i, grade in enumerate(grades) if grade is None]
+    logger.info("---PRE-FILTER: %d OF %d CHUNKS DECIDED LOCALLY---", len(documents) - len(uncertain), len(documents))
+    if uncertain:
+        for i, grade in zip(uncertain, await agrade_documents([documents[i] for i in uncertain], query)):
+            grades[i] = grade
+    return {"documents": _keep_relevant(documents, grades), "stats": _count_grading(state, documents, uncertain)}
+
+
+def _assemble_context(state: dict) -> tuple:
+    """The context for rag_chain and the answer graders, and the tokens compression saved."""
+    context = build_context(state["documents"], state["query"], query_vector=state.get("query_vector"))
+    return context, max(0, count_tokens(render(state["documents"])) - count_tokens(context))
+
+
+def _count_generation(state: dict, context: str, saved: int, generation: str, elapsed: float) -> dict:
+    stats = get_stats(state)
+    if stats["generations"] > 0:
+        stats["retry_seconds"] += elapsed
+    stats["generations"] += 1
+    stats["context_tokens_saved"] = stats.get("context_tokens_saved", 0) + saved
+    input_tokens = count_tokens(state["query"]) + count_tokens(context)
+    logger.info("---RAG PROMPT: %d INPUT TOKENS, %d SAVED BY COMPRESSION---", input_tokens, saved)
+    record_call(stats, "rag", input_tokens, count_tokens(generation))
+    return stats
+
+
+def rag_node(state: dict):
+    query = state["query"]
+    context, saved = _assemble_context(state)
+
+    started = time.perf_counter()
+    generation = get_rag_chain().invoke({"query" : query,"context" : context})
+    stats = _count_generation(state, context, saved, generation, time.perf_counter() - started)
+    return {"generation": generation, "context": context, "stats": stats}
+
+
+async def arag_node(state: dict):
+    # Sentence embedding is CPU-bound, keep it off the event loop.
+    context, saved = await asyncio.to_thread(_assemble_context, state)
+    started = time.perf_counter()
+    generation = await get_rag_chain().ainvoke({"query": state["query"], "context": context})
+    stats = _count_generation(state, context, saved, generation, time.perf_counter() - started)
+    return {"generation": generation, "context": context, "stats": stats}
 
-    # Check and print each item in results
-    for idx, doc in enumerate(results):
-        print(f"🔍 [DEBUG] Item {idx}: Type: {type(doc)}, Value: {doc}")
 
-    # Processing results into Document objects
+def _search_results_to_documents(results) -> dict:
     try:
         documents = [
             Document(page_content=doc["content"], metadata={"source": doc["url"]})
             for doc in results
         ]
     except Exception as e:
-        print(f"❌ [ERROR] Exception while creating Document objects: {e}")
+        logger.error("Exception while creating Document objects: %s", e)
         return {"documents": []}  # Return empty list in case of error
-
-    print(f"✅ [DEBUG] Processed Documents: {documents}")
     return {"documents": documents}
 
 
+def _count_web_search(state: dict, elapsed: float, cache_tier=None) -> dict:
+    stats = get_stats(state)
+    if stats["web_searches"] > 0:
+        stats["retry_seconds"] += elapsed
+    stats["web_searches"] += 1
+    if cache_tier is not None:
+        logger.info("---WEB SEARCH CACHE HIT (%s)---", cache_tier)
+        stats["search_cache_hits"] = stats.get("search_cache_hits", 0) + 1
+    return stats
 
-def question_router_node(state: dict):
-    query = state["query"]
-    
-    try:
-        response = question_router.invoke({"query" : query})
-        print(f"🔍 [LOG] Router Response: {response}")
-    except Exception as e:
-        print(f"❌ [ERROR] Router failed: {str(e)}")
-        return "llm_fallback"
 
+def web_search_node(state: dict):
+    if "SearchEngine" in (state.get("prefetched") or {}):
+        return _use_prefetched(state, "SearchEngine")
+    started = time.perf_counter()
+    if SEARCH_CACHE_ENABLED:
+        results, tier = get_search_cache().search(state["query"], get_tavily_search())
+    else:
+        results, tier = get_tavily_search().invoke(state["query"]), None
+    stats = _count_web_search(state, time.perf_counter() - started, tier)
+    return {**_search_results_to_documents(results), "stats": stats}
+
+
+async def aweb_search_node(state: dict):
+    if "SearchEngine" in (state.get("prefetched") or {}):
+        return _use_prefetched(state, "SearchEngine")
+    started = time.perf_counter()
+    if SEARCH_CACHE_ENABLED:
+        results, tier = await get_search_cache().asearch(state["query"], get_tavily_search())
+    else:
+        results, tier = await get_tavily_search().ainvoke(state["query"]), None
+    stats = _count_web_search(state, time.perf_counter() - started, tier)
+    return {**_search_results_to_documents(results), "stats": stats}
+
+
+def _route_from_response(response) -> str:
+    logger.debug("Router Response: %r", response)
     if "tool_calls" not in response.additional_kwargs:
-        print("---No tool called---")
+        logger.info("---No tool called---")
         return "llm_fallback"
 
     if len(response.additional_kwargs["tool_calls"]) == 0:
-        raise "Router could not decide route!"
+        raise ValueError("Router could not decide route!")
 
     route = response.additional_kwargs["tool_calls"][0]["function"]["name"]
-    print(f"🚀 [LOG] Routing to: {route}")
     if route == "VectorStore":
-        print("---Routing to VectorStore---")
+        logger.info("---Routing to VectorStore---")
         return "VectorStore"
     elif route == "SearchEngine":
-        print("---Routing to SearchEngine---")
+        logger.info("---Routing to SearchEngine---")
         return "SearchEngine"
-    print("⚠️ Unknown route, defaulting to fallback.")
+    logger.warning("Unknown route %r, defaulting to fallback.", route)
     return "llm_fallback"
 
 
+def question_router_node(state: dict):
+    query = state["query"]
+    route = local_route(query, query_vector=state.get("query_vector"))
+    if route is not None:
+        return route
+    
+    try:
+        response = get_question_router().invoke({"query" : query})
+    except Exception as e:
+        logger.error("Router failed: %s", e)
+        return "llm_fallback"
+    route = _route_from_response(response)
+    log_router_decision(query, route)
+    return route
+
+
+async def aquestion_router_node(state: dict):
+    query = state["query"]
+    # Embedding is CPU-bound, keep it off the event loop.
+    route = await asyncio.to_thread(local_route, query, query_vector=state.get("query_vector"))
+    if route is not None:
+        return route
+
+    try:
+        response = await get_question_router().ainvoke({"query": query})
+    except Exception as e:
+        logger.error("Router failed: %s", e)
+        return "llm_fallback"
+    route = _route_from_response(response)
+    log_router_decision(query, route)
+    return route
+
+
 def should_generate(state: dict):
     filtered_docs = state["documents"]
     if not filtered_docs:
-        print("---All retrieved documents not relevant---")
-        return "SearchEngine"
+        logger.info("---All retrieved documents not relevant---")
+        reason = budget_exhausted(state, get_stats(state), "web_search")
+        if reason is None:
+            return "SearchEngine"
+        logger.info("---Budget exhausted (%s), not searching again---", reason)
+        # Keep the best answer so far, or answer without context if there is none.
+        return "end" if state.get("generation") else "fallback"
     else:
-        print("---Some retrieved documents are relevant---")
+        logger.info("---Some retrieved documents are relevant---")
         return "generate"
 
 
+def _verification_route(hallucination_grade: str, answer_relevance_grade: str) -> str:
+    if hallucination_grade == "no":
+        logger.info("---Hallucination check passed---")
+        if answer_relevance_grade == "yes":
+            logger.info("---Answer is relevant to question---")
+            return "useful"
+        else:
+            logger.info("---Answer is not relevant to question---")
+            return "not useful"
+    logger.info("---Hallucination check failed---")
+    return "generate"
+
+
 def hallucination_and_answer_relevance_check(state: dict):
     llm_response = state["generation"]
-    documents = state["documents"]
+    documents = state.get("context") or state["documents"]
     query = state["query"]
 
+    if VERIFY_MODE == "combined":
+        return _verification_route(*check_verification(documents, query, llm_response))
+    if VERIFY_MODE == "parallel":
+        return _verification_route(*run_sync(acheck_halluc_and_ans(documents, query, llm_response)))
+
     hallucination_grade = check_halluc(
         documents, llm_response
     )
     if hallucination_grade == "no":
-        print("---Hallucination check passed---")
-        answer_relevance_grade = check_ans(
-            query, llm_response
-        )
-        if answer_relevance_grade == "yes":
-            print("---Answer is relevant to question---\n")
-            return "useful"
-        else:
-            print("---Answer is not relevant to question---")
-            return "not useful"
-    print("---Hallucination check failed---")
-    return "generate"
+        # Only worth checking the answer once it is grounded.
+        return _verification_route(hallucination_grade, check_ans(query, llm_response))
+    return _verification_route(hallucination_grade, None)
+
+
+async def ahallucination_and_answer_relevance_check(state: dict):
+    llm_response = state["generation"]
+    documents = state.get("context") or state["documents"]
+    query = state["query"]
+
+    if VERIFY_MODE == "combined":
+        return _verification_route(*await acheck_verification(documents, query, llm_response))
+    if VERIFY_MODE == "parallel":
+        return _verification_route(*await acheck_halluc_and_ans(documents, query, llm_response))
+
+    hallucination_grade = await acheck_halluc(documents, llm_response)
+    if hallucination_grade == "no":
+        return _verification_route(hallucination_grade, await acheck_ans(query, llm_response))
+    return _verification_route(hallucination_grade, None)
+
+
+def _verified(state: dict, verdict: str) -> dict:
+    """
+    State update of the verify node. When the verdict asks for another
+    generation or web search but the budget is used up, stop with the best
+    answer so far instead: the latest grounded one, or NO_GROUNDED_ANSWER
+    rather than a generation the grader rejected as hallucinated.
+    """
+    stats = get_stats(state)
+    query_tokens = count_tokens(state["query"])
+    context_tokens = count_tokens(state.get("context") or render(state["documents"]))
+    generation_tokens = count_tokens(state["generation"])
+    if VERIFY_MODE == "combined":
+        record_call(stats, "verifier", query_tokens + context_tokens + generation_tokens)
+    else:
+        record_call(stats, "hallucination_grader", context_tokens + generation_tokens)
+        if VERIFY_MODE == "parallel" or verdict != "generate":
+            # Sequential mode skips the answer grader for hallucinated answers.
+            record_call(stats, "answer_grader", query_tokens + generation_tokens)
+    update = {"verdict": verdict, "stats": stats}
+    best_generation = state.get("best_generation")
+    if verdict == "not useful":
+        # Grounded in the documents, just not a good answer to the query.
+        update["best_generation"] = best_generation = state["generation"]
+
+    if verdict != "useful":
+        reason = budget_exhausted(state, stats, "generate" if verdict == "generate" else "web_search")
+        if reason is not None:
+            logger.info("---Budget exhausted (%s), returning the best answer so far---", reason)
+            stats["stopped"] = reason
+            update["verdict"] = "stop"
+            update["generation"] = best_generation or NO_GROUNDED_ANSWER
+    return update
+
+
+def verify_node(state: dict):
+    return _verified(state, hallucination_and_answer_relevance_check(state))
+
+
+async def averify_node(state: dict):
+    return _verified(state, await ahallucination_and_answer_relevance_check(state))
+
+
+def verdict_route(state: dict) -> str:
+    return state["verdict"]
+
+
+def __getattr__(name):
+    if name in ("tavily_search", "tool_executor"):
+        return registry.get(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
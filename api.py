@@ -0,0 +1,272 @@
+"""
+HTTP API around the LangGraph app.
+
+    uvicorn api:app --host 0.0.0.0 --port 8000 --workers 4
+
+POST /v1/chat          the answer as JSON
+POST /v1/chat/stream   server-sent events: "start", "node" (a graph node
+                       started; "rag" or "fallback" means the answer starts
+                       over), "token" (answer text), then "done" or "error"
+GET  /health/live      liveness probe
+GET  /health/ready     readiness probe: warm-up finished and the index holds chunks
+
+Each worker process builds the shared objects (index, retriever, LLM clients,
+compiled graph) once, in the background at startup, and serves every
+request with them. Workers share the on-disk index: the first one to open it
+syncs it under a file lock (vectordb.index_lock) and the others open it once
+that is done.
+"""
+import asyncio
+import json
+import logging
+import time
+from contextlib import asynccontextmanager, nullcontext
+from typing import Literal, Optional
+from fastapi import FastAPI, HTTPException
+from fastapi.responses import StreamingResponse
+from langchain_core.messages import AIMessage, HumanMessage
+from pydantic import BaseModel, Field
+import registry
+from budget import start_request, summarize
+from config import API_MAX_CONCURRENCY, API_QUEUE_TIMEOUT, API_REQUEST_TIMEOUT, SEMANTIC_CACHE_ENABLED, VECTOR_BACKEND
+from graph import get_app
+from llm_scheduler import batch
+from tracing import RequestTrace, configure_logging, start_metrics_server
+
+logger = logging.getLogger(__name__)
+
+_state = {"ready": False, "error": None, "slots": None, "in_flight": 0}
+
+
+class ChatMessage(BaseModel):
+    role: Literal["human", "ai"]
+    content: str
+
+
+class ChatRequest(BaseModel):
+    query: str = Field(..., min_length=1)
+    # Recent messages; older ones can be passed folded into history_summary.
+    chat_history: list[ChatMessage] = Field(default_factory=list)
+    history_summary: str = ""
+    # Batch requests' LLM calls wait behind every interactive one (llm_scheduler).
+    priority: Literal["interactive", "batch"] = "interactive"
+
+
+class ChatResponse(BaseModel):
+    request_id: str
+    answer: str
+    route: Optional[str] = None
+    cached: bool = False
+    stats: Optional[str] = None
+
+
+async def _warm_up():
+    try:
+        await asyncio.to_thread(registry.warm_up)
+        _state["ready"] = True
+        logger.info("Warm-up done, serving requests.")
+    except Exception as e:
+        _state["error"] = str(e) or type(e).__name__
+        logger.exception("Warm-up failed: %s", e)
+
+
+@asynccontextmanager
+async def lifespan(api: FastAPI):
+    configure_logging()
+    start_metrics_server()
+    _state["slots"] = asyncio.Semaphore(API_MAX_CONCURRENCY)
+    # In the background, so the liveness probe answers while the index loads.
+    warm_up = asyncio.create_task(_warm_up())
+    yield
+    warm_up.cancel()
+
+
+app = FastAPI(title="Medical RAG API", lifespan=lifespan)
+
+
+def _require_ready():
+    if not _state["ready"]:
+        raise HTTPException(503, "The service is still warming up.", headers={"Retry-After": "5"})
+
+
+async def _acquire_slot() -> bool:
+    """Waits up to API_QUEUE_TIMEOUT for one of the API_MAX_CONCURRENCY slots."""
+    try:
+        await asyncio.wait_for(_state["slots"].acquire(), API_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        return False
+    _state["in_flight"] += 1
+    return True
+
+
+def _release_slot():
+    _state["in_flight"] -= 1
+    _state["slots"].release()
+
+
+def _priority(request: ChatRequest):
+    return batch() if request.priority == "batch" else nullcontext()
+
+
+def _inputs(request: ChatRequest, query_vector=None) -> dict:
+    history = [
+        HumanMessage(content=msg.content) if msg.role == "human" else AIMessage(content=msg.content)
+        for msg in request.chat_history
+    ]
+    inputs = {
+        "query": request.query,
+        "chat_history": history + [HumanMessage(content=request.query)],
+        "history_summary": request.history_summary,
+    }
+    if query_vector is not None:
+        inputs["query_vector"] = query_vector
+    return start_request(inputs)
+
+
+async def _lookup(query: str) -> tuple:
+    if not SEMANTIC_CACHE_ENABLED:
+        return None, None
+    from semantic_cache import lookup_answer
+
+    # Embedding and the FAISS search are CPU-bound.
+    return await asyncio.to_thread(lookup_answer, query)
+
+
+async def _remember(inputs: dict, query_vector, output: dict):
+    if SEMANTIC_CACHE_ENABLED:
+        from semantic_cache import remember_answer
+
+        await asyncio.to_thread(remember_answer, inputs, query_vector, output)
+
+
+@app.post("/v1/chat", response_model=ChatResponse)
+async def chat(request: ChatRequest) -> ChatResponse:
+    _require_ready()
+    if not await _acquire_slot():
+        raise HTTPException(503, "Too many requests in flight, retry later.", headers={"Retry-After": "1"})
+    trace = RequestTrace()
+    try:
+        entry, query_vector = await _lookup(request.query)
+        if entry is not None:
+            trace.finish({"cached": True})
+            return ChatResponse(request_id=trace.request_id, answer=entry["generation"], route="semantic_cache", cached=True)
+
+        inputs = _inputs(request, query_vector)
+        try:
+            with _priority(request):
+                output = await asyncio.wait_for(get_app().ainvoke(inputs, config=trace.config()), API_REQUEST_TIMEOUT)
+        except asyncio.TimeoutError as e:
+            trace.finish(error=e)
+            raise HTTPException(504, f"No answer within {API_REQUEST_TIMEOUT}s.")
+        except Exception as e:
+            trace.finish(error=e)
+            logger.exception("Request %s failed: %s", trace.request_id, e)
+            raise HTTPException(500, "The pipeline failed to answer.")
+
+        summary = trace.finish(output)
+        await _remember(inputs, query_vector, output)
+        return ChatResponse(
+            request_id=trace.request_id,
+            answer=output.get("generation") or "",
+            route=summary["route"],
+            stats=summarize(output["stats"]) if output.get("stats") else None,
+        )
+    finally:
+        _release_slot()
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def _stream(request: ChatRequest):
+    trace = RequestTrace()
+    # Taken inside the generator so a client that disconnects early cannot leak the slot.
+    if not await _acquire_slot():
+        yield _sse("error", {"status": 503, "detail": "Too many requests in flight, retry later."})
+        return
+    finished = False
+    try:
+        yield _sse("start", {"request_id": trace.request_id})
+        entry, query_vector = await _lookup(request.query)
+        if entry is not None:
+            trace.finish({"cached": True})
+            finished = True
+            yield _sse("done", {"answer": entry["generation"], "route": "semantic_cache", "cached": True})
+            return
+
+        inputs = _inputs(request, query_vector)
+        deadline = time.monotonic() + API_REQUEST_TIMEOUT
+        events = get_app().astream_events(inputs, config=trace.config(), version="v2")
+        output = {}
+        try:
+            while True:
+                try:
+                    # Set around the step, not across the yields: the graph's tasks inherit it.
+                    with _priority(request):
+                        event = await asyncio.wait_for(events.__anext__(), max(0.0, deadline - time.monotonic()))
+                except StopAsyncIteration:
+                    break
+                kind, name = event["event"], event["name"]
+                if kind == "on_chain_start" and (event.get("metadata") or {}).get("langgraph_node") == name:
+                    yield _sse("node", {"node": name})
+                elif kind == "on_chat_model_stream" and "answer" in event.get("tags", []):
+                    yield _sse("token", {"text": event["data"]["chunk"].content})
+                elif kind == "on_chain_end" and name == "LangGraph":
+                    output = event["data"]["output"]
+        except asyncio.TimeoutError as e:
+            trace.finish(error=e)
+            finished = True
+            yield _sse("error", {"status": 504, "detail": f"No answer within {API_REQUEST_TIMEOUT}s."})
+            return
+        finally:
+            await events.aclose()
+
+        summary = trace.finish(output)
+        finished = True
+        await _remember(inputs, query_vector, output)
+        yield _sse(
+            "done",
+            {
+                "answer": output.get("generation") or "",
+                "route": summary["route"],
+                "cached": False,
+                "stats": summarize(output["stats"]) if output.get("stats") else None,
+            },
+        )
+    except Exception as e:
+        if not finished:
+            trace.finish(error=e)
+        logger.exception("Request %s failed: %s", trace.request_id, e)
+        yield _sse("error", {"status": 500, "detail": "The pipeline failed to answer."})
+    finally:
+        _release_slot()
+
+
+@app.post("/v1/chat/stream")
+async def chat_stream(request: ChatRequest) -> StreamingResponse:
+    _require_ready()
+    return StreamingResponse(
+        _stream(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/health/live")
+async def live() -> dict:
+    return {"status": "ok"}
+
+
+@app.get("/health/ready")
+async def ready() -> dict:
+    if _state["error"]:
+        raise HTTPException(503, f"Warm-up failed: {_state['error']}")
+    _require_ready()
+    from vectordb import count_chunks, get_vector_store
+
+    vector_store = get_vector_store()
+    chunks = await asyncio.to_thread(count_chunks, vector_store) if vector_store is not None else 0
+    if not chunks:
+        raise HTTPException(503, "The vector index is empty.")
+    return {"status": "ready", "backend": VECTOR_BACKEND, "chunks": chunks, "in_flight": _state["in_flight"]}
@@ -1,8 +1,19 @@
 import asyncio
+import logging
 import traceback
 import streamlit as st
 from langchain_core.messages import AIMessage, HumanMessage
-from graph import app
+from graph import get_app
+from semantic_cache import lookup_answer, remember_answer
+from async_utils import iterate_sync
+from config import SEMANTIC_CACHE_ENABLED
+from budget import start_request, summarize
+from history import new_memory, recent_messages, fold_history
+from tracing import RequestTrace, configure_logging, start_metrics_server
+import registry
+
+configure_logging()
+logger = logging.getLogger(__name__)
 
 
 try:
@@ -13,13 +24,62 @@ except RuntimeError:
 def main():
     st.title("MEDICAL RAG Application") 
 
+
+@st.cache_resource(show_spinner="Loading the medical index and models...")
+def load_app():
+    # Built once per server process; Streamlit reruns reuse the cached objects.
+    start_metrics_server()
+    registry.warm_up()
+    return get_app()
+
+
+# Progress label shown while each graph node (or edge check) is running
+NODE_LABELS = {
+    "question_router_node": "🧭 Routing your question...",
+    "router": "🧭 Routing your question...",
+    "VectorStore": "📚 Searching the medical knowledge base...",
+    "SearchEngine": "🌐 Searching the web...",
+    "filter_docs": "🧪 Checking which sources are relevant...",
+    "rag": "✍️ Writing the answer...",
+    "fallback": "✍️ Writing the answer...",
+    "verify": "🔎 Verifying the answer...",
+}
+
+
+def stream_response(inputs: dict, status, placeholder, config: dict = None) -> dict:
+    """
+    Runs the graph with astream_events, showing node progress in `status` and
+    answer tokens in `placeholder` as they are generated. Returns the final state.
+    """
+    answer = ""
+    response = {}
+    for event in iterate_sync(app.astream_events(inputs, config=config, version="v2")):
+        kind, name = event["event"], event["name"]
+        if kind == "on_chain_start" and name in NODE_LABELS:
+            status.update(label=NODE_LABELS[name])
+            status.write(NODE_LABELS[name])
+            if name in ("rag", "fallback"):
+                # A retry regenerates the answer from scratch.
+                answer = ""
+        elif kind == "on_chat_model_stream" and "answer" in event.get("tags", []):
+            answer += event["data"]["chunk"].content
+            placeholder.markdown(answer + "▌")
+        elif kind == "on_chain_end" and name == "LangGraph":
+            response = event["data"]["output"]
+    return response
+
+
 st.title("MEDICAL RAG Application")
+app = load_app()
 
 # Initialize chat history
 if "chat_history" not in st.session_state:
     st.session_state.chat_history = [
         AIMessage(content="Hello, I am a bot. How can I help you?"),
     ]
+# Rolling summary of the messages that left the history window
+if "history_memory" not in st.session_state:
+    st.session_state.history_memory = new_memory()
 
 # Display conversation
 for message in st.session_state.chat_history:
@@ -39,31 +99,51 @@ if user_query:
     bot_reply = "I am unable to process your request."
     error_trace = None
 
+    memory = st.session_state.history_memory
+    inputs = start_request({
+        "query": user_query,
+        "chat_history": recent_messages(st.session_state.chat_history, memory),
+        "history_summary": memory["summary"],
+    })
+
     # Processing response
-    with st.status("🤖 Processing... Please wait!") as status:
+    with st.chat_message("AI"):
+        status = st.status("🤖 Processing... Please wait!")
+        placeholder = st.empty()
+        trace = RequestTrace()
         try:
-            response = app.invoke({
-                "query": user_query,
-                "chat_history": [msg for msg in st.session_state.chat_history]
-            })
-            
-            print(f"🔍 [DEBUG] Response from app.invoke(): {response}")     
-            bot_reply = response.get("generation", bot_reply)
+            entry, query_vector = lookup_answer(user_query) if SEMANTIC_CACHE_ENABLED else (None, None)
+            if query_vector is not None:
+                inputs["query_vector"] = query_vector
+            if entry is not None:
+                bot_reply = entry["generation"]
+                trace.finish({"cached": True})
+            else:
+                response = stream_response(inputs, status, placeholder, trace.config())
+                trace.finish(response)
+                bot_reply = response.get("generation", bot_reply)
+                if response.get("stats"):
+                    status.write(f"📊 {summarize(response['stats'])}")
+                if SEMANTIC_CACHE_ENABLED:
+                    remember_answer(inputs, query_vector, response)
 
         except Exception as e:
             error_trace = traceback.format_exc()  # Get full traceback
             bot_reply = f"⚠️ Error: {str(e)}"
-            print(f"❌ [ERROR] Exception occurred: {str(e)}")
-            print(f"📜 [TRACEBACK]\n{error_trace}")  
+            trace.finish(error=e)
+            logger.exception("Request failed: %s", e)
 
         status.update(label="✅ Response Ready!", state="complete", expanded=False)
-
-    # Display AI response
-    with st.chat_message("AI"):
-        st.markdown(bot_reply)
+        # Display AI response
+        placeholder.markdown(bot_reply)
 
     # Append AI response to chat history
     st.session_state.chat_history.append(AIMessage(content=bot_reply))
+    # After the reply is shown: fold what left the window into the summary.
+    try:
+        st.session_state.history_memory = fold_history(st.session_state.chat_history, memory)
+    except Exception as e:
+        logger.error("Could not update the conversation summary: %s", e)
 
     # Show error traceback if an error occurred
     if error_trace:
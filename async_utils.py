@@ -0,0 +1,47 @@
+import asyncio
+import threading
+
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def get_background_loop() -> asyncio.AbstractEventLoop:
+    """
+    A process-wide event loop running in a daemon thread.
+
+    All async LLM and HTTP clients are shared across threads and sessions, so
+    every coroutine runs on this one loop instead of a fresh loop per call.
+    """
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="async-worker", daemon=True).start()
+        return _loop
+
+
+def _check_not_on_loop(loop: asyncio.AbstractEventLoop):
+    try:
+        running = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    if running is loop:
+        raise RuntimeError("Blocking on the background loop from inside it would deadlock; await instead.")
+
+
+def run_sync(coro):
+    """Run a coroutine on the background loop and block until it finishes."""
+    loop = get_background_loop()
+    _check_not_on_loop(loop)
+    return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+
+def iterate_sync(agen):
+    """Iterate an async generator (e.g. `astream_events`) from synchronous code."""
+    loop = get_background_loop()
+    _check_not_on_loop(loop)
+    while True:
+        try:
+            yield asyncio.run_coroutine_threadsafe(agen.__anext__(), loop).result()
+        except StopAsyncIteration:
+            return
@@ -0,0 +1,94 @@
+"""
+Per-request execution budget and counters carried in AgentState.
+
+`budget` holds the limits of a request and `stats` what it has used so far.
+Nodes return an updated copy of `stats`; the routing decisions consult
+`budget_exhausted` before looping through rag or SearchEngine again.
+"""
+import time
+from config import MAX_GENERATIONS, MAX_WEB_SEARCHES, MAX_REQUEST_SECONDS, MAX_REQUEST_TOKENS
+
+
+def new_budget(**overrides) -> dict:
+    budget = {
+        "max_generations": MAX_GENERATIONS,
+        "max_web_searches": MAX_WEB_SEARCHES,
+        "max_seconds": MAX_REQUEST_SECONDS,
+        "max_tokens": MAX_REQUEST_TOKENS,
+    }
+    budget.update(overrides)
+    return budget
+
+
+def new_stats() -> dict:
+    return {
+        "started": time.time(),
+        "generations": 0,
+        "web_searches": 0,
+        # Web searches answered by the search cache.
+        "search_cache_hits": 0,
+        "tokens": 0,
+        "retry_seconds": 0.0,
+        "stopped": None,
+        # One {"chain", "input_tokens", "output_tokens"} entry per LLM call.
+        "llm_calls": [],
+        "context_tokens_saved": 0,
+    }
+
+
+def start_request(inputs: dict, **budget_overrides) -> dict:
+    """Graph inputs with a fresh budget and counters, so the deadline starts now."""
+    return {**inputs, "budget": new_budget(**budget_overrides), "stats": new_stats()}
+
+
+def get_budget(state: dict) -> dict:
+    return state.get("budget") or new_budget()
+
+
+def get_stats(state: dict) -> dict:
+    """A copy of the request counters, to be updated and returned by a node."""
+    return dict(state.get("stats") or new_stats())
+
+
+def record_call(stats: dict, chain: str, input_tokens: int, output_tokens: int = 0):
+    """Adds an LLM call of `chain` to `stats` (a copy from `get_stats`)."""
+    stats["tokens"] += input_tokens + output_tokens
+    call = {"chain": chain, "input_tokens": input_tokens, "output_tokens": output_tokens}
+    # New list: the copy from get_stats shares it with the previous state.
+    stats["llm_calls"] = stats.get("llm_calls", []) + [call]
+
+
+def budget_exhausted(state: dict, stats: dict, next_step: str):
+    """
+    Returns why `next_step` ('generate' or 'web_search') would exceed the
+    request's budget, or None if it is still allowed.
+    """
+    budget = get_budget(state)
+    if time.time() - stats["started"] >= budget["max_seconds"]:
+        return f"deadline of {budget['max_seconds']}s reached"
+    if stats["tokens"] >= budget["max_tokens"]:
+        return f"token budget of {budget['max_tokens']} used"
+    if next_step == "generate" and stats["generations"] >= budget["max_generations"]:
+        return f"{stats['generations']} generations done"
+    if next_step == "web_search" and stats["web_searches"] >= budget["max_web_searches"]:
+        return f"{stats['web_searches']} web searches done"
+    return None
+
+
+def summarize(stats: dict) -> str:
+    elapsed = time.time() - stats["started"]
+    summary = (
+        f"{stats['generations']} generation(s), {stats['web_searches']} web search(es), "
+        f"~{stats['tokens']} tokens, {elapsed:.1f}s ({stats['retry_seconds']:.1f}s in retries)"
+    )
+    calls = stats.get("llm_calls") or []
+    if calls:
+        per_call = ", ".join(f"{call['chain']} {call['input_tokens']}" for call in calls)
+        summary += f", {len(calls)} LLM call(s) with input tokens {per_call}"
+    if stats.get("search_cache_hits"):
+        summary += f", {stats['search_cache_hits']} web search(es) from the cache"
+    if stats.get("context_tokens_saved"):
+        summary += f", {stats['context_tokens_saved']} context tokens saved by compression"
+    if stats.get("stopped"):
+        summary += f", stopped early: {stats['stopped']}"
+    return summary
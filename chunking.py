@@ -0,0 +1,194 @@
+"""
+Structure-aware chunking of HTML pages.
+
+Boilerplate (scripts, navigation, footers, ads, "related articles" blocks) is
+removed, the remaining text is split along the page's headings and each
+section is packed into chunks of at most CHUNK_MAX_TOKENS LLM tokens, cutting
+at paragraph, then sentence, then word boundaries. Every chunk starts with
+its heading path, which is also kept in `metadata["section"]`.
+
+`simhash` and `NearDuplicateIndex` find near-duplicate chunks across pages
+so repeated text is indexed once.
+"""
+import hashlib
+import re
+from collections import defaultdict
+from config import (
+    CHUNK_MAX_TOKENS,
+    CHUNK_OVERLAP_TOKENS,
+    CHUNK_MIN_TOKENS,
+    CHUNK_DEDUP_DISTANCE,
+)
+from tokens import count_tokens, tokenizer_name
+
+BOILERPLATE_TAGS = ["script", "style", "noscript", "template", "nav", "footer", "aside", "form", "iframe", "svg", "button"]
+BOILERPLATE_ATTR = re.compile(
+    r"(^|[-_])(nav|navbar|menu|breadcrumbs?|footer|sidebar|related|recommended|ad|ads|advert\w*|"
+    r"sponsor\w*|promo\w*|share|social|newsletter|subscribe|cookie\w*|banner|modal|popup)([-_]|$)",
+    re.IGNORECASE,
+)
+HEADINGS = ["h1", "h2", "h3", "h4"]
+BLOCKS = ["p", "li", "dt", "dd", "td", "th", "blockquote", "pre", "figcaption"]
+SPLITTERS = [re.compile(r"(?<=[.!?])\s+"), re.compile(r"\s+")]
+
+
+def chunker_signature() -> str:
+    """
+    Changes whenever the chunks of an unchanged page would change, so indexed
+    pages are re-chunked after an upgrade, a settings change or when the
+    tokenizer in effect changes (e.g. it could not be loaded on this host).
+    """
+    return f"sections-v1/{tokenizer_name()}/{CHUNK_MAX_TOKENS}/{CHUNK_OVERLAP_TOKENS}/{CHUNK_MIN_TOKENS}"
+
+
+def _is_boilerplate(tag) -> bool:
+    if tag.name in BOILERPLATE_TAGS:
+        return True
+    if tag.name == "header" and tag.find_parent(["article", "main"]) is None:
+        return True  # site header; an article's own header holds its title
+    names = list(tag.get("class") or []) + [tag.get("id") or ""]
+    return any(BOILERPLATE_ATTR.search(name) for name in names if name)
+
+
+def _text(tag) -> str:
+    return " ".join(tag.get_text(" ", strip=True).split())
+
+
+def extract_sections(html: str) -> tuple:
+    """HTML -> (page title, [(heading path, [paragraphs])]) in document order."""
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    title = soup.title.string.strip() if soup.title and soup.title.string else ""
+    for tag in [tag for tag in soup.find_all(True) if _is_boilerplate(tag)]:
+        tag.extract()
+    root = soup.find("main") or soup.find("article") or soup.body or soup
+
+    sections, path, paragraphs = [], [], []
+    for tag in root.find_all(HEADINGS + BLOCKS):
+        if tag.name in BLOCKS and tag.find_parent(BLOCKS) is not None:
+            continue  # already part of the enclosing block's text
+        text = _text(tag)
+        if not text:
+            continue
+        if tag.name in HEADINGS:
+            if paragraphs:
+                sections.append((path, paragraphs))
+            path = path[: int(tag.name[1]) - 1] + [text]
+            paragraphs = []
+        else:
+            paragraphs.append(text)
+    if paragraphs:
+        sections.append((path, paragraphs))
+    if not sections and _text(root):
+        # No block markup: keep the page as a single section.
+        sections.append(([], [_text(root)]))
+    return title, sections
+
+
+def _pieces(text: str, max_tokens: int, level: int) -> list:
+    if level >= len(SPLITTERS) or count_tokens(text) <= max_tokens:
+        return [text]
+    return pack(SPLITTERS[level].split(text), max_tokens, level + 1)
+
+
+def pack(units: list, max_tokens: int, level: int = 0) -> list:
+    """Greedily joins `units` into pieces of at most `max_tokens`, splitting oversized units further."""
+    pieces, current, size = [], [], 0
+    for unit in units:
+        for part in _pieces(unit, max_tokens, level):
+            tokens = count_tokens(part)
+            if current and size + tokens > max_tokens:
+                pieces.append(" ".join(current))
+                current, size = [], 0
+            current.append(part)
+            size += tokens
+    if current:
+        pieces.append(" ".join(current))
+    return pieces
+
+
+def _overlap(text: str, max_tokens: int) -> str:
+    """The trailing sentences of `text` that fit in `max_tokens`."""
+    tail = []
+    for sentence in reversed(SPLITTERS[0].split(text)):
+        if count_tokens(" ".join([sentence] + tail)) > max_tokens:
+            break
+        tail.insert(0, sentence)
+    return " ".join(tail)
+
+
+def chunk_page(url: str, html: str, max_tokens: int = CHUNK_MAX_TOKENS, overlap_tokens: int = CHUNK_OVERLAP_TOKENS) -> tuple:
+    """Returns (page text, [chunk Documents]) for one page."""
+    from langchain_core.documents import Document
+
+    title, sections = extract_sections(html)
+    page_text, chunks = [], []
+    for path, paragraphs in sections:
+        section = " > ".join(path)
+        page_text.append("\n".join([section] + paragraphs))
+        budget = max(16, max_tokens - count_tokens(section) - overlap_tokens)
+        previous = ""
+        for body in pack(paragraphs, budget):
+            if count_tokens(body) < CHUNK_MIN_TOKENS:
+                continue
+            text = " ".join(filter(None, [_overlap(previous, overlap_tokens) if overlap_tokens else "", body]))
+            previous = body
+            metadata = {"source": url, "section": section}
+            if title:
+                metadata["title"] = title
+            chunks.append(Document(page_content=f"{section}\n{text}" if section else text, metadata=metadata))
+    return "\n\n".join(page_text), chunks
+
+
+def simhash(text: str) -> int:
+    """64-bit SimHash of the word 3-grams of `text`."""
+    words = re.findall(r"\w+", text.lower())
+    shingles = {" ".join(words[i : i + 3]) for i in range(max(1, len(words) - 2))}
+    votes = [0] * 64
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(64):
+            votes[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit, vote in enumerate(votes) if vote > 0)
+
+
+class NearDuplicateIndex:
+    """
+    SimHash fingerprints of indexed chunks, grouped by owner (source URL).
+
+    Fingerprints are bucketed by max_distance + 1 bit bands: two fingerprints
+    within max_distance bits agree on at least one band, so only those
+    buckets are compared.
+    """
+
+    def __init__(self, max_distance: int = CHUNK_DEDUP_DISTANCE):
+        self.max_distance = max_distance
+        bands = max(1, max_distance + 1)
+        edges = [round(i * 64 / bands) for i in range(bands + 1)]
+        self.bands = list(zip(edges[:-1], edges[1:]))
+        self.buckets = defaultdict(set)
+        self.owners = defaultdict(list)
+
+    def _keys(self, fingerprint: int) -> list:
+        return [(start, (fingerprint >> start) & ((1 << (end - start)) - 1)) for start, end in self.bands]
+
+    def add(self, owner: str, fingerprint: int):
+        self.owners[owner].append(fingerprint)
+        for key in self._keys(fingerprint):
+            self.buckets[key].add((fingerprint, owner))
+
+    def remove(self, owner: str):
+        for fingerprint in self.owners.pop(owner, []):
+            for key in self._keys(fingerprint):
+                self.buckets[key].discard((fingerprint, owner))
+
+    def find(self, fingerprint: int):
+        """Owner of an indexed near-duplicate of `fingerprint`, or None."""
+        if self.max_distance < 0:
+            return None
+        for key in self._keys(fingerprint):
+            for other, owner in self.buckets.get(key, ()):
+                if bin(fingerprint ^ other).count("1") <= self.max_distance:
+                    return owner
+        return None
@@ -6,3 +6,209 @@ load_dotenv()
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
+
+# Relevance grading: number of grader calls in flight per query and the
+# per-call timeout in seconds (a timed out document is graded irrelevant).
+GRADER_CONCURRENCY = int(os.getenv("GRADER_CONCURRENCY", "8"))
+GRADER_TIMEOUT = float(os.getenv("GRADER_TIMEOUT", "20"))
+
+# Embedding pre-filter in front of the relevance grader: documents whose cosine
+# similarity to the query is at least PREFILTER_ACCEPT are kept and those below
+# PREFILTER_REJECT are dropped without an LLM call. Calibrate both with
+# scripts/calibrate_prefilter.py.
+PREFILTER_ENABLED = os.getenv("PREFILTER_ENABLED", "1") == "1"
+PREFILTER_ACCEPT = float(os.getenv("PREFILTER_ACCEPT", "0.8"))
+PREFILTER_REJECT = float(os.getenv("PREFILTER_REJECT", "0.2"))
+
+# Semantic answer cache in front of the graph: a query whose embedding has a
+# cosine similarity of at least SEMANTIC_CACHE_THRESHOLD with a cached query
+# reuses its answer. Entries expire after SEMANTIC_CACHE_TTL seconds, the
+# least recently used ones are evicted beyond SEMANTIC_CACHE_MAX_ENTRIES, and
+# the whole cache is dropped when the vector store manifest changes.
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE_ENABLED", "1") == "1"
+SEMANTIC_CACHE_PATH = os.getenv("SEMANTIC_CACHE_PATH", "./semantic_cache")
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.95"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", str(24 * 3600)))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "1000"))
+
+# Exact-match LLM response cache. LLM_CACHE_CHAINS lists the chains whose
+# responses are cached: router, grader, hallucination_grader, answer_grader,
+# verifier, rag and fallback. Generation (rag, fallback) is opt-in.
+LLM_CACHE_CHAINS = set(
+    filter(None, os.getenv("LLM_CACHE_CHAINS", "router,grader,hallucination_grader,answer_grader,verifier").split(","))
+)
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "./llm_cache.sqlite")
+LLM_CACHE_MEMORY_SIZE = int(os.getenv("LLM_CACHE_MEMORY_SIZE", "512"))
+
+# Web search result cache (search_cache.py): results keyed on the normalized
+# query, kept SEARCH_CACHE_TTL seconds in a SQLite file ("" keeps them in
+# memory only), SEARCH_CACHE_MEMORY_SIZE of them in an in-process LRU and at
+# most SEARCH_CACHE_MAX_ENTRIES on disk. A new query is answered from the
+# full-text index of past results when at least SEARCH_CACHE_LOCAL_MIN_RESULTS
+# of them contain all its significant words (0 disables this).
+SEARCH_CACHE_ENABLED = os.getenv("SEARCH_CACHE_ENABLED", "1") == "1"
+SEARCH_CACHE_PATH = os.getenv("SEARCH_CACHE_PATH", "./search_cache.sqlite")
+SEARCH_CACHE_TTL = float(os.getenv("SEARCH_CACHE_TTL", str(6 * 3600)))
+SEARCH_CACHE_MEMORY_SIZE = int(os.getenv("SEARCH_CACHE_MEMORY_SIZE", "256"))
+SEARCH_CACHE_MAX_ENTRIES = int(os.getenv("SEARCH_CACHE_MAX_ENTRIES", "5000"))
+SEARCH_CACHE_LOCAL_MIN_RESULTS = int(os.getenv("SEARCH_CACHE_LOCAL_MIN_RESULTS", "3"))
+
+# LLM call scheduler (llm_scheduler.py) in front of the Groq API: token
+# buckets of LLM_REQUESTS_PER_MINUTE requests and LLM_TOKENS_PER_MINUTE tokens
+# (0 = unlimited) shared by every session of the process, granted by priority
+# (router, graders, generation, summaries; interactive before batch). The
+# limits apply per process: with N server workers on one API key, set them to
+# the key's limits divided by N. The scheduler is off unless
+# LLM_SCHEDULER_ENABLED=1 or one of the two limits is set. A call's
+# tokens are its prompt plus max_tokens, or LLM_EXPECTED_OUTPUT_TOKENS without
+# one. Responses 429 / 5xx are retried up to LLM_MAX_RETRIES times with
+# jittered exponential backoff from LLM_BACKOFF_BASE up to LLM_BACKOFF_MAX
+# seconds. LLM_MAX_CONNECTIONS bounds the shared HTTP connection pool.
+LLM_REQUESTS_PER_MINUTE = float(os.getenv("LLM_REQUESTS_PER_MINUTE", "0"))
+LLM_TOKENS_PER_MINUTE = float(os.getenv("LLM_TOKENS_PER_MINUTE", "0"))
+LLM_SCHEDULER_ENABLED = (
+    os.getenv("LLM_SCHEDULER_ENABLED", "1" if LLM_REQUESTS_PER_MINUTE or LLM_TOKENS_PER_MINUTE else "0") == "1"
+)
+LLM_EXPECTED_OUTPUT_TOKENS = int(os.getenv("LLM_EXPECTED_OUTPUT_TOKENS", "256"))
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "5"))
+LLM_BACKOFF_BASE = float(os.getenv("LLM_BACKOFF_BASE", "0.5"))
+LLM_BACKOFF_MAX = float(os.getenv("LLM_BACKOFF_MAX", "30"))
+LLM_MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "20"))
+
+# Speculative routing: start vector retrieval (and, with SPECULATIVE_WEB_SEARCH,
+# the Tavily search) while the router LLM call is in flight, then keep only the
+# branch the router picks.
+SPECULATIVE_ROUTING = os.getenv("SPECULATIVE_ROUTING", "1") == "1"
+SPECULATIVE_WEB_SEARCH = os.getenv("SPECULATIVE_WEB_SEARCH", "0") == "1"
+
+# Local query router: a scikit-learn classifier over query embeddings trained
+# on logged LLM router decisions (scripts/train_router.py). Its prediction is
+# used when its confidence reaches LOCAL_ROUTER_THRESHOLD; otherwise the LLM
+# router decides and its decision is appended to ROUTER_LOG_PATH.
+LOCAL_ROUTER_MODEL_PATH = os.getenv("LOCAL_ROUTER_MODEL_PATH", "./local_router.joblib")
+LOCAL_ROUTER_THRESHOLD = float(os.getenv("LOCAL_ROUTER_THRESHOLD", "0.9"))
+ROUTER_LOG_PATH = os.getenv("ROUTER_LOG_PATH", "./router_log.jsonl")
+
+# How a generated answer is verified:
+#   combined   - one LLM call grading hallucination and answer relevance together
+#   sequential - hallucination check, then answer check if it passed (two calls)
+#   parallel   - both checks at the same time (two concurrent calls)
+VERIFY_MODE = os.getenv("VERIFY_MODE", "combined")
+
+# Per-request execution budget. Once a limit is reached the graph stops
+# looping through rag/SearchEngine and returns the best answer so far.
+MAX_GENERATIONS = int(os.getenv("MAX_GENERATIONS", "3"))
+MAX_WEB_SEARCHES = int(os.getenv("MAX_WEB_SEARCHES", "2"))
+MAX_REQUEST_SECONDS = float(os.getenv("MAX_REQUEST_SECONDS", "60"))
+MAX_REQUEST_TOKENS = int(os.getenv("MAX_REQUEST_TOKENS", "30000"))
+
+# Corpus crawler: total and per-host concurrent requests, per-request timeout
+# in seconds, retries of failed requests, the directory holding the raw HTML
+# cache and validators (ETag / Last-Modified), and the number of processes
+# parsing and chunking pages (0 = one per CPU).
+CRAWL_CONCURRENCY = int(os.getenv("CRAWL_CONCURRENCY", "32"))
+CRAWL_PER_HOST = int(os.getenv("CRAWL_PER_HOST", "4"))
+CRAWL_TIMEOUT = float(os.getenv("CRAWL_TIMEOUT", "30"))
+CRAWL_RETRIES = int(os.getenv("CRAWL_RETRIES", "3"))
+CRAWL_CACHE_DIR = os.getenv("CRAWL_CACHE_DIR", "./crawl_cache")
+CRAWL_PARSE_WORKERS = int(os.getenv("CRAWL_PARSE_WORKERS", "0"))
+
+# Document embedding: sentence-transformers model, encode batch size, number of
+# encoding processes, and the on-disk cache of vectors keyed by (model, text
+# hash) stored as float32 or float16. The cache is compacted to its newest
+# rows once it holds more than EMBEDDING_CACHE_MAX_ROWS (0: unbounded). Text
+# embedded at query time (web results, context sentences) is not written to
+# it; the last EMBEDDING_TRANSIENT_CACHE_SIZE such vectors are kept in memory.
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "sentence-transformers/all-mpnet-base-v2")
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "1"))
+EMBEDDING_CACHE_DIR = os.getenv("EMBEDDING_CACHE_DIR", "./embedding_cache")
+EMBEDDING_CACHE_DTYPE = os.getenv("EMBEDDING_CACHE_DTYPE", "float32")
+EMBEDDING_CACHE_MAX_ROWS = int(os.getenv("EMBEDDING_CACHE_MAX_ROWS", "500000"))
+EMBEDDING_TRANSIENT_CACHE_SIZE = int(os.getenv("EMBEDDING_TRANSIENT_CACHE_SIZE", "4096"))
+
+# Query embedding: each request's query is embedded once and reused by every
+# stage. QUERY_EMBEDDING_BACKEND is "torch" (the document model), "onnx" or
+# "onnx-int8" (an ONNX export of it, the latter quantized for
+# QUERY_EMBEDDING_QUANTIZATION: avx2, avx512, avx512_vnni or arm64), exported
+# once to QUERY_EMBEDDING_ONNX_DIR; the ONNX backends need optimum[onnxruntime].
+# The last QUERY_EMBEDDING_CACHE_SIZE query vectors are kept in memory.
+QUERY_EMBEDDING_BACKEND = os.getenv("QUERY_EMBEDDING_BACKEND", "torch")
+QUERY_EMBEDDING_QUANTIZATION = os.getenv("QUERY_EMBEDDING_QUANTIZATION", "avx2")
+QUERY_EMBEDDING_ONNX_DIR = os.getenv("QUERY_EMBEDDING_ONNX_DIR", "./onnx_models")
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "1024"))
+
+# Retrieval: "dense" (vector search only) or "hybrid" (BM25 + vector search
+# fused with reciprocal rank fusion). RETRIEVER_CANDIDATES results are taken
+# from each side before fusion. Set RERANKER_MODEL to a sentence-transformers
+# cross-encoder (e.g. cross-encoder/ms-marco-MiniLM-L-6-v2) to rerank the top
+# RERANK_CANDIDATES fused results.
+RETRIEVER_MODE = os.getenv("RETRIEVER_MODE", "hybrid")
+RETRIEVER_K = int(os.getenv("RETRIEVER_K", "3"))
+RETRIEVER_CANDIDATES = int(os.getenv("RETRIEVER_CANDIDATES", "20"))
+RERANKER_MODEL = os.getenv("RERANKER_MODEL", "")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "10"))
+
+# Vector store backend: "chroma" or "faiss". The FAISS index is saved under
+# FAISS_INDEX_PATH and memory-mapped on load; FAISS_INDEX_TYPE is one of
+# "flat" (exact), "ivf", "ivfpq" (product-quantized, smallest) or "hnsw".
+# IVF variants fall back to flat below FAISS_MIN_TRAIN chunks; FAISS_NLIST = 0
+# picks ~4*sqrt(n) lists, FAISS_NPROBE of which are searched per query.
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+FAISS_INDEX_PATH = os.getenv("FAISS_INDEX_PATH", "./faiss_index")
+FAISS_INDEX_TYPE = os.getenv("FAISS_INDEX_TYPE", "flat")
+FAISS_NLIST = int(os.getenv("FAISS_NLIST", "0"))
+FAISS_NPROBE = int(os.getenv("FAISS_NPROBE", "16"))
+FAISS_PQ_M = int(os.getenv("FAISS_PQ_M", "48"))
+FAISS_HNSW_M = int(os.getenv("FAISS_HNSW_M", "32"))
+FAISS_MIN_TRAIN = int(os.getenv("FAISS_MIN_TRAIN", "10000"))
+
+# Tokenizer used to size chunks and prompts: a Hugging Face tokenizer matching
+# the LLM (the default is an ungated copy of Llama 3's). Gated models need
+# HF_TOKEN; if it cannot be loaded (or is set to "") tokens are estimated as
+# four characters each, and indexed pages are re-chunked once it loads again.
+TOKENIZER_MODEL = os.getenv("TOKENIZER_MODEL", "NousResearch/Meta-Llama-3-70B-Instruct")
+
+# Chunking: pages are split along their headings into chunks of at most
+# CHUNK_MAX_TOKENS tokens, consecutive chunks of a section share up to
+# CHUNK_OVERLAP_TOKENS tokens, and chunks shorter than CHUNK_MIN_TOKENS are
+# dropped. Chunks whose SimHash is within CHUNK_DEDUP_DISTANCE bits of an
+# indexed chunk are skipped as near-duplicates (-1 disables deduplication).
+CHUNK_MAX_TOKENS = int(os.getenv("CHUNK_MAX_TOKENS", "256"))
+CHUNK_OVERLAP_TOKENS = int(os.getenv("CHUNK_OVERLAP_TOKENS", "32"))
+CHUNK_MIN_TOKENS = int(os.getenv("CHUNK_MIN_TOKENS", "8"))
+CHUNK_DEDUP_DISTANCE = int(os.getenv("CHUNK_DEDUP_DISTANCE", "3"))
+
+# Context sent to the RAG prompt and the answer graders: at most
+# CONTEXT_MAX_TOKENS tokens, keeping the sentences most similar to the query
+# when the documents do not fit (0 sends the documents whole).
+CONTEXT_MAX_TOKENS = int(os.getenv("CONTEXT_MAX_TOKENS", "1500"))
+
+# Conversation history sent to the fallback chain: the last HISTORY_TURNS to
+# 2 * HISTORY_TURNS exchanges verbatim, older ones folded (HISTORY_TURNS at a
+# time) into a rolling summary of about
+# HISTORY_SUMMARY_TOKENS tokens; summary plus recent messages stay under
+# HISTORY_MAX_TOKENS.
+HISTORY_TURNS = int(os.getenv("HISTORY_TURNS", "4"))
+HISTORY_MAX_TOKENS = int(os.getenv("HISTORY_MAX_TOKENS", "1200"))
+HISTORY_SUMMARY_TOKENS = int(os.getenv("HISTORY_SUMMARY_TOKENS", "300"))
+
+# Logging and tracing: LOG_FORMAT "text" or "json" (one JSON object per line,
+# including a "request" record per graph run with node/LLM timings, tokens,
+# cache hits and retries). METRICS_PORT > 0 serves Prometheus metrics
+# (needs prometheus_client). LLM prices in USD per million tokens, for the
+# cost estimate. GRAPH_DEBUG=1 makes LangGraph print the full state at every
+# step (slow).
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "0"))
+LLM_INPUT_PRICE = float(os.getenv("LLM_INPUT_PRICE", "0.59"))
+LLM_OUTPUT_PRICE = float(os.getenv("LLM_OUTPUT_PRICE", "0.79"))
+GRAPH_DEBUG = os.getenv("GRAPH_DEBUG", "0") == "1"
+
+# HTTP API (api.py): at most API_MAX_CONCURRENCY graph runs at once per worker
+# process; a request waits up to API_QUEUE_TIMEOUT seconds for a slot (then
+# 503) and API_REQUEST_TIMEOUT seconds for its answer (then 504).
+API_MAX_CONCURRENCY = int(os.getenv("API_MAX_CONCURRENCY", "16"))
+API_QUEUE_TIMEOUT = float(os.getenv("API_QUEUE_TIMEOUT", "5"))
+API_REQUEST_TIMEOUT = float(os.getenv("API_REQUEST_TIMEOUT", "90"))
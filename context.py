@@ -0,0 +1,64 @@
+"""
+Context assembly for the RAG prompt and the graders that check its answer.
+
+Documents are rendered as numbered sources holding only their page content.
+When they do not fit in the token budget, the sentences most similar to the
+query (by embedding) are kept, in their original order, until it is used up.
+The same context string is sent to rag_chain and to the hallucination grader.
+"""
+import re
+from config import CONTEXT_MAX_TOKENS
+from tokens import count_tokens
+
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def _label(number: int, doc) -> str:
+    source = doc.metadata.get("source")
+    return f"[{number}] {source}" if source else f"[{number}]"
+
+
+def render(documents: list, sentences: dict = None) -> str:
+    """Numbered sources; `sentences` maps a document index to the sentences to keep."""
+    blocks = []
+    for i, doc in enumerate(documents):
+        if sentences is None:
+            text = doc.page_content
+        elif sentences.get(i):
+            text = " ".join(sentences[i])
+        else:
+            continue
+        blocks.append(f"{_label(i + 1, doc)}\n{text}")
+    return "\n\n".join(blocks)
+
+
+def build_context(documents: list, query: str, max_tokens: int = CONTEXT_MAX_TOKENS, query_vector=None) -> str:
+    full = render(documents)
+    if max_tokens <= 0 or count_tokens(full) <= max_tokens:
+        return full
+
+    from prefilter import cosine_similarities, embed_texts
+    from query_embeddings import embed_query
+
+    sentences = [
+        (i, sentence)
+        for i, doc in enumerate(documents)
+        for sentence in SENTENCE_BOUNDARY.split(doc.page_content)
+        if sentence.strip()
+    ]
+    if query_vector is None:
+        query_vector = embed_query(query)
+    scores = cosine_similarities(query_vector, embed_texts([s for _, s in sentences]))
+
+    budget = max_tokens - sum(count_tokens(_label(i + 1, doc)) for i, doc in enumerate(documents))
+    keep, used = set(), 0
+    for k in sorted(range(len(sentences)), key=lambda k: scores[k], reverse=True):
+        tokens = count_tokens(sentences[k][1])
+        if used + tokens <= budget:
+            keep.add(k)
+            used += tokens
+    selected = {}
+    for k in sorted(keep):
+        i, sentence = sentences[k]
+        selected.setdefault(i, []).append(sentence)
+    return render(documents, selected)
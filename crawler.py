@@ -0,0 +1,158 @@
+"""
+Concurrent corpus crawler with HTTP caching.
+
+Pages are fetched with aiohttp under a global and a per-host concurrency
+limit, with retries and per-URL failure isolation. Validators (ETag /
+Last-Modified) are kept so later crawls send conditional GETs, and raw HTML
+is stored in a content-addressed cache so a 304 is served locally. Parsing
+and chunking run in a process pool.
+"""
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import random
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from typing import NamedTuple, Optional
+from urllib.parse import urlsplit
+from config import (
+    CRAWL_CONCURRENCY,
+    CRAWL_PER_HOST,
+    CRAWL_TIMEOUT,
+    CRAWL_RETRIES,
+    CRAWL_CACHE_DIR,
+    CRAWL_PARSE_WORKERS,
+)
+
+logger = logging.getLogger(__name__)
+
+# Worth retrying: rate limiting and transient server errors.
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+HEADERS = {"User-Agent": "Mozilla/5.0 (compatible; Medical-ChatBot-RAG crawler)"}
+
+
+class CrawlResult(NamedTuple):
+    url: str
+    html: Optional[str]
+    not_modified: bool = False
+    error: Optional[str] = None
+
+
+class HtmlCache:
+    """Raw HTML stored by content hash, plus the HTTP validators of each URL."""
+
+    def __init__(self, cache_dir: str = CRAWL_CACHE_DIR):
+        self.cache_dir = cache_dir
+        self.state_path = os.path.join(cache_dir, "state.json")
+        os.makedirs(os.path.join(cache_dir, "html"), exist_ok=True)
+        self.state = {}
+        if os.path.exists(self.state_path):
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                self.state = json.load(f)
+
+    def _html_path(self, digest: str) -> str:
+        return os.path.join(self.cache_dir, "html", digest[:2], digest + ".html")
+
+    def validators(self, url: str) -> dict:
+        """Conditional request headers for `url`, if its cached copy is still on disk."""
+        entry = self.state.get(url)
+        if not entry or not os.path.exists(self._html_path(entry["sha256"])):
+            return {}
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def read(self, url: str) -> str:
+        with open(self._html_path(self.state[url]["sha256"]), "r", encoding="utf-8") as f:
+            return f.read()
+
+    def write(self, url: str, html: str, etag: Optional[str], last_modified: Optional[str]):
+        digest = hashlib.sha256(html.encode("utf-8")).hexdigest()
+        path = self._html_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                f.write(html)
+            os.replace(path + ".tmp", path)
+        self.state[url] = {"sha256": digest, "etag": etag, "last_modified": last_modified}
+
+    def save(self):
+        with open(self.state_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump(self.state, f, indent=2, sort_keys=True)
+        os.replace(self.state_path + ".tmp", self.state_path)
+
+
+async def _fetch(session, url: str, cache: HtmlCache, host_limits: dict) -> CrawlResult:
+    host = urlsplit(url).netloc
+    error = None
+    for attempt in range(CRAWL_RETRIES + 1):
+        if attempt:
+            # Exponential backoff with jitter.
+            await asyncio.sleep(min(30.0, 2 ** attempt) * random.uniform(0.5, 1.0))
+        try:
+            async with host_limits[host]:
+                async with session.get(url, headers=cache.validators(url)) as response:
+                    if response.status == 304:
+                        return CrawlResult(url, cache.read(url), not_modified=True)
+                    if response.status in RETRY_STATUSES:
+                        error = f"HTTP {response.status}"
+                        continue
+                    response.raise_for_status()
+                    html = await response.text(errors="replace")
+                    cache.write(url, html, response.headers.get("ETag"), response.headers.get("Last-Modified"))
+                    return CrawlResult(url, html)
+        except asyncio.TimeoutError:
+            error = "timeout"
+        except Exception as e:
+            error = str(e) or type(e).__name__
+            if getattr(e, "status", None) and e.status not in RETRY_STATUSES:
+                break  # e.g. 404: retrying will not help
+    logger.error("Failed to fetch %s: %s", url, error)
+    return CrawlResult(url, None, error=error)
+
+
+async def acrawl(urls: list, cache: Optional[HtmlCache] = None) -> list:
+    """Fetches every URL; one CrawlResult per URL in input order, failures included."""
+    import aiohttp
+
+    cache = cache or HtmlCache()
+    host_limits = defaultdict(lambda: asyncio.Semaphore(CRAWL_PER_HOST))
+    connector = aiohttp.TCPConnector(limit=CRAWL_CONCURRENCY, limit_per_host=CRAWL_PER_HOST)
+    timeout = aiohttp.ClientTimeout(total=CRAWL_TIMEOUT)
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=HEADERS) as session:
+        results = await asyncio.gather(*(_fetch(session, url, cache, host_limits) for url in urls))
+    cache.save()
+    return list(results)
+
+
+def crawl(urls: list, cache: Optional[HtmlCache] = None) -> list:
+    from async_utils import run_sync
+
+    return run_sync(acrawl(urls, cache))
+
+
+def _parse_and_split(args: tuple) -> tuple:
+    from chunking import simhash
+    from vectordb import split_page
+
+    url, html = args
+    page_hash, chunks = split_page(url, html)
+    return url, page_hash, chunks, {chunk_id: simhash(chunk.page_content) for chunk_id, chunk in chunks.items()}
+
+
+def parse_and_split(pages: list) -> list:
+    """
+    Parses and chunks (url, html) pairs in a process pool. Returns
+    (url, page hash, {chunk id: chunk}, {chunk id: SimHash}) per page.
+    """
+    if not pages:
+        return []
+    if len(pages) == 1:
+        return [_parse_and_split(pages[0])]
+    with ProcessPoolExecutor(max_workers=CRAWL_PARSE_WORKERS or None) as executor:
+        return list(executor.map(_parse_and_split, pages, chunksize=max(1, len(pages) // 64)))
@@ -0,0 +1,239 @@
+"""
+Document embedding engine with a persistent, memory-mapped vector cache.
+
+Vectors are keyed by (model name, sha256 of the text), so re-ingesting or
+re-chunking unchanged text costs no model compute. Texts that do miss are
+encoded in batches, optionally across several worker processes. Queries are
+embedded by query_embeddings.py; other text embedded at query time goes
+through `embed_transient`, which keeps it in a bounded in-memory LRU instead.
+"""
+import fcntl
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from config import (
+    EMBEDDING_MODEL,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_WORKERS,
+    EMBEDDING_CACHE_DIR,
+    EMBEDDING_CACHE_DTYPE,
+    EMBEDDING_CACHE_MAX_ROWS,
+    EMBEDDING_TRANSIENT_CACHE_SIZE,
+)
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Append-only store of vectors for one model.
+
+    Vectors live in a flat binary file that is memory-mapped for reads; a
+    SQLite table maps text hashes to rows. Writers from several processes are
+    serialized with an exclusive file lock; readers take it shared, so they
+    never pair the row map with a vector file that is being compacted. Past `max_rows` rows the file is compacted
+    to its newest three quarters (0 disables the limit).
+    """
+
+    def __init__(self, cache_dir: str, model_name: str, dtype: str = "float32", max_rows: int = EMBEDDING_CACHE_MAX_ROWS):
+        self.dir = os.path.join(cache_dir, re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name))
+        os.makedirs(self.dir, exist_ok=True)
+        self.dtype = np.dtype(dtype)
+        self.max_rows = max_rows
+        self.vectors_path = os.path.join(self.dir, f"vectors.{self.dtype.name}.bin")
+        self.meta_path = os.path.join(self.dir, "meta.json")
+        self._db = sqlite3.connect(os.path.join(self.dir, "index.sqlite"), check_same_thread=False)
+        self._db.execute("CREATE TABLE IF NOT EXISTS rows (hash TEXT PRIMARY KEY, row INTEGER NOT NULL)")
+        self._db.commit()
+        self._lock = threading.Lock()
+        self._mmap = None
+        self._mmap_inode = None
+        self.dim = None
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                self.dim = json.load(f)["dim"]
+
+    @contextmanager
+    def _file_lock(self, shared: bool = False):
+        with open(os.path.join(self.dir, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _rows_on_disk(self) -> int:
+        if self.dim is None or not os.path.exists(self.vectors_path):
+            return 0
+        return os.path.getsize(self.vectors_path) // (self.dim * self.dtype.itemsize)
+
+    def _vectors(self, min_rows: int):
+        """The memory map, re-opened when other writers have grown or compacted the file."""
+        inode = os.stat(self.vectors_path).st_ino
+        if self._mmap is None or self._mmap_inode != inode or self._mmap.shape[0] < min_rows:
+            rows = self._rows_on_disk()
+            self._mmap = np.memmap(self.vectors_path, dtype=self.dtype, mode="r", shape=(rows, self.dim))
+            self._mmap_inode = inode
+        return self._mmap
+
+    def get_many(self, hashes: list) -> dict:
+        """Cached vectors (as float32) for the hashes that are present."""
+        if self.dim is None or not hashes:
+            return {}
+        found = {}
+        with self._lock, self._file_lock(shared=True):
+            for start in range(0, len(hashes), 500):
+                batch = hashes[start:start + 500]
+                placeholders = ",".join("?" * len(batch))
+                found.update(
+                    self._db.execute(f"SELECT hash, row FROM rows WHERE hash IN ({placeholders})", batch).fetchall()
+                )
+            if not found:
+                return {}
+            vectors = self._vectors(max(found.values()) + 1)
+            return {h: np.asarray(vectors[row], dtype=np.float32) for h, row in found.items()}
+
+    def put_many(self, hashes: list, vectors: np.ndarray):
+        if not hashes:
+            return
+        vectors = np.asarray(vectors, dtype=self.dtype)
+        with self._lock, self._file_lock():
+            if self.dim is None:
+                self.dim = int(vectors.shape[1])
+                with open(self.meta_path, "w", encoding="utf-8") as f:
+                    json.dump({"dim": self.dim, "model_dir": self.dir}, f)
+            first_row = self._rows_on_disk()
+            with open(self.vectors_path, "ab") as f:
+                f.write(vectors.tobytes())
+            self._db.executemany(
+                "INSERT OR IGNORE INTO rows (hash, row) VALUES (?, ?)",
+                [(h, first_row + i) for i, h in enumerate(hashes)],
+            )
+            self._db.commit()
+            if self.max_rows and first_row + len(hashes) > self.max_rows:
+                self._compact(self.max_rows * 3 // 4)
+
+    def _compact(self, keep: int):
+        """Rewrites the file with the `keep` newest rows; called with both locks held."""
+        kept = self._db.execute("SELECT hash, row FROM rows ORDER BY row DESC LIMIT ?", (keep,)).fetchall()
+        kept.reverse()
+        vectors = np.memmap(self.vectors_path, dtype=self.dtype, mode="r", shape=(self._rows_on_disk(), self.dim))
+        tmp_path = f"{self.vectors_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(np.ascontiguousarray(vectors[[row for _, row in kept]]).tobytes())
+        del vectors
+        with self._db:
+            self._db.execute("DELETE FROM rows")
+            self._db.executemany("INSERT INTO rows (hash, row) VALUES (?, ?)", [(h, i) for i, (h, _) in enumerate(kept)])
+        os.replace(tmp_path, self.vectors_path)
+        self._mmap = None
+
+
+class CachedEmbeddings(Embeddings):
+    """sentence-transformers embeddings with batching, worker processes and an on-disk cache."""
+
+    def __init__(
+        self,
+        model_name: str = EMBEDDING_MODEL,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        workers: int = EMBEDDING_WORKERS,
+        cache_dir: str = EMBEDDING_CACHE_DIR,
+        cache_dtype: str = EMBEDDING_CACHE_DTYPE,
+    ):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.workers = workers
+        self.cache = EmbeddingCache(cache_dir, model_name, cache_dtype) if cache_dir else None
+        self.stats = {"cached": 0, "computed": 0}
+        self._transient = OrderedDict()  # text hash -> vector, least recently used first
+        self._transient_lock = threading.Lock()
+        self._model = None
+        self._model_lock = threading.Lock()
+
+    @property
+    def model(self):
+        """Loaded on first use: a worker whose index is up to date and whose queries go
+        through an ONNX backend never loads it."""
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+
+                    self._model = SentenceTransformer(self.model_name)
+        return self._model
+
+    def _encode(self, texts: list) -> np.ndarray:
+        if self.workers > 1 and len(texts) >= self.batch_size * self.workers:
+            pool = self.model.start_multi_process_pool(["cpu"] * self.workers)
+            try:
+                return self.model.encode_multi_process(texts, pool, batch_size=self.batch_size)
+            finally:
+                self.model.stop_multi_process_pool(pool)
+        return self.model.encode(texts, batch_size=self.batch_size, convert_to_numpy=True)
+
+    def embed_documents(self, texts: list) -> list:
+        hashes = [text_hash(text) for text in texts]
+        cached = self.cache.get_many(list(set(hashes))) if self.cache is not None else {}
+
+        missing = {}
+        for h, text in zip(hashes, texts):
+            if h not in cached and h not in missing:
+                missing[h] = text
+        if missing:
+            vectors = self._encode(list(missing.values()))
+            if self.cache is not None:
+                self.cache.put_many(list(missing), vectors)
+            cached.update(zip(missing, np.asarray(vectors, dtype=np.float32)))
+        self.stats["cached"] += len(texts) - len(missing)
+        self.stats["computed"] += len(missing)
+        return [cached[h].tolist() for h in hashes]
+
+    def embed_transient(self, texts: list) -> list:
+        """
+        `embed_documents` for text embedded at query time: misses are encoded
+        and kept in a bounded in-memory LRU, never written to the on-disk cache.
+        """
+        hashes = [text_hash(text) for text in texts]
+        found = {}
+        with self._transient_lock:
+            for h in hashes:
+                if h in self._transient:
+                    self._transient.move_to_end(h)
+                    found[h] = self._transient[h]
+        lookup = list(set(hashes) - found.keys())
+        if self.cache is not None and lookup:
+            found.update(self.cache.get_many(lookup))
+
+        missing = {}
+        for h, text in zip(hashes, texts):
+            if h not in found and h not in missing:
+                missing[h] = text
+        if missing:
+            vectors = self.model.encode(list(missing.values()), batch_size=self.batch_size, convert_to_numpy=True)
+            found.update(zip(missing, np.asarray(vectors, dtype=np.float32)))
+        with self._transient_lock:
+            for h in set(hashes):
+                self._transient[h] = found[h]
+                self._transient.move_to_end(h)
+            while len(self._transient) > EMBEDDING_TRANSIENT_CACHE_SIZE:
+                self._transient.popitem(last=False)
+        self.stats["cached"] += len(texts) - len(missing)
+        self.stats["computed"] += len(missing)
+        return [found[h].tolist() for h in hashes]
+
+    def encode_query(self, text: str) -> list:
+        return self.model.encode(text, convert_to_numpy=True).tolist()
+
+    def embed_query(self, text: str) -> list:
+        from query_embeddings import embed_query
+
+        return embed_query(text)
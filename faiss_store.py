@@ -0,0 +1,206 @@
+"""
+FAISS vector store backend.
+
+Chunks, their unit-length embeddings and an ANN index (flat, IVF, IVF-PQ or
+HNSW, inner product = cosine) are saved in one directory. On load the index
+and the vectors are memory-mapped read-only, so several worker processes
+serving the same directory share one copy of the pages.
+
+Updates are buffered: added vectors are kept in a list and deleted chunks are
+only marked, and `persist()` (called by ingestion once per sync) applies both
+in one pass and rebuilds the index.
+"""
+import json
+import math
+import os
+from typing import Any, Iterable, Optional
+import numpy as np
+from langchain_core.documents import Document
+from langchain_core.vectorstores import VectorStore
+from config import FAISS_INDEX_TYPE, FAISS_NLIST, FAISS_NPROBE, FAISS_PQ_M, FAISS_HNSW_M, FAISS_MIN_TRAIN
+
+
+def _normalize(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    if vectors.ndim == 1:
+        vectors = vectors.reshape(1, -1)
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def build_index(vectors: np.ndarray, index_type: str = FAISS_INDEX_TYPE):
+    """Builds (and trains) an inner-product index of `index_type` over unit-length vectors."""
+    import faiss
+
+    n, dim = vectors.shape
+    if index_type != "hnsw" and (index_type == "flat" or n < FAISS_MIN_TRAIN):
+        # Too few vectors to train IVF centroids; exact search is fast at this size anyway.
+        index = faiss.IndexFlatIP(dim)
+    elif index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dim, FAISS_HNSW_M, faiss.METRIC_INNER_PRODUCT)
+    else:
+        nlist = FAISS_NLIST or max(1, int(4 * math.sqrt(n)))
+        nlist = min(nlist, max(1, n // 39))
+        quantizer = faiss.IndexFlatIP(dim)
+        if index_type == "ivfpq":
+            m = FAISS_PQ_M if dim % FAISS_PQ_M == 0 else next(m for m in (64, 48, 32, 16, 8, 4, 2, 1) if dim % m == 0)
+            index = faiss.IndexIVFPQ(quantizer, dim, nlist, m, 8, faiss.METRIC_INNER_PRODUCT)
+        else:
+            index = faiss.IndexIVFFlat(quantizer, dim, nlist, faiss.METRIC_INNER_PRODUCT)
+        index.train(vectors)
+        index.nprobe = min(FAISS_NPROBE, nlist)
+    if n:
+        index.add(vectors)
+    return index
+
+
+class FaissStore(VectorStore):
+    """LangChain vector store over a persisted, memory-mapped FAISS index."""
+
+    def __init__(self, path: str, embedding, index_type: str = FAISS_INDEX_TYPE):
+        self.path = path
+        self.embedding = embedding
+        self.index_type = index_type
+        self.ids, self.texts, self.metadatas = [], [], []
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self._positions = {}  # chunk id -> position in ids / texts / metadatas
+        self._pending = []  # vectors added since the last persist, in order
+        self._deleted = set()  # positions deleted since the last persist
+        self.index = None
+        self._dirty = False
+        self._load()
+
+    @property
+    def embeddings(self):
+        return self.embedding
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        import faiss
+
+        if not os.path.exists(self._file("docs.json")):
+            return
+        with open(self._file("docs.json"), "r", encoding="utf-8") as f:
+            docs = json.load(f)
+        self.ids, self.texts, self.metadatas = docs["ids"], docs["texts"], docs["metadatas"]
+        self._positions = {chunk_id: i for i, chunk_id in enumerate(self.ids)}
+        self._pending, self._deleted = [], set()
+        self.vectors = np.load(self._file("vectors.npy"), mmap_mode="r")
+        self.index = None
+        if not os.path.exists(self._file("index.faiss")):
+            return
+        try:
+            self.index = faiss.read_index(self._file("index.faiss"), faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        except RuntimeError:
+            # Not every index type can be memory-mapped.
+            self.index = faiss.read_index(self._file("index.faiss"))
+        if hasattr(self.index, "nprobe"):
+            self.index.nprobe = min(FAISS_NPROBE, self.index.nlist)
+
+    def persist(self):
+        """Rebuilds the index from the current chunks and writes everything to disk."""
+        import faiss
+
+        if not self._dirty:
+            return
+        os.makedirs(self.path, exist_ok=True)
+        parts = [np.asarray(v, dtype=np.float32) for v in [self.vectors, *self._pending] if len(v)]
+        vectors = np.concatenate(parts) if parts else np.zeros((0, 0), dtype=np.float32)
+        if self._deleted:
+            keep = [i for i in range(len(self.ids)) if i not in self._deleted]
+            vectors = vectors[keep]
+            self.ids = [self.ids[i] for i in keep]
+            self.texts = [self.texts[i] for i in keep]
+            self.metadatas = [self.metadatas[i] for i in keep]
+        vectors = np.ascontiguousarray(vectors)
+        index = build_index(vectors, self.index_type) if len(vectors) else None
+        np.save(self._file("vectors.npy.tmp.npy"), vectors)
+        os.replace(self._file("vectors.npy.tmp.npy"), self._file("vectors.npy"))
+        if index is not None:
+            faiss.write_index(index, self._file("index.faiss.tmp"))
+            os.replace(self._file("index.faiss.tmp"), self._file("index.faiss"))
+        elif os.path.exists(self._file("index.faiss")):
+            os.remove(self._file("index.faiss"))
+        with open(self._file("docs.json.tmp"), "w", encoding="utf-8") as f:
+            json.dump({"ids": self.ids, "texts": self.texts, "metadatas": self.metadatas}, f)
+        os.replace(self._file("docs.json.tmp"), self._file("docs.json"))
+        self._dirty = False
+        self._load()
+
+    def count(self) -> int:
+        return len(self._positions)
+
+    def get(self, ids: Optional[list] = None, include: Optional[list] = None) -> dict:
+        """Chroma-compatible `get`: ids plus the requested "documents" / "metadatas"."""
+        include = ["documents", "metadatas"] if include is None else include
+        if ids is None:
+            positions = [i for i in range(len(self.ids)) if i not in self._deleted]
+        else:
+            positions = [self._positions[i] for i in ids if i in self._positions]
+        result = {"ids": [self.ids[i] for i in positions]}
+        if "documents" in include:
+            result["documents"] = [self.texts[i] for i in positions]
+        if "metadatas" in include:
+            result["metadatas"] = [self.metadatas[i] for i in positions]
+        return result
+
+    def add_texts(self, texts: Iterable[str], metadatas: Optional[list] = None, ids: Optional[list] = None, **kwargs: Any) -> list:
+        texts = list(texts)
+        if not texts:
+            return []
+        metadatas = metadatas or [{} for _ in texts]
+        ids = ids or [os.urandom(16).hex() for _ in texts]
+        self._pending.append(_normalize(self.embedding.embed_documents(texts)))
+        # Re-adding an id replaces the chunk.
+        self.delete([chunk_id for chunk_id in ids if chunk_id in self._positions])
+        for chunk_id in ids:
+            self._positions[chunk_id] = len(self.ids)
+            self.ids.append(chunk_id)
+        self.texts.extend(texts)
+        self.metadatas.extend(metadatas)
+        self._dirty = True
+        return ids
+
+    def delete(self, ids: Optional[list] = None, **kwargs: Any) -> Optional[bool]:
+        for chunk_id in ids or []:
+            position = self._positions.pop(chunk_id, None)
+            if position is not None:
+                self._deleted.add(position)
+                self._dirty = True
+        return True
+
+    def similarity_search_with_score_by_vector(self, embedding: list, k: int = 4) -> list:
+        """(Document, cosine similarity) pairs, best first."""
+        if self.index is None or not self._positions:
+            return []
+        query = _normalize(embedding)
+        # Approximate indexes fetch extra candidates and re-score them exactly
+        # against the memory-mapped vectors.
+        fetch = k if self.index_type == "flat" else 4 * k
+        _, positions = self.index.search(query, min(fetch, self.index.ntotal))
+        # The index covers the chunks as of the last persist; skip the ones deleted since.
+        positions = [int(p) for p in positions[0] if p >= 0 and p not in self._deleted]
+        scores = np.asarray(self.vectors[positions], dtype=np.float32) @ query[0]
+        ranked = sorted(zip(scores.tolist(), positions), reverse=True)[:k]
+        return [
+            (Document(page_content=self.texts[p], metadata=dict(self.metadatas[p] or {})), score)
+            for score, p in ranked
+        ]
+
+    def similarity_search_with_score(self, query: str, k: int = 4, **kwargs: Any) -> list:
+        return self.similarity_search_with_score_by_vector(self.embedding.embed_query(query), k)
+
+    def similarity_search(self, query: str, k: int = 4, **kwargs: Any) -> list:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+    def _select_relevance_score_fn(self):
+        # Scores are already cosine similarities.
+        return lambda score: score
+
+    @classmethod
+    def from_texts(cls, texts: list, embedding, metadatas: Optional[list] = None, path: str = "./faiss_index", **kwargs: Any):
+        store = cls(path, embedding, **kwargs)
+        store.add_texts(texts, metadatas=metadatas, ids=kwargs.get("ids"))
+        store.persist()
+        return store
@@ -1,9 +1,16 @@
+import asyncio
+import logging
 from pydantic import BaseModel, Field, validator
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnableParallel
 from operator import itemgetter
 from typing import Literal
-from llm_config import llm 
+from llm_config import get_chain_llm
+from async_utils import run_sync
+from config import GRADER_CONCURRENCY, GRADER_TIMEOUT
+import registry
+
+logger = logging.getLogger(__name__)
 
 
 class Grader(BaseModel):
@@ -32,28 +39,44 @@ grader_prompt = ChatPromptTemplate.from_messages(
 )
 
 # ✅ Define Grader Chain
-grader_chain = grader_prompt | llm.with_structured_output(Grader, method="json_mode")
+@registry.register("grader_chain")
+def get_grader_chain():
+    return grader_prompt | get_chain_llm("grader").with_structured_output(Grader, method="json_mode")
+
 
-def check_relevance( documents: list, query: str) -> str:
+async def agrade_documents(documents: list, query: str, concurrency: int = GRADER_CONCURRENCY, timeout: float = GRADER_TIMEOUT) -> list:
     """
-    Grades a list of retrieved documents for relevance to the query.
+    Grades every document for relevance to the query concurrently.
+
+    At most `concurrency` grader calls are in flight at once and each call is
+    bounded by `timeout` seconds. Returns one grade per document, in the order
+    of `documents`; a call that fails or times out counts as 'irrelevant'.
     """
+    grader_chain = get_grader_chain()
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def grade(doc) -> str:
+        async with semaphore:
+            try:
+                response = await asyncio.wait_for(
+                    grader_chain.ainvoke({"query": query, "context": doc.page_content}),
+                    timeout,
+                )
+                return response.grade
+            except asyncio.TimeoutError:
+                logger.warning("Grader timed out after %ss, treating document as irrelevant.", timeout)
+            except Exception as e:
+                logger.error("Grader failed: %s", e)
+            return "irrelevant"
+
+    return list(await asyncio.gather(*(grade(doc) for doc in documents)))
+
+
+def grade_documents(documents: list, query: str, concurrency: int = GRADER_CONCURRENCY, timeout: float = GRADER_TIMEOUT) -> list:
+    """Synchronous wrapper around `agrade_documents`."""
     if not documents:
-        print(" No docs")
-        return "irrelevant"  
-    
-    # for doc in documents:
-    #     response = grader_chain.invoke({"query": query, "context": doc.page_content})
-    #     print(f" Document: {doc.page_content[:100]}... | Grade: {response.grade}") 
-    for doc_tuple in documents:
-        doc = doc_tuple[0]  # Extract the first element (actual document)
-        response = grader_chain.invoke({"query": query, "context": doc})
-        print(f" Document: {doc[:100]}... | Grade: {response.grade}") 
-
-        if response.grade == "relevant":
-            return "relevant"
-    
-    return "irrelevant"
+        return []
+    return run_sync(agrade_documents(documents, query, concurrency, timeout))
 
 
     
@@ -81,33 +104,45 @@ hallucination_grader_prompt = ChatPromptTemplate.from_messages(
 )
 
 
-hallucination_grader_chain = (
-    RunnableParallel(
-        {
-            "response": itemgetter("response"),
-            # "context": lambda x: "\n\n".join([c.page_content for c in x["context"]]),
-            "context": lambda x: "\n\n".join(x["context"]) if isinstance(x["context"], list) else x["context"],
-        }
+@registry.register("hallucination_grader_chain")
+def get_hallucination_grader_chain():
+    return (
+        RunnableParallel(
+            {
+                "response": itemgetter("response"),
+                # "context": lambda x: "\n\n".join([c.page_content for c in x["context"]]),
+                "context": lambda x: "\n\n".join(x["context"]) if isinstance(x["context"], list) else x["context"],
+            }
+        )
+        | hallucination_grader_prompt
+        | get_chain_llm("hallucination_grader").with_structured_output(HallucinationGrader, method="json_mode")
     )
-    | hallucination_grader_prompt
-    | llm.with_structured_output(HallucinationGrader, method="json_mode")
-)
 
-def check_halluc(documents: list, llm_res: str) -> str:
+def context_text(documents) -> str:
+    """Grader context: the context string the answer was generated from, or the documents' contents."""
+    if isinstance(documents, str):
+        return documents
+    return "\n\n".join(doc.page_content for doc in documents)
+
+
+def check_halluc(documents, llm_res: str) -> str:
     """
     Checks if the LLM's response is hallucinated.
     Returns 'yes' if hallucinated, otherwise 'no'.
+    `documents` is a list of Documents or an assembled context string.
     """
-    # Extract document contents
-    # all_docs = [doc.page_content for doc in documents]
-    all_docs = lambda x:"\n\n".join([doc.page_content for doc in x["documents"]])
-    
     # Run hallucination grader
-    res = hallucination_grader_chain.invoke({ "response": llm_res, "context": all_docs})
-    print(f"🏷 Hallucination Grade: {res.grade}")  # Debugging print
+    res = get_hallucination_grader_chain().invoke({"response": llm_res, "context": context_text(documents)})
+    logger.debug("Hallucination Grade: %s", res.grade)
     return res.grade  # Returns "yes" (hallucinated) or "no" (not hallucinated)
 
 
+async def acheck_halluc(documents, llm_res: str) -> str:
+    res = await get_hallucination_grader_chain().ainvoke({"response": llm_res, "context": context_text(documents)})
+    logger.debug("Hallucination Grade: %s", res.grade)
+    return res.grade
+
+
     
 class AnswerGrader(BaseModel):
     "Binary score for an answer check based on a query."
@@ -132,11 +167,81 @@ answer_grader_prompt = ChatPromptTemplate.from_messages(
 )
 
 
-answer_grader_chain = answer_grader_prompt | llm.with_structured_output(
-    AnswerGrader, method="json_mode"
-)
+@registry.register("answer_grader_chain")
+def get_answer_grader_chain():
+    return answer_grader_prompt | get_chain_llm("answer_grader").with_structured_output(
+        AnswerGrader, method="json_mode"
+    )
 
 def check_ans(query : str , llm_res : str) -> str:
-    res = answer_grader_chain.invoke({"query" : query , "response" : llm_res})
+    res = get_answer_grader_chain().invoke({"query" : query , "response" : llm_res})
+
+    return res.grade
+
+
+async def acheck_ans(query: str, llm_res: str) -> str:
+    res = await get_answer_grader_chain().ainvoke({"query": query, "response": llm_res})
+    return res.grade
+
+
+class VerificationGrader(BaseModel):
+    "Hallucination and answer relevance grades of an llm's response, in one call."
+
+    hallucination: Literal["yes", "no"] = Field(
+        ..., description="'yes' if the llm's response is not based on the context otherwise 'no'"
+    )
+    answer: Literal["yes", "no"] = Field(
+        ..., description="'yes' if the llm's response is an actual answer to the query otherwise 'no'"
+    )
+
+
+verification_grader_system_prompt_template = (
+    "You are a grader assessing an llm's response to a query, given the context it was generated from.\n"
+    "hallucination: give 'yes' if the response is not based on the given context, otherwise 'no'.\n"
+    "answer: give 'yes' if the response actually answers the query, otherwise 'no'.\n"
+    "Just give the grades in json with 'hallucination' and 'answer' as keys, each with a binary value of 'yes' or 'no', without additional explanation"
+)
+
+verification_grader_prompt = ChatPromptTemplate.from_messages(
+    [
+        ("system", verification_grader_system_prompt_template),
+        ("human", "context: {context}\n\nquery: {query}\n\nllm's response: {response}"),
+    ]
+)
+
+
+@registry.register("verification_grader_chain")
+def get_verification_grader_chain():
+    return verification_grader_prompt | get_chain_llm("verifier").with_structured_output(
+        VerificationGrader, method="json_mode"
+    )
+
+
+def check_verification(documents, query: str, llm_res: str) -> tuple:
+    """
+    Grades hallucination and answer relevance in a single LLM call.
+    Returns (hallucination grade, answer grade).
+    """
+    context = context_text(documents)
+    res = get_verification_grader_chain().invoke({"context": context, "query": query, "response": llm_res})
+    logger.debug("Verification Grades: hallucination=%s, answer=%s", res.hallucination, res.answer)
+    return res.hallucination, res.answer
+
+
+async def acheck_verification(documents, query: str, llm_res: str) -> tuple:
+    context = context_text(documents)
+    res = await get_verification_grader_chain().ainvoke({"context": context, "query": query, "response": llm_res})
+    logger.debug("Verification Grades: hallucination=%s, answer=%s", res.hallucination, res.answer)
+    return res.hallucination, res.answer
+
+
+async def acheck_halluc_and_ans(documents, query: str, llm_res: str) -> tuple:
+    """Runs the separate hallucination and answer graders concurrently."""
+    return tuple(await asyncio.gather(acheck_halluc(documents, llm_res), acheck_ans(query, llm_res)))
+
 
-    return res.grade  
+def __getattr__(name):
+    # Chains used to be module-level objects; build them lazily on access instead.
+    if name in ("grader_chain", "hallucination_grader_chain", "answer_grader_chain", "verification_grader_chain"):
+        return registry.get(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
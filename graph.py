@@ -1,40 +1,72 @@
+from langchain_core.runnables import RunnableLambda
 from langgraph.graph import StateGraph, END
-from agents import retrieve_node , web_search_node , filter_documents_node, fallback_node , rag_node, question_router_node , AgentState , should_generate , hallucination_and_answer_relevance_check
-from io import BytesIO
-from PIL import Image
-from IPython.display import display
-
-workflow = StateGraph(AgentState)
-workflow.add_node("VectorStore", retrieve_node)
-workflow.add_node("SearchEngine", web_search_node)
-workflow.add_node("filter_docs", filter_documents_node)
-workflow.add_node("fallback", fallback_node)
-workflow.add_node("rag", rag_node)
-
-workflow.set_conditional_entry_point(
-    question_router_node,
-    {
+from agents import retrieve_node , web_search_node , filter_documents_node, fallback_node , rag_node, question_router_node , AgentState , should_generate
+from agents import aretrieve_node , aweb_search_node , afilter_documents_node , afallback_node , arag_node , aquestion_router_node
+from agents import verify_node , averify_node , verdict_route
+from config import SPECULATIVE_ROUTING, GRAPH_DEBUG
+import registry
+
+
+def sync_and_async(func, afunc) -> RunnableLambda:
+    """Node/edge that runs `func` under invoke/stream and `afunc` under ainvoke/astream_events."""
+    return RunnableLambda(func, afunc=afunc, name=func.__name__)
+
+
+def build_workflow() -> StateGraph:
+    workflow = StateGraph(AgentState)
+    workflow.add_node("VectorStore", sync_and_async(retrieve_node, aretrieve_node))
+    workflow.add_node("SearchEngine", sync_and_async(web_search_node, aweb_search_node))
+    workflow.add_node("filter_docs", sync_and_async(filter_documents_node, afilter_documents_node))
+    workflow.add_node("fallback", sync_and_async(fallback_node, afallback_node))
+    workflow.add_node("rag", sync_and_async(rag_node, arag_node))
+    workflow.add_node("verify", sync_and_async(verify_node, averify_node))
+
+    routes = {
         "llm_fallback": "fallback",
         "VectorStore": "VectorStore",
         "SearchEngine": "SearchEngine",
-    },
-)
+    }
+    if SPECULATIVE_ROUTING:
+        from speculative import speculative_router_node, aspeculative_router_node, route_decision
 
-workflow.add_edge("VectorStore", "filter_docs")
-workflow.add_edge("SearchEngine", "filter_docs")
-workflow.add_conditional_edges(
-    "filter_docs", should_generate, {"SearchEngine": "SearchEngine", "generate": "rag"}
-)
-workflow.add_conditional_edges(
-    "rag",
-    hallucination_and_answer_relevance_check,
-    {"useful": END, "not useful": "SearchEngine", "generate": "rag"},
-)
+        # The router becomes a node so retrieval can start while it is deciding.
+        workflow.add_node("router", sync_and_async(speculative_router_node, aspeculative_router_node))
+        workflow.set_entry_point("router")
+        workflow.add_conditional_edges("router", route_decision, routes)
+    else:
+        workflow.set_conditional_entry_point(
+            sync_and_async(question_router_node, aquestion_router_node), routes
+        )
 
-workflow.add_edge("fallback", END)
+    workflow.add_edge("VectorStore", "filter_docs")
+    workflow.add_edge("SearchEngine", "filter_docs")
+    # should_generate and verify stop looping once the request's budget is used up.
+    workflow.add_conditional_edges(
+        "filter_docs",
+        should_generate,
+        {"SearchEngine": "SearchEngine", "generate": "rag", "fallback": "fallback", "end": END},
+    )
+    workflow.add_edge("rag", "verify")
+    workflow.add_conditional_edges(
+        "verify",
+        verdict_route,
+        {"useful": END, "stop": END, "not useful": "SearchEngine", "generate": "rag"},
+    )
 
+    workflow.add_edge("fallback", END)
+    return workflow
 
-app = workflow.compile(debug=True)
 
+@registry.register("app")
+def get_app():
+    """Compile the graph once; the retriever and LLM clients are built by the nodes on first use."""
+    # Per-step state dumps are slow; tracing.RequestTrace records node timings instead.
+    return build_workflow().compile(debug=GRAPH_DEBUG)
 
 
+def __getattr__(name):
+    if name == "app":
+        return get_app()
+    if name == "workflow":
+        return build_workflow()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,90 @@
+"""
+Conversation memory for the fallback chain.
+
+The app keeps a small `memory` dict in the session: the rolling summary of
+the earlier conversation and how many messages it covers. Messages that
+fall out of the window of recent turns (or would push the history over its
+token ceiling) are folded into the summary by updating the previous summary
+rather than re-reading the whole conversation. Folds are batched: they wait
+until twice the window is unsummarized, so the summarizer runs about once
+every HISTORY_TURNS turns instead of on every turn.
+"""
+from langchain_core.messages import HumanMessage
+from config import HISTORY_TURNS, HISTORY_MAX_TOKENS, HISTORY_SUMMARY_TOKENS
+from tokens import count_tokens
+from chunking import pack
+
+SUMMARY_PREFIX = "Summary of the earlier conversation: "
+
+
+def new_memory() -> dict:
+    return {"summary": "", "summarized": 0}
+
+
+def format_message(msg) -> str:
+    return f"human: {msg.content}" if isinstance(msg, HumanMessage) else f"AI: {msg.content}"
+
+
+def truncate(text: str, max_tokens: int) -> str:
+    """The leading sentences (or words) of `text` that fit in `max_tokens`."""
+    return pack([text], max_tokens)[0] if text else ""
+
+
+def recent_messages(messages: list, memory: dict) -> list:
+    """The messages not folded into the summary yet."""
+    return messages[memory["summarized"]:]
+
+
+def _render(summary: str, lines: list) -> str:
+    text = "\n".join(lines)
+    if summary:
+        text = f"{SUMMARY_PREFIX}{summary}\n\n{text}"
+    return text
+
+
+def _fold_point(messages: list, memory: dict, turns: int, max_tokens: int) -> int:
+    start = memory["summarized"]
+    lines = [format_message(msg) for msg in messages]
+    summary = truncate(memory["summary"], HISTORY_SUMMARY_TOKENS)
+    if len(messages) - start < 4 * turns and count_tokens(_render(summary, lines[start:])) <= max_tokens:
+        return start
+    # Fold everything but the last `turns` exchanges in one call.
+    fold_to = max(start, len(messages) - 2 * turns)
+    # Fold more while the rendered history, with room for a full-size new
+    # summary, exceeds the ceiling; the newest message always stays.
+    reserved = count_tokens(f"{SUMMARY_PREFIX}\n\n") + HISTORY_SUMMARY_TOKENS
+    while fold_to < len(messages) - 1 and count_tokens("\n".join(lines[fold_to:])) + reserved > max_tokens:
+        fold_to += 1
+    return fold_to
+
+
+def fold_history(messages: list, memory: dict, turns: int = HISTORY_TURNS, max_tokens: int = HISTORY_MAX_TOKENS) -> dict:
+    """
+    Returns the memory after folding the messages that left the window of the
+    last `turns` exchanges into the summary (one summarizer call, or none).
+    Nothing is folded until 2 * `turns` exchanges are unsummarized or they
+    exceed the token ceiling.
+    """
+    from llm_utils import get_history_summarizer
+
+    fold_to = _fold_point(messages, memory, turns, max_tokens)
+    if fold_to == memory["summarized"]:
+        return memory
+    summary = get_history_summarizer().invoke(
+        {
+            "summary": memory["summary"] or "(none)",
+            "messages": "\n".join(format_message(msg) for msg in messages[memory["summarized"]:fold_to]),
+            "max_words": int(HISTORY_SUMMARY_TOKENS * 0.75),
+        }
+    )
+    return {"summary": truncate(summary.strip(), HISTORY_SUMMARY_TOKENS), "summarized": fold_to}
+
+
+def render_history(chat_history: list, summary: str = "", max_tokens: int = HISTORY_MAX_TOKENS) -> str:
+    """The summary plus the newest messages; the rendered text fits in `max_tokens`."""
+    summary = truncate(summary, HISTORY_SUMMARY_TOKENS) if summary else ""
+    lines = [format_message(msg) for msg in chat_history]
+    # Measured on the rendered text, so the prefix and separators count too.
+    while lines and count_tokens(_render(summary, lines)) > max_tokens:
+        lines.pop(0)
+    return _render(summary, lines)
@@ -0,0 +1,156 @@
+"""
+Hybrid retrieval: a BM25 inverted index over the same chunks as the vector
+store, fused with dense results by reciprocal rank fusion, with an optional
+cross-encoder rerank of the fused candidates.
+
+Exact terms (drug names, dosages, ICD-style codes) that dense embeddings blur
+are matched by BM25.
+"""
+import math
+import os
+import pickle
+import re
+from collections import Counter, defaultdict
+from typing import Any, Optional
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+import registry
+import vectordb
+from config import RETRIEVER_K, RETRIEVER_CANDIDATES, RERANKER_MODEL, RERANK_CANDIDATES
+
+# Keeps codes and dosages such as "e11.9", "icd-10" or "500mg" as single tokens.
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+(?:[.\-/][a-z0-9]+)*")
+bm25_path = vectordb.index_dir.rstrip("/\\") + "_bm25.pkl"
+
+
+def tokenize(text: str) -> list:
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    """Okapi BM25 over an inverted index of chunk texts."""
+
+    def __init__(self, ids: list, texts: list, metadatas: list, k1: float = 1.5, b: float = 0.75):
+        self.ids = ids
+        self.texts = texts
+        self.metadatas = metadatas
+        self.k1 = k1
+        self.b = b
+        self.postings = defaultdict(list)  # term -> [(doc index, term frequency)]
+        self.lengths = []
+        for i, text in enumerate(texts):
+            tokens = tokenize(text)
+            self.lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                self.postings[term].append((i, tf))
+        self.avg_length = sum(self.lengths) / len(self.lengths) if self.lengths else 0.0
+        n = len(texts)
+        self.idf = {
+            term: math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5)) for term, docs in self.postings.items()
+        }
+
+    def search(self, query: str, k: int) -> list:
+        """Top `k` (doc index, score) pairs."""
+        scores = defaultdict(float)
+        for term in set(tokenize(query)):
+            idf = self.idf.get(term)
+            if idf is None:
+                continue
+            for i, tf in self.postings[term]:
+                norm = self.k1 * (1 - self.b + self.b * self.lengths[i] / self.avg_length)
+                scores[i] += idf * tf * (self.k1 + 1) / (tf + norm)
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+@registry.register("bm25_index")
+def get_bm25_index() -> Optional[BM25Index]:
+    """The BM25 index of the vector store's chunks, rebuilt only when the manifest changed."""
+    vector_store = vectordb.get_vector_store()
+    if vector_store is None:
+        return None
+    fingerprint = vectordb.index_fingerprint()
+    if os.path.exists(bm25_path):
+        with open(bm25_path, "rb") as f:
+            saved_fingerprint, index = pickle.load(f)
+        if saved_fingerprint == fingerprint:
+            return index
+
+    data = vector_store.get(include=["documents", "metadatas"])
+    index = BM25Index(data["ids"], data["documents"], data["metadatas"])
+    # Per-process temporary file: several server workers may rebuild it at once.
+    tmp_path = f"{bm25_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump((fingerprint, index), f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, bm25_path)
+    return index
+
+
+@registry.register("reranker")
+def get_reranker():
+    if not RERANKER_MODEL:
+        return None
+    from sentence_transformers import CrossEncoder
+
+    return CrossEncoder(RERANKER_MODEL)
+
+
+def reciprocal_rank_fusion(rankings: list, k: int = 60) -> list:
+    """Fuses ranked lists of keys; returns keys by descending sum of 1 / (k + rank)."""
+    scores = defaultdict(float)
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, start=1):
+            scores[key] += 1.0 / (k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+def _chunk_key(doc: Document) -> str:
+    # Same hash the ingestion uses as the chunk id.
+    return vectordb.content_hash(f"{doc.metadata.get('source', '')}\n{doc.page_content}")
+
+
+class HybridRetriever(BaseRetriever):
+    """BM25 + dense retrieval with reciprocal rank fusion and optional cross-encoder rerank."""
+
+    vector_store: Any
+    bm25: Any
+    reranker: Any = None
+    k: int = RETRIEVER_K
+    candidates: int = RETRIEVER_CANDIDATES
+    rerank_candidates: int = RERANK_CANDIDATES
+    rrf_k: int = 60
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> list:
+        documents, dense_scores = {}, {}
+        dense_ranking = []
+        for doc, score in self.vector_store.similarity_search_with_relevance_scores(query, k=self.candidates):
+            key = _chunk_key(doc)
+            documents[key] = doc
+            dense_scores[key] = score
+            dense_ranking.append(key)
+
+        sparse_ranking = []
+        for i, _ in self.bm25.search(query, self.candidates):
+            doc = Document(page_content=self.bm25.texts[i], metadata=dict(self.bm25.metadatas[i] or {}))
+            key = _chunk_key(doc)
+            documents.setdefault(key, doc)
+            sparse_ranking.append(key)
+
+        fused = reciprocal_rank_fusion([dense_ranking, sparse_ranking], k=self.rrf_k)
+        if self.reranker is not None and len(fused) > 1:
+            head = fused[: self.rerank_candidates]
+            scores = self.reranker.predict([(query, documents[key].page_content) for key in head])
+            fused = [key for _, key in sorted(zip(scores, head), key=lambda item: item[0], reverse=True)]
+
+        results = []
+        for key in fused[: self.k]:
+            doc = documents[key]
+            metadata = {k: v for k, v in doc.metadata.items() if k != "relevance_score"}
+            if key in dense_scores:
+                # Only dense hits carry a cosine score; the pre-filter embeds the others.
+                metadata["relevance_score"] = dense_scores[key]
+            results.append(Document(page_content=doc.page_content, metadata=metadata))
+        return results
+
+
+def get_hybrid_retriever(vector_store) -> BaseRetriever:
+    return HybridRetriever(vector_store=vector_store, bm25=get_bm25_index(), reranker=get_reranker())
@@ -0,0 +1,105 @@
+"""
+Exact-match response cache for the LLM chains.
+
+Responses are content-addressed by the hash of the LangChain `llm_string`
+(model name, temperature and bound tools / response format) and the fully
+rendered prompt. Lookups go through an in-memory LRU first and then a SQLite
+table shared by every chain and process.
+"""
+import hashlib
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import Any, Optional
+from langchain_core.caches import BaseCache
+from langchain_core.load import dumps, loads
+from config import LLM_CACHE_CHAINS, LLM_CACHE_PATH, LLM_CACHE_MEMORY_SIZE
+from tracing import observe_llm_cache, record_cache_hit
+
+
+class ResponseCache(BaseCache):
+    """Two-tier (memory LRU + SQLite) LangChain cache with hit/miss counters."""
+
+    def __init__(self, path: Optional[str] = LLM_CACHE_PATH, memory_size: int = LLM_CACHE_MEMORY_SIZE, chain: str = ""):
+        self.path = path
+        self.chain = chain
+        self.memory_size = memory_size
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._conn = None
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False)
+            self._conn.execute("CREATE TABLE IF NOT EXISTS llm_cache (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            self._conn.commit()
+
+    @staticmethod
+    def _key(prompt: str, llm_string: str) -> str:
+        return hashlib.sha256(f"{llm_string}\n{prompt}".encode("utf-8")).hexdigest()
+
+    def _count(self, result: str):
+        self.stats[result] += 1
+        observe_llm_cache(self.chain, result)
+
+    def _remember(self, key: str, value: Any):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def lookup(self, prompt: str, llm_string: str) -> Optional[Any]:
+        key = self._key(prompt, llm_string)
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self._count("memory_hits")
+                record_cache_hit("memory")
+                return self._memory[key]
+            row = None
+            if self._conn is not None:
+                row = self._conn.execute("SELECT value FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self._count("misses")
+                return None
+            value = loads(row[0])
+            self._remember(key, value)
+            self._count("disk_hits")
+            record_cache_hit("disk")
+            return value
+
+    def update(self, prompt: str, llm_string: str, return_val: Any) -> None:
+        key = self._key(prompt, llm_string)
+        with self._lock:
+            self._remember(key, return_val)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value) VALUES (?, ?)", (key, dumps(return_val))
+                )
+                self._conn.commit()
+
+    def clear(self, **kwargs: Any) -> None:
+        with self._lock:
+            self._memory.clear()
+            if self._conn is not None:
+                self._conn.execute("DELETE FROM llm_cache")
+                self._conn.commit()
+
+
+_caches = {}
+_caches_lock = threading.Lock()
+
+
+def get_chain_cache(chain: str) -> Optional[ResponseCache]:
+    """The cache of `chain`, or None when caching is not enabled for it in LLM_CACHE_CHAINS."""
+    if chain not in LLM_CACHE_CHAINS:
+        return None
+    with _caches_lock:
+        if chain not in _caches:
+            _caches[chain] = ResponseCache(chain=chain)
+        return _caches[chain]
+
+
+def cache_stats() -> dict:
+    """Hit/miss counters per cached chain (also exported as medbot_llm_cache_lookups_total)."""
+    with _caches_lock:
+        return {chain: dict(cache.stats) for chain, cache in _caches.items()}
@@ -1,17 +1,58 @@
-from langchain_groq.chat_models import ChatGroq
 import os
 from dotenv import load_dotenv
+import registry
+from config import LLM_SCHEDULER_ENABLED
 
 # Load environment variables
 load_dotenv()
 
-# Check if GROQ_API_KEY is set
-if os.getenv("GROQ_API_KEY") is None:
-    raise ValueError("The GROQ_API_KEY environment variable must be set.")
 
-# Define LLM instance once
-llm = ChatGroq(
-    model="llama3-70b-8192",
-    temperature=0.75,
-    api_key=os.getenv("GROQ_API_KEY"),  # Load API key from .env
-)
+@registry.register("llm")
+def get_llm():
+    """Define LLM instance once, on first use."""
+    from langchain_groq.chat_models import ChatGroq
+
+    # Check if GROQ_API_KEY is set
+    if os.getenv("GROQ_API_KEY") is None:
+        raise ValueError("The GROQ_API_KEY environment variable must be set.")
+
+    clients = {}
+    if LLM_SCHEDULER_ENABLED:
+        from llm_scheduler import http_clients
+
+        # Shared, rate limited connection pools; the scheduler retries 429s itself.
+        http_client, http_async_client = http_clients()
+        clients = {"http_client": http_client, "http_async_client": http_async_client, "max_retries": 0}
+
+    return ChatGroq(
+        model="llama3-70b-8192",
+        temperature=0.75,
+        api_key=os.getenv("GROQ_API_KEY"),  # Load API key from .env
+        **clients,
+    )
+
+
+def get_chain_llm(chain: str):
+    """
+    The LLM to use in `chain`: the shared client, tagged with the chain name
+    for tracing and scheduling priority, with the exact-match response cache
+    attached when caching is enabled for that chain.
+    """
+    from llm_cache import get_chain_cache
+
+    update = {"tags": [f"chain:{chain}"]}
+    cache = get_chain_cache(chain)
+    if cache is not None:
+        update["cache"] = cache
+    if LLM_SCHEDULER_ENABLED:
+        from llm_scheduler import PriorityCallbackHandler
+
+        update["callbacks"] = [PriorityCallbackHandler()]
+    # Shallow copy: shares the underlying HTTP clients with the base instance.
+    return get_llm().model_copy(update=update)
+
+
+def __getattr__(name):
+    if name == "llm":
+        return get_llm()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
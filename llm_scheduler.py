@@ -0,0 +1,352 @@
+"""
+Rate-limit-aware scheduler for the LLM API calls.
+
+Every HTTP request of the shared Groq clients goes through a
+`SchedulingTransport`. It waits for a grant from the process-wide
+`LLMScheduler`, sends the request and retries it on 429, 5xx and connection
+errors with jittered exponential backoff.
+
+The scheduler keeps two token buckets, LLM_REQUESTS_PER_MINUTE requests and
+LLM_TOKENS_PER_MINUTE tokens. It grants waiting calls strictly by priority
+class, then in arrival order:
+
+    interactive router < graders < generation < summaries < batch (same order)
+
+The class of a call comes from its chain:<name> tag, which `PriorityCallbackHandler`
+puts in a context variable when the chat model starts. Code running bulk
+jobs wraps them in `with batch():`.
+
+The buckets follow the x-ratelimit-remaining-* headers of the responses, and a
+Retry-After on a 429 pauses every waiting call. The limits are per process:
+with several processes on one API key, configure each with its share of the
+key's limits; the headers then only correct the buckets downwards.
+"""
+import asyncio
+import contextvars
+import heapq
+import itertools
+import json
+import logging
+import random
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from typing import Any, Optional
+import httpx
+from langchain_core.callbacks import BaseCallbackHandler
+import registry
+from config import (
+    LLM_REQUESTS_PER_MINUTE,
+    LLM_TOKENS_PER_MINUTE,
+    LLM_MAX_RETRIES,
+    LLM_BACKOFF_BASE,
+    LLM_BACKOFF_MAX,
+    LLM_MAX_CONNECTIONS,
+    LLM_EXPECTED_OUTPUT_TOKENS,
+)
+from tokens import count_tokens
+from tracing import observe_llm_queue, observe_llm_rate_limited, record_queue_wait
+
+logger = logging.getLogger(__name__)
+
+# Lower is served first; unknown chains rank with generation.
+CHAIN_PRIORITY = {
+    "router": 0,
+    "grader": 1,
+    "hallucination_grader": 1,
+    "answer_grader": 1,
+    "verifier": 1,
+    "rag": 2,
+    "fallback": 2,
+    "summarizer": 3,
+}
+BATCH_OFFSET = 10
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+_chain = contextvars.ContextVar("llm_chain", default="llm")
+_mode = contextvars.ContextVar("llm_mode", default="interactive")
+
+
+@contextmanager
+def batch():
+    """LLM calls made inside the block queue behind every interactive call."""
+    token = _mode.set("batch")
+    try:
+        yield
+    finally:
+        _mode.reset(token)
+
+
+def current_class() -> tuple:
+    """(priority, label) of an LLM call made from the current context."""
+    chain, mode = _chain.get(), _mode.get()
+    priority = CHAIN_PRIORITY.get(chain, 2) + (BATCH_OFFSET if mode == "batch" else 0)
+    return priority, f"{mode}:{chain}"
+
+
+class PriorityCallbackHandler(BaseCallbackHandler):
+    """Records the chain of the chat model call about to be sent, for `current_class`."""
+
+    # Inline so the context variable is set in the context that sends the request.
+    run_inline = True
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, tags=None, **kwargs: Any):
+        _chain.set(next((tag.split(":", 1)[1] for tag in tags or [] if tag.startswith("chain:")), "llm"))
+
+    def on_llm_start(self, serialized, prompts, *, run_id, tags=None, **kwargs: Any):
+        self.on_chat_model_start(serialized, [], run_id=run_id, tags=tags, **kwargs)
+
+
+class TokenBucket:
+    """`limit` units per `window` seconds, refilled continuously up to `limit`; a limit of 0 means unlimited."""
+
+    def __init__(self, limit: float, window: float = 60.0):
+        self.capacity = float(limit)
+        self.rate = limit / window
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float, now: float) -> float:
+        """Seconds until `amount` can be taken (a request larger than the bucket waits for a full one)."""
+        if not self.capacity:
+            return 0.0
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def take(self, amount: float):
+        # May go negative for a request larger than the bucket; later ones wait for it.
+        if self.capacity:
+            self.level -= amount
+
+    def sync(self, remaining: float, now: float):
+        """Never assume more capacity than the server reports."""
+        if self.capacity:
+            self._refill(now)
+            self.level = min(self.level, remaining)
+
+
+class LLMScheduler:
+    """Grants LLM calls by priority within `requests` and `tokens` per `window` seconds."""
+
+    def __init__(
+        self,
+        requests: float = LLM_REQUESTS_PER_MINUTE,
+        tokens: float = LLM_TOKENS_PER_MINUTE,
+        window: float = 60.0,
+        max_retries: int = LLM_MAX_RETRIES,
+        backoff_base: float = LLM_BACKOFF_BASE,
+        backoff_max: float = LLM_BACKOFF_MAX,
+    ):
+        self.requests = TokenBucket(requests, window)
+        self.tokens = TokenBucket(tokens, window)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.stats = {"granted": 0, "rate_limited": 0, "retries": 0, "failed": 0}
+        self.waits = defaultdict(lambda: deque(maxlen=10000))  # class label -> recent queue waits in seconds
+        self._queue = []  # heap of (priority, seq, waiter)
+        self._depth = defaultdict(int)
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self._timer = None
+        self._lock = threading.Lock()
+
+    def queue_depth(self) -> dict:
+        with self._lock:
+            return {label: depth for label, depth in self._depth.items() if depth}
+
+    def _enqueue(self, cost: float, grant) -> dict:
+        priority, label = current_class()
+        waiter = {"cost": cost, "label": label, "grant": grant, "enqueued": time.monotonic(), "cancelled": False}
+        with self._lock:
+            heapq.heappush(self._queue, (priority, next(self._seq), waiter))
+            self._depth[label] += 1
+            observe_llm_queue(label, self._depth[label])
+            self._dispatch()
+        return waiter
+
+    def _dispatch(self):
+        """Grants waiters from the head of the queue while the buckets allow; called with the lock held."""
+        now = time.monotonic()
+        while self._queue:
+            _, _, waiter = self._queue[0]
+            if waiter["cancelled"]:
+                heapq.heappop(self._queue)
+                continue
+            wait = max(
+                self._paused_until - now, self.requests.wait_time(1, now), self.tokens.wait_time(waiter["cost"], now)
+            )
+            if wait > 0:
+                self._schedule(wait)
+                return
+            heapq.heappop(self._queue)
+            self.requests.take(1)
+            self.tokens.take(waiter["cost"])
+            self.stats["granted"] += 1
+            waited = now - waiter["enqueued"]
+            self.waits[waiter["label"]].append(waited)
+            self._depth[waiter["label"]] -= 1
+            observe_llm_queue(waiter["label"], self._depth[waiter["label"]], waited)
+            waiter["waited"] = waited
+            waiter["grant"]()
+
+    def _schedule(self, delay: float):
+        if self._timer is not None:
+            self._timer.cancel()
+        self._timer = threading.Timer(delay, self._on_timer)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def _on_timer(self):
+        with self._lock:
+            self._dispatch()
+
+    def _cancel(self, waiter: dict):
+        with self._lock:
+            if not waiter["cancelled"] and "waited" not in waiter:
+                waiter["cancelled"] = True
+                self._depth[waiter["label"]] -= 1
+                observe_llm_queue(waiter["label"], self._depth[waiter["label"]])
+
+    def acquire(self, cost: float) -> float:
+        """Blocks until the call may be sent; returns the seconds it waited."""
+        event = threading.Event()
+        waiter = self._enqueue(cost, event.set)
+        event.wait()
+        return waiter["waited"]
+
+    async def aacquire(self, cost: float) -> float:
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def grant():
+            loop.call_soon_threadsafe(lambda: granted.done() or granted.set_result(None))
+
+        waiter = self._enqueue(cost, grant)
+        try:
+            await granted
+        except asyncio.CancelledError:
+            self._cancel(waiter)
+            raise
+        return waiter["waited"]
+
+    def observe(self, response: httpx.Response):
+        """Follows the server's view of the limits from the response headers."""
+        now = time.monotonic()
+        headers = response.headers
+        with self._lock:
+            for bucket, header in (
+                (self.requests, "x-ratelimit-remaining-requests"),
+                (self.tokens, "x-ratelimit-remaining-tokens"),
+            ):
+                try:
+                    bucket.sync(float(headers[header]), now)
+                except (KeyError, ValueError):
+                    pass
+            if response.status_code == 429:
+                self.stats["rate_limited"] += 1
+                try:
+                    retry_after = float(headers.get("retry-after", ""))
+                except ValueError:
+                    retry_after = 0.0
+                if retry_after > 0:
+                    # Every waiting call holds off, not only the one that was refused.
+                    self._paused_until = max(self._paused_until, now + retry_after)
+        if response.status_code == 429:
+            observe_llm_rate_limited()
+
+    def backoff(self, attempt: int) -> float:
+        """Full-jitter exponential backoff before retry number `attempt` (from 0)."""
+        self.stats["retries"] += 1
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2**attempt))
+        # Not before a Retry-After pause is over.
+        return max(delay, self._paused_until - time.monotonic())
+
+
+def estimate_cost(request: httpx.Request) -> int:
+    """Tokens a chat completion request will count against the limit: prompt plus expected output."""
+    try:
+        body = json.loads(request.content or b"{}")
+    except ValueError:
+        return LLM_EXPECTED_OUTPUT_TOKENS
+    parts = [message.get("content") or "" for message in body.get("messages", [])]
+    if body.get("tools"):
+        parts.append(body["tools"])
+    prompt = "".join(part if isinstance(part, str) else json.dumps(part) for part in parts)
+    return count_tokens(prompt) + (body.get("max_tokens") or LLM_EXPECTED_OUTPUT_TOKENS)
+
+
+class SchedulingTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """httpx transport sending every request through `scheduler`, retrying rate-limited and failed ones."""
+
+    def __init__(self, scheduler: LLMScheduler, transport=None, async_transport=None):
+        limits = httpx.Limits(max_connections=LLM_MAX_CONNECTIONS, max_keepalive_connections=LLM_MAX_CONNECTIONS)
+        self.scheduler = scheduler
+        self.transport = transport or httpx.HTTPTransport(limits=limits)
+        self.async_transport = async_transport or httpx.AsyncHTTPTransport(limits=limits)
+
+    def _give_up(self, attempt: int, response: Optional[httpx.Response] = None) -> bool:
+        if attempt < self.scheduler.max_retries:
+            return False
+        self.scheduler.stats["failed"] += 1
+        if response is not None:
+            logger.warning("LLM call failed with HTTP %d after %d retries.", response.status_code, attempt)
+        return True
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        cost = estimate_cost(request)
+        for attempt in itertools.count():
+            record_queue_wait(self.scheduler.acquire(cost))
+            try:
+                response = self.transport.handle_request(request)
+            except httpx.TransportError:
+                if self._give_up(attempt):
+                    raise
+                time.sleep(self.scheduler.backoff(attempt))
+                continue
+            self.scheduler.observe(response)
+            if response.status_code not in RETRY_STATUSES or self._give_up(attempt, response):
+                return response
+            response.close()
+            time.sleep(self.scheduler.backoff(attempt))
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        cost = estimate_cost(request)
+        for attempt in itertools.count():
+            record_queue_wait(await self.scheduler.aacquire(cost))
+            try:
+                response = await self.async_transport.handle_async_request(request)
+            except httpx.TransportError:
+                if self._give_up(attempt):
+                    raise
+                await asyncio.sleep(self.scheduler.backoff(attempt))
+                continue
+            self.scheduler.observe(response)
+            if response.status_code not in RETRY_STATUSES or self._give_up(attempt, response):
+                return response
+            await response.aclose()
+            await asyncio.sleep(self.scheduler.backoff(attempt))
+
+    def close(self):
+        self.transport.close()
+
+    async def aclose(self):
+        await self.async_transport.aclose()
+
+
+@registry.register("llm_scheduler")
+def get_llm_scheduler():
+    return LLMScheduler()
+
+
+def http_clients(scheduler: Optional[LLMScheduler] = None, transport=None, async_transport=None) -> tuple:
+    """(httpx.Client, httpx.AsyncClient) sharing one connection pool each, behind the scheduler."""
+    scheduling = SchedulingTransport(scheduler or get_llm_scheduler(), transport, async_transport)
+    # The Groq SDK sets the timeout of every request itself.
+    return httpx.Client(transport=scheduling), httpx.AsyncClient(transport=scheduling)
@@ -1,17 +1,14 @@
-import os
-from llm_config import llm 
+from llm_config import get_chain_llm
 from langchain.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import StrOutputParser
 from operator import itemgetter
-from vectordb import get_retriever
-from langchain_core.messages import HumanMessage, AIMessage
+from history import render_history
 from models import VectorStore, SearchEngine
 from dotenv import load_dotenv
+import registry
 
 load_dotenv()
 
-retriever = get_retriever()
-
 rag_template_str = (
     "You are an AI-powered medical assistant. Your goal is to provide helpful and general medical information, "
     "but you are NOT a doctor. Always recommend consulting a qualified healthcare professional for medical concerns.\n\n"
@@ -33,8 +30,26 @@ fallback_prompt = ChatPromptTemplate.from_template(
 )
 
 rag_prompt = ChatPromptTemplate.from_template(rag_template_str)
-rag_chain = rag_prompt | llm | StrOutputParser()
 
+history_summary_prompt = ChatPromptTemplate.from_template(
+    (
+        "You maintain a running summary of a conversation between a user and a medical assistant AI.\n"
+        "Update the summary with the new messages. Keep what the user said about themselves, the questions they asked "
+        "and the information the assistant gave; drop greetings and small talk.\n"
+        "Answer with the updated summary only, in at most {max_words} words.\n\n"
+        "Current summary:\n{summary}\n\n"
+        "New messages:\n{messages}"
+    )
+)
+
+
+@registry.register("rag_chain")
+def get_rag_chain():
+    # Tagged so streaming consumers can tell answer tokens from grader tokens.
+    return (rag_prompt | get_chain_llm("rag") | StrOutputParser()).with_config(tags=["answer"])
+
+
+@registry.register("question_router")
 def get_question_router():
     """Creates a question router using LLM and tools."""
 
@@ -45,36 +60,59 @@ def get_question_router():
         "If a question is not related to health or medicine, output 'not medical' without using any tool.\n\n"
         "query: {query}"
     )
-    return ChatPromptTemplate.from_template(prompt_txt) | llm.bind_tools(tools=[VectorStore, SearchEngine])
+    return ChatPromptTemplate.from_template(prompt_txt) | get_chain_llm("router").bind_tools(tools=[VectorStore, SearchEngine])
 
-question_router = get_question_router()
 
 def run_rag_chain(query: str, retriever) -> str:
     """Runs the RAG chain to generate an answer based on retrieved medical context."""
-    context = retriever.invoke(query)
-    return rag_chain.invoke({"query": query, "context": context})
-
-fallback_chain = (
-    {
-        "chat_history": lambda x: "\n".join(
-            [
-                (
-                    f"human: {msg.content}"
-                    if isinstance(msg, HumanMessage)
-                    else f"AI: {msg.content}"
-                )
-                for msg in x["chat_history"]
-            ]
-        ),
-        "query": itemgetter("query"),
-    }
-    | fallback_prompt
-    | llm
-    | StrOutputParser()
-)
+    from context import build_context
+
+    context = build_context(retriever.invoke(query), query)
+    return get_rag_chain().invoke({"query": query, "context": context})
+
+
+@registry.register("fallback_chain")
+def get_fallback_chain():
+    return (
+        {
+            # Recent messages plus the summary of older ones, under a token ceiling.
+            "chat_history": lambda x: render_history(x["chat_history"], x.get("history_summary") or ""),
+            "query": itemgetter("query"),
+        }
+        | fallback_prompt
+        | get_chain_llm("fallback")
+        | StrOutputParser()
+    ).with_config(tags=["answer"])
 
-def run_fallback_chain(query: str, chat_history=None) -> str:
+
+@registry.register("history_summarizer")
+def get_history_summarizer():
+    return history_summary_prompt | get_chain_llm("summarizer") | StrOutputParser()
+
+
+def run_fallback_chain(query: str, chat_history=None, history_summary: str = "") -> str:
     """Runs the fallback chain for non-medical queries."""
     if chat_history is None:
         chat_history = []
-    return fallback_chain.invoke({"query": query, "chat_history": chat_history})
+    return get_fallback_chain().invoke(
+        {"query": query, "chat_history": chat_history, "history_summary": history_summary}
+    )
+
+
+async def arun_fallback_chain(query: str, chat_history=None, history_summary: str = "") -> str:
+    if chat_history is None:
+        chat_history = []
+    return await get_fallback_chain().ainvoke(
+        {"query": query, "chat_history": chat_history, "history_summary": history_summary}
+    )
+
+
+def __getattr__(name):
+    # Chains used to be module-level objects; build them lazily on access instead.
+    if name in ("rag_chain", "question_router", "fallback_chain", "history_summarizer"):
+        return registry.get(name)
+    if name == "retriever":
+        from vectordb import get_retriever
+
+        return get_retriever()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
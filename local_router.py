@@ -0,0 +1,59 @@
+"""
+Local query router: classifies a query into VectorStore / SearchEngine /
+llm_fallback from its sentence embedding, so that confident cases skip the
+LLM router call.
+"""
+import json
+import logging
+import os
+import threading
+import time
+import registry
+from query_embeddings import embed_query
+from config import LOCAL_ROUTER_MODEL_PATH, LOCAL_ROUTER_THRESHOLD, ROUTER_LOG_PATH
+
+logger = logging.getLogger(__name__)
+
+ROUTES = ("VectorStore", "SearchEngine", "llm_fallback")
+
+_log_lock = threading.Lock()
+
+
+def log_router_decision(query: str, route: str):
+    """Appends an LLM routing decision to ROUTER_LOG_PATH; these are the training labels."""
+    if not ROUTER_LOG_PATH:
+        return
+    with _log_lock, open(ROUTER_LOG_PATH, "a", encoding="utf-8") as f:
+        f.write(json.dumps({"query": query, "route": route, "ts": time.time()}) + "\n")
+
+
+@registry.register("local_router")
+def get_local_router():
+    """The trained classifier, or None when no model has been trained yet."""
+    if not os.path.exists(LOCAL_ROUTER_MODEL_PATH):
+        return None
+    import joblib
+
+    return joblib.load(LOCAL_ROUTER_MODEL_PATH)
+
+
+def predict_route(query_vector) -> tuple:
+    """Returns (route, confidence) from the local classifier, or (None, 0.0) without a model."""
+    classifier = get_local_router()
+    if classifier is None:
+        return None, 0.0
+    probabilities = classifier.predict_proba([query_vector])[0]
+    best = probabilities.argmax()
+    return str(classifier.classes_[best]), float(probabilities[best])
+
+
+def local_route(query: str, threshold: float = LOCAL_ROUTER_THRESHOLD, query_vector=None):
+    """The locally predicted route when its confidence reaches `threshold`, otherwise None."""
+    if get_local_router() is None:
+        return None
+    route, confidence = predict_route(query_vector if query_vector is not None else embed_query(query))
+    if confidence < threshold:
+        logger.info("---LOCAL ROUTER UNSURE (%s, %.2f), ASKING THE LLM---", route, confidence)
+        return None
+    logger.info("---LOCAL ROUTER: %s (%.2f)---", route, confidence)
+    return route
@@ -0,0 +1,56 @@
+import numpy as np
+from vectordb import get_embedding_function
+from query_embeddings import embed_query
+from config import PREFILTER_ACCEPT, PREFILTER_REJECT
+
+
+def cosine_similarities(query_vector, vectors) -> list:
+    query_vector = np.asarray(query_vector, dtype=np.float32)
+    vectors = np.asarray(vectors, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1) * np.linalg.norm(query_vector)
+    return (vectors @ query_vector / np.maximum(norms, 1e-12)).tolist()
+
+
+def embed_texts(texts: list) -> list:
+    """Embeds text seen at query time without growing the on-disk embedding cache."""
+    embedding_function = get_embedding_function()
+    return getattr(embedding_function, "embed_transient", embedding_function.embed_documents)(texts)
+
+
+def score_documents(documents: list, query: str, query_vector=None) -> list:
+    """
+    Returns the cosine similarity of each document to the query.
+
+    Documents coming from the vector store already carry it in
+    `metadata["relevance_score"]`; the others (e.g. web results) are embedded
+    with the same model as the index. `query_vector` is the request's
+    embedded query, if it already has one.
+    """
+    scores = [doc.metadata.get("relevance_score") for doc in documents]
+    missing = [i for i, score in enumerate(scores) if score is None]
+    if missing:
+        if query_vector is None:
+            query_vector = embed_query(query)
+        vectors = embed_texts([documents[i].page_content for i in missing])
+        for i, score in zip(missing, cosine_similarities(query_vector, vectors)):
+            documents[i].metadata["relevance_score"] = score
+            scores[i] = score
+    return scores
+
+
+def prefilter_documents(
+    documents: list, query: str, accept: float = PREFILTER_ACCEPT, reject: float = PREFILTER_REJECT, query_vector=None
+) -> list:
+    """
+    Returns a verdict per document: 'relevant' above `accept`, 'irrelevant'
+    below `reject` and None for the uncertain band that still needs the LLM grader.
+    """
+    verdicts = []
+    for score in score_documents(documents, query, query_vector):
+        if score >= accept:
+            verdicts.append("relevant")
+        elif score < reject:
+            verdicts.append("irrelevant")
+        else:
+            verdicts.append(None)
+    return verdicts
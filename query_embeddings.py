@@ -0,0 +1,146 @@
+"""
+Query embedding service.
+
+A request's query is embedded once: the vector is put in AgentState
+("query_vector") and the router, pre-filter, context compression and
+semantic cache take it from there. Retrieval goes through the vector store's
+`embed_query`, which is served by the same service. The last
+QUERY_EMBEDDING_CACHE_SIZE query vectors are kept in an LRU, so a query seen
+again, or embedded again by a consumer that did not get the state, costs no
+model compute.
+
+QUERY_EMBEDDING_BACKEND selects the model:
+- "torch": the document embedding model (embeddings.CachedEmbeddings).
+- "onnx": an ONNX export of the same model, run with onnxruntime.
+- "onnx-int8": the ONNX export dynamically quantized to int8.
+
+The exports are written once to QUERY_EMBEDDING_ONNX_DIR (under a file lock,
+so one worker exports and the others load the result). Quantized query
+vectors differ slightly from the float document vectors; check the agreement
+with scripts/bench_query_embeddings.py before switching.
+"""
+import fcntl
+import logging
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional
+import registry
+from config import (
+    EMBEDDING_MODEL,
+    QUERY_EMBEDDING_BACKEND,
+    QUERY_EMBEDDING_CACHE_SIZE,
+    QUERY_EMBEDDING_ONNX_DIR,
+    QUERY_EMBEDDING_QUANTIZATION,
+)
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+
+def load_onnx_model(model_name: str, onnx_dir: str, quantization: Optional[str] = None):
+    """
+    sentence-transformers model `model_name` on the ONNX backend, int8-quantized
+    for `quantization` ("avx2", "avx512", "avx512_vnni" or "arm64") if given.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    path = os.path.join(onnx_dir, re.sub(r"[^A-Za-z0-9_.-]+", "__", model_name))
+    file_name = f"onnx/model_qint8_{quantization}.onnx" if quantization else "onnx/model.onnx"
+    if not os.path.exists(os.path.join(path, file_name)):
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, ".lock"), "w") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if not os.path.exists(os.path.join(path, file_name)):
+                    _export(model_name, path, quantization)
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    return SentenceTransformer(path, backend="onnx", model_kwargs={"file_name": file_name})
+
+
+def _export(model_name: str, path: str, quantization: Optional[str]):
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    logger.info("Exporting %s to ONNX in %s", model_name, path)
+    model = SentenceTransformer(model_name, backend="onnx")
+    model.save(path)
+    if not os.path.exists(os.path.join(path, "onnx", "model.onnx")):
+        # Older sentence-transformers save the export next to the config.
+        os.makedirs(os.path.join(path, "onnx"), exist_ok=True)
+        os.replace(os.path.join(path, "model.onnx"), os.path.join(path, "onnx", "model.onnx"))
+    if quantization:
+        logger.info("Quantizing the ONNX export to int8 (%s)", quantization)
+        export_dynamic_quantized_onnx_model(model, quantization, path)
+
+
+class QueryEmbedder:
+    """Embeds queries with the configured backend, behind an LRU of recent query vectors."""
+
+    def __init__(
+        self,
+        backend: str = QUERY_EMBEDDING_BACKEND,
+        model_name: str = EMBEDDING_MODEL,
+        cache_size: int = QUERY_EMBEDDING_CACHE_SIZE,
+        onnx_dir: str = QUERY_EMBEDDING_ONNX_DIR,
+        quantization: str = QUERY_EMBEDDING_QUANTIZATION,
+    ):
+        if backend not in BACKENDS:
+            raise ValueError(f"QUERY_EMBEDDING_BACKEND must be one of {BACKENDS}, not {backend!r}")
+        self.backend = backend
+        self.model_name = model_name
+        self.cache_size = cache_size
+        self.onnx_dir = onnx_dir
+        self.quantization = quantization
+        self.stats = {"hits": 0, "computed": 0}
+        self._model = None
+        self._model_lock = threading.Lock()
+        self._cache = OrderedDict()  # query -> vector, least recently used first
+        self._lock = threading.Lock()
+
+    def _encode(self, text: str) -> list:
+        if self.backend == "torch":
+            from vectordb import get_embedding_function
+
+            embedding_function = get_embedding_function()
+            # The model itself: CachedEmbeddings.embed_query comes back here.
+            return getattr(embedding_function, "encode_query", embedding_function.embed_query)(text)
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    quantization = self.quantization if self.backend == "onnx-int8" else None
+                    self._model = load_onnx_model(self.model_name, self.onnx_dir, quantization)
+        return self._model.encode(text, convert_to_numpy=True).tolist()
+
+    def embed(self, text: str) -> list:
+        """The query's vector; callers must not modify it, it is shared through the LRU."""
+        with self._lock:
+            vector = self._cache.get(text)
+            if vector is not None:
+                self._cache.move_to_end(text)
+                self.stats["hits"] += 1
+                return vector
+        vector = self._encode(text)
+        with self._lock:
+            self.stats["computed"] += 1
+            if self.cache_size > 0:
+                self._cache[text] = vector
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return vector
+
+
+@registry.register("query_embedder")
+def get_query_embedder():
+    return QueryEmbedder()
+
+
+def embed_query(query: str) -> list:
+    return get_query_embedder().embed(query)
+
+
+def query_vector(state: dict) -> list:
+    """The request's query vector from the state, or embedded now (usually an LRU hit)."""
+    return state.get("query_vector") or embed_query(state["query"])
@@ -0,0 +1,64 @@
+"""
+Registry of the shared, expensive objects used by the app (embedding model,
+vector store, retriever, LLM clients, chains and the compiled graph).
+
+Nothing is built at import time. Each object is created by its factory on
+first use and cached for the lifetime of the process.
+"""
+import functools
+import importlib
+import threading
+
+_factories = {}
+_instances = {}
+_lock = threading.RLock()
+
+
+def register(name: str):
+    """Register the decorated function as the factory of `name` and return a cached getter."""
+
+    def decorator(factory):
+        _factories[name] = factory
+
+        @functools.wraps(factory)
+        def getter():
+            return get(name)
+
+        return getter
+
+    return decorator
+
+
+def get(name: str):
+    """Return the cached object `name`, building it on first use."""
+    try:
+        return _instances[name]
+    except KeyError:
+        pass
+    with _lock:
+        if name not in _instances:
+            _instances[name] = _factories[name]()
+        return _instances[name]
+
+
+def override(name: str, instance):
+    """Replace the object `name`, e.g. with a fake in tests or benchmarks."""
+    with _lock:
+        _instances[name] = instance
+
+
+def reset(*names: str):
+    """Drop cached objects so they are rebuilt on next use (all of them by default)."""
+    with _lock:
+        for name in names or list(_instances):
+            _instances.pop(name, None)
+
+
+def warm_up(*names: str):
+    """Eagerly build `names` (everything by default), e.g. before serving traffic."""
+    if not names:
+        # Importing the graph module registers every factory.
+        importlib.import_module("graph")
+        names = tuple(_factories)
+    for name in names:
+        get(name)
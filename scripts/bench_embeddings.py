@@ -0,0 +1,68 @@
+"""
+Embedding throughput in chunks/sec for different batch sizes and worker counts.
+
+Embeds the chunks currently in the vector store (or --synthetic N generated
+chunks) once per (batch size, workers) setting with the cache disabled, then
+once more through a warm on-disk cache.
+
+Usage, from the repository root:
+
+    python scripts/bench_embeddings.py --batch-sizes 16,32,64,128 --workers 1,2,4
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_utils import timed  # noqa: E402
+from embeddings import CachedEmbeddings  # noqa: E402
+
+WORDS = (
+    "patient symptoms diabetes insulin glucose malaria fever migraine headache treatment dose "
+    "blood pressure infection diagnosis chronic acute therapy medication risk prevention"
+).split()
+
+
+def synthetic_chunks(n: int, words: int = 180) -> list:
+    rng = random.Random(0)
+    return [" ".join(rng.choice(WORDS) for _ in range(words)) for _ in range(n)]
+
+
+def corpus_chunks() -> list:
+    from vectordb import get_vector_store
+
+    vector_store = get_vector_store()
+    return vector_store.get(include=["documents"])["documents"] if vector_store is not None else []
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-sizes", default="16,32,64,128")
+    parser.add_argument("--workers", default="1,2,4")
+    parser.add_argument("--synthetic", type=int, default=0, help="use N synthetic chunks instead of the corpus")
+    args = parser.parse_args()
+
+    chunks = synthetic_chunks(args.synthetic) if args.synthetic else corpus_chunks()
+    if not chunks:
+        sys.exit("No chunks to embed; pass --synthetic N.")
+    print(f"{len(chunks)} chunks, {os.cpu_count()} CPUs")
+
+    for workers in map(int, args.workers.split(",")):
+        for batch_size in map(int, args.batch_sizes.split(",")):
+            engine = CachedEmbeddings(batch_size=batch_size, workers=workers, cache_dir=None)
+            engine.embed_documents(chunks[: batch_size])  # warm up the model
+            _, elapsed = timed(engine.embed_documents, chunks)
+            print(f"workers={workers:<2} batch={batch_size:<4} {len(chunks) / elapsed:8.1f} chunks/sec")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        engine = CachedEmbeddings(cache_dir=cache_dir)
+        _, cold = timed(engine.embed_documents, chunks)
+        _, warm = timed(engine.embed_documents, chunks)
+        print(f"cache cold {len(chunks) / cold:8.1f} chunks/sec, warm {len(chunks) / warm:8.1f} chunks/sec")
+
+
+if __name__ == "__main__":
+    main()
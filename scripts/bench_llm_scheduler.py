@@ -0,0 +1,146 @@
+"""
+LLM scheduler under synthetic rate limits, offline.
+
+A real ChatGroq client talks to FakeGroqTransport (fake_services.py), which
+enforces --rpm requests and --tpm tokens per --window seconds and answers
+429 with a Retry-After beyond them. Two kinds of load run concurrently:
+- --sessions interactive sessions, each a router call, three grader calls at
+  once, then a rag generation;
+- --batch-calls summarizer calls in llm_scheduler.batch().
+
+The run is repeated with and without the scheduler. Without it, the Groq SDK
+retries 429s on its own. The report gives completed and failed calls, the
+429s the fake server sent, session latency and per-chain call latency, and
+the scheduler's queue wait per priority class.
+
+Usage, from the repository root:
+
+    python scripts/bench_llm_scheduler.py --sessions 20 --batch-calls 30
+    python scripts/bench_llm_scheduler.py --rpm 30 --tpm 6000 --window 6 --mode scheduled
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+from collections import defaultdict
+
+os.environ.setdefault("TOKENIZER_MODEL", "")
+os.environ.setdefault("LLM_CACHE_CHAINS", "")
+os.environ.setdefault("LLM_SCHEDULER_ENABLED", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx  # noqa: E402
+from bench_utils import latency_summary, percentile  # noqa: E402
+from fake_services import FakeGroqTransport  # noqa: E402
+from llm_config import get_chain_llm  # noqa: E402
+from llm_scheduler import LLMScheduler, batch, http_clients  # noqa: E402
+import registry  # noqa: E402
+
+PROMPTS = {
+    "router": "Route this medical question to the vector store or the web: how is malaria treated? " * 2,
+    "grader": "Is this document relevant to the question? Malaria is treated with antimalarial drugs. " * 6,
+    "rag": "Answer the question from the context. Context: malaria treatment, artemisinin, chloroquine. " * 12,
+    "summarizer": "Summarize this conversation about fevers, mosquitoes, travel and vaccines. " * 20,
+}
+
+
+def build_llm(args, scheduled: bool) -> tuple:
+    """(ChatGroq on the fake server, fake transport, scheduler or None)."""
+    from langchain_groq.chat_models import ChatGroq
+
+    server = FakeGroqTransport(requests=args.rpm, tokens=args.tpm, window=args.window, latency=args.latency)
+    scheduler = None
+    if scheduled:
+        scheduler = LLMScheduler(requests=args.rpm, tokens=args.tpm, window=args.window)
+        http_client, http_async_client = http_clients(scheduler, transport=server, async_transport=server)
+        retries = 0
+    else:
+        http_client, http_async_client = httpx.Client(transport=server), httpx.AsyncClient(transport=server)
+        retries = 2
+    llm = ChatGroq(
+        model="llama3-70b-8192",
+        api_key="fake",
+        http_client=http_client,
+        http_async_client=http_async_client,
+        max_retries=retries,
+    )
+    return llm, server, scheduler
+
+
+async def run(args, scheduled: bool) -> dict:
+    llm, server, scheduler = build_llm(args, scheduled)
+    registry.override("llm", llm)
+    chains = {chain: get_chain_llm(chain) for chain in PROMPTS}
+    latencies, failures, sessions = defaultdict(list), defaultdict(int), []
+
+    async def call(chain: str):
+        started = time.perf_counter()
+        try:
+            await chains[chain].ainvoke(PROMPTS[chain])
+            latencies[chain].append(time.perf_counter() - started)
+            return True
+        except Exception:
+            failures[chain] += 1
+            return False
+
+    async def session():
+        started = time.perf_counter()
+        ok = await call("router")
+        ok = all(await asyncio.gather(*(call("grader") for _ in range(3)))) and ok
+        ok = await call("rag") and ok
+        if ok:
+            sessions.append(time.perf_counter() - started)
+
+    async def batch_job():
+        with batch():
+            await asyncio.gather(*(call("summarizer") for _ in range(args.batch_calls)))
+
+    started = time.perf_counter()
+    await asyncio.gather(batch_job(), *(session() for _ in range(args.sessions)))
+    return {
+        "wall": time.perf_counter() - started,
+        "server": dict(server.stats),
+        "sessions": sessions,
+        "latencies": latencies,
+        "failures": dict(failures),
+        "scheduler": scheduler,
+    }
+
+
+def report(name: str, result: dict, sessions: int):
+    print(f"== {name} ({result['wall']:.1f}s wall)")
+    print(f"server: {result['server']['requests']} requests, {result['server']['rate_limited']} answered 429")
+    print(f"sessions completed: {len(result['sessions'])}/{sessions}; latency {latency_summary(result['sessions'])}")
+    for chain, samples in sorted(result["latencies"].items()):
+        failed = result["failures"].get(chain, 0)
+        print(
+            f"  {chain:<11} {len(samples):>4} ok {failed:>3} failed  "
+            f"p50 {percentile(samples, 50):.2f}s  p95 {percentile(samples, 95):.2f}s"
+        )
+    scheduler = result["scheduler"]
+    if scheduler is not None:
+        print(f"scheduler: {scheduler.stats}")
+        for label, waits in sorted(scheduler.waits.items()):
+            print(f"  queue wait {label:<22} p50 {percentile(list(waits), 50):.2f}s  p95 {percentile(list(waits), 95):.2f}s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--batch-calls", type=int, default=30)
+    parser.add_argument("--rpm", type=int, default=30, help="requests allowed per window")
+    parser.add_argument("--tpm", type=int, default=6000, help="tokens allowed per window")
+    parser.add_argument("--window", type=float, default=6.0, help="seconds of the fake rate limit window")
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds per fake completion")
+    parser.add_argument("--mode", choices=("both", "scheduled", "unscheduled"), default="both")
+    args = parser.parse_args()
+
+    for scheduled in (False, True):
+        if args.mode == "both" or args.mode == ("scheduled" if scheduled else "unscheduled"):
+            name = "with the scheduler" if scheduled else "without the scheduler (SDK retries)"
+            report(name, asyncio.run(run(args, scheduled)), args.sessions)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""
+End-to-end benchmark of the LangGraph app, offline.
+
+The LLM, web search, retriever and embedding model are replaced by the
+deterministic fakes in fake_services.py (simulated latency, scripted router
+tool calls and JSON grades), so no GROQ/Tavily keys, network or models are
+needed. Every query runs through graph.app with a RequestTrace; the report
+has throughput, end-to-end p50/p95/p99, the per-node time breakdown and LLM
+calls per request.
+
+--save writes the results as JSON; --baseline compares against a saved run
+and exits non-zero when p95 latency, LLM calls or tokens per request regress
+by more than --tolerance, so it can gate performance changes.
+
+Usage, from the repository root:
+
+    python scripts/bench_pipeline.py --requests 200 --concurrency 8
+    python scripts/bench_pipeline.py --save baseline.json
+    python scripts/bench_pipeline.py --baseline baseline.json --tolerance 0.1
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict
+
+# Offline and side-effect free: no tokenizer download, no response or search
+# cache across runs, no router training log.
+os.environ.setdefault("TOKENIZER_MODEL", "")
+os.environ.setdefault("LLM_CACHE_CHAINS", "")
+os.environ.setdefault("SEARCH_CACHE_PATH", "")
+os.environ["ROUTER_LOG_PATH"] = ""
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_utils import latency_summary, percentile  # noqa: E402
+from fake_services import FakeChatModel, FakeRetriever, FakeSearch, install_fakes, TOPICS  # noqa: E402
+from async_utils import run_sync  # noqa: E402
+from budget import start_request  # noqa: E402
+from graph import get_app  # noqa: E402
+from tracing import RequestTrace  # noqa: E402
+
+GATED = ("p95_seconds", "llm_calls_per_request", "tokens_per_request")
+
+
+def synthetic_queries(n: int) -> list:
+    return [f"What should I know about {TOPICS[i % len(TOPICS)].split()[0]}? (case {i})" for i in range(n)]
+
+
+async def run(app, queries: list, concurrency: int) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(query: str) -> dict:
+        async with semaphore:
+            trace = RequestTrace()
+            inputs = start_request({"query": query, "chat_history": []})
+            try:
+                output = await app.ainvoke(inputs, config=trace.config())
+                return trace.finish(output)
+            except Exception as e:
+                return trace.finish(error=e)
+
+    return list(await asyncio.gather(*(one(query) for query in queries)))
+
+
+def report(traces: list, wall: float) -> dict:
+    latencies = [trace["seconds"] for trace in traces]
+    node_times = defaultdict(list)
+    chain_calls = Counter()
+    for trace in traces:
+        for entry in trace["nodes"]:
+            node_times[entry["node"]].append(entry["seconds"])
+        chain_calls.update(call["chain"] for call in trace["llm_calls"])
+
+    total_node_time = sum(sum(times) for times in node_times.values()) or 1.0
+    results = {
+        "requests": len(traces),
+        "errors": sum(1 for trace in traces if trace["error"]),
+        "throughput_rps": len(traces) / wall,
+        "p50_seconds": percentile(latencies, 50),
+        "p95_seconds": percentile(latencies, 95),
+        "p99_seconds": percentile(latencies, 99),
+        "llm_calls_per_request": sum(len(trace["llm_calls"]) for trace in traces) / len(traces),
+        "tokens_per_request": sum(trace["input_tokens"] + trace["output_tokens"] for trace in traces) / len(traces),
+        "llm_calls_by_chain": {chain: count / len(traces) for chain, count in chain_calls.most_common()},
+        "routes": dict(Counter(str(trace["route"]) for trace in traces)),
+        "nodes": {
+            node: {
+                "visits_per_request": len(times) / len(traces),
+                "mean_seconds": statistics.mean(times),
+                "p95_seconds": percentile(times, 95),
+                "share": sum(times) / total_node_time,
+            }
+            for node, times in sorted(node_times.items(), key=lambda item: -sum(item[1]))
+        },
+    }
+
+    print(f"{results['requests']} requests, {results['errors']} errors, {wall:.1f}s wall")
+    print(f"throughput {results['throughput_rps']:.2f} req/s; latency {latency_summary(latencies)}")
+    print(
+        f"LLM calls/request {results['llm_calls_per_request']:.2f} "
+        f"({', '.join(f'{chain} {n:.2f}' for chain, n in results['llm_calls_by_chain'].items())}); "
+        f"tokens/request {results['tokens_per_request']:.0f}"
+    )
+    print(f"routes: {results['routes']}")
+    print(f"{'node':<14}{'visits/req':>11}{'mean ms':>10}{'p95 ms':>10}{'share':>8}")
+    for node, entry in results["nodes"].items():
+        print(
+            f"{node:<14}{entry['visits_per_request']:>11.2f}{entry['mean_seconds'] * 1000:>10.1f}"
+            f"{entry['p95_seconds'] * 1000:>10.1f}{entry['share']:>8.1%}"
+        )
+    return results
+
+
+def regressions(results: dict, baseline: dict, tolerance: float) -> list:
+    failed = []
+    for metric in GATED:
+        if baseline.get(metric) and results[metric] > baseline[metric] * (1 + tolerance):
+            failed.append(f"{metric}: {results[metric]:.3f} vs baseline {baseline[metric]:.3f}")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", help="text file with one query per line (default: synthetic)")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-scale", type=float, default=1.0, help="multiply every simulated latency")
+    parser.add_argument("--relevant-rate", type=float, default=0.7)
+    parser.add_argument("--hallucination-rate", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--save", help="write the results to this JSON file")
+    parser.add_argument("--baseline", help="JSON results of an earlier run to compare with")
+    parser.add_argument("--tolerance", type=float, default=0.1)
+    args = parser.parse_args()
+
+    if args.queries:
+        with open(args.queries, "r", encoding="utf-8") as f:
+            queries = [line.strip() for line in f if line.strip()]
+        queries = (queries * (args.requests // len(queries) + 1))[: args.requests]
+    else:
+        queries = synthetic_queries(args.requests)
+
+    llm = FakeChatModel(relevant_rate=args.relevant_rate, hallucination_rate=args.hallucination_rate, seed=args.seed)
+    llm.latency = {chain: seconds * args.latency_scale for chain, seconds in llm.latency.items()}
+    install_fakes(
+        llm=llm,
+        search=FakeSearch(latency=0.6 * args.latency_scale, seed=args.seed),
+        retriever=FakeRetriever(latency=0.03 * args.latency_scale, seed=args.seed),
+    )
+    app = get_app()
+
+    started = time.perf_counter()
+    traces = run_sync(run(app, queries, args.concurrency))
+    results = report(traces, time.perf_counter() - started)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            failed = regressions(results, json.load(f), args.tolerance)
+        if failed:
+            print("REGRESSION: " + "; ".join(failed))
+            sys.exit(1)
+        print(f"No regression beyond {args.tolerance:.0%} of the baseline.")
+
+
+if __name__ == "__main__":
+    main()
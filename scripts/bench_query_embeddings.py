@@ -0,0 +1,107 @@
+"""
+Query embedding backends: model load time and single-query latency.
+
+For each backend (see query_embeddings.py) the model is loaded from scratch
+and --queries distinct synthetic queries are embedded one at a time, with the
+query LRU disabled. The ONNX backends are exported to --onnx-dir first if
+needed; the export is reported separately and not counted as load time. The
+vectors of each backend are compared with the torch ones (mean and minimum
+cosine similarity), and an LRU hit is timed against the default backend.
+
+Usage, from the repository root:
+
+    python scripts/bench_query_embeddings.py --queries 200
+    python scripts/bench_query_embeddings.py --backends torch,onnx-int8 --quantization avx512_vnni
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from bench_utils import latency_summary, timed  # noqa: E402
+from config import EMBEDDING_MODEL, QUERY_EMBEDDING_ONNX_DIR, QUERY_EMBEDDING_QUANTIZATION  # noqa: E402
+from embeddings import CachedEmbeddings  # noqa: E402
+from query_embeddings import BACKENDS, QueryEmbedder, load_onnx_model  # noqa: E402
+import registry  # noqa: E402
+
+TEMPLATES = (
+    "What are the symptoms of {}?",
+    "How is {} treated in adults?",
+    "Can {} be prevented with {}?",
+    "Is {} dangerous together with {}?",
+    "What dose of {} is safe for {}?",
+)
+TERMS = (
+    "diabetes insulin malaria fever migraine asthma hypertension influenza anemia "
+    "ibuprofen paracetamol vaccination pregnancy children antibiotics dehydration"
+).split()
+
+
+def synthetic_queries(n: int) -> list:
+    rng = random.Random(0)
+    queries = set()
+    while len(queries) < n:
+        queries.add(rng.choice(TEMPLATES).format(*rng.sample(TERMS, 2)))
+    return sorted(queries)
+
+
+def load(backend: str, args) -> tuple:
+    """(QueryEmbedder with its model loaded, load seconds); the LRU is disabled."""
+    if backend == "torch":
+        engine = CachedEmbeddings(cache_dir=None)
+        registry.override("embedding_function", engine)
+        _, elapsed = timed(lambda: engine.model)
+    else:
+        quantization = args.quantization if backend == "onnx-int8" else None
+        _, export = timed(load_onnx_model, EMBEDDING_MODEL, args.onnx_dir, quantization)
+        print(f"{backend}: export (or first load) {export:.2f}s")
+        _, elapsed = timed(load_onnx_model, EMBEDDING_MODEL, args.onnx_dir, quantization)
+    embedder = QueryEmbedder(backend=backend, cache_size=0, onnx_dir=args.onnx_dir, quantization=args.quantization)
+    embedder.embed("warm up")  # loads the model for the ONNX backends (from disk cache)
+    return embedder, elapsed
+
+
+def agreement(vectors: list, reference: list) -> tuple:
+    a, b = np.asarray(vectors, dtype=np.float32), np.asarray(reference, dtype=np.float32)
+    cosines = (a * b).sum(axis=1) / np.maximum(np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1), 1e-12)
+    return float(cosines.mean()), float(cosines.min())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", default=",".join(BACKENDS))
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--onnx-dir", default=QUERY_EMBEDDING_ONNX_DIR)
+    parser.add_argument("--quantization", default=QUERY_EMBEDDING_QUANTIZATION)
+    args = parser.parse_args()
+
+    queries = synthetic_queries(args.queries)
+    print(f"{EMBEDDING_MODEL}, {len(queries)} queries, {os.cpu_count()} CPUs")
+
+    reference = None
+    for backend in args.backends.split(","):
+        embedder, load_elapsed = load(backend, args)
+        vectors, samples = [], []
+        for query in queries:
+            vector, elapsed = timed(embedder.embed, query)
+            vectors.append(vector)
+            samples.append(elapsed)
+        line = f"{backend:<10} load {load_elapsed:6.2f}s  query {latency_summary(samples)}"
+        if backend == "torch":
+            reference = vectors
+        elif reference is not None:
+            mean, worst = agreement(vectors, reference)
+            line += f"  cosine vs torch mean {mean:.4f} min {worst:.4f}"
+        print(line)
+
+    embedder = QueryEmbedder(backend=args.backends.split(",")[0], onnx_dir=args.onnx_dir, quantization=args.quantization)
+    embedder.embed(queries[0])
+    samples = [timed(embedder.embed, queries[0])[1] for _ in range(1000)]
+    print(f"LRU hit    {latency_summary(samples)}")
+
+
+if __name__ == "__main__":
+    main()
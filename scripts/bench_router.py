@@ -0,0 +1,55 @@
+"""
+Routing latency: local classifier vs the LLM router.
+
+For every query in a text file (one per line), times the local route
+(query embedding + classifier) and the LLM router call, and prints p50/p95/p99
+for both. The LLM side needs GROQ_API_KEY; pass --local-only to skip it.
+
+Usage, from the repository root:
+
+    python scripts/bench_router.py queries.txt
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_utils import latency_summary, timed  # noqa: E402
+from local_router import get_local_router, predict_route  # noqa: E402
+from vectordb import get_embedding_function  # noqa: E402
+from config import LOCAL_ROUTER_THRESHOLD  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("queries", help="text file with one query per line")
+    parser.add_argument("--local-only", action="store_true", help="do not call the LLM router")
+    args = parser.parse_args()
+
+    with open(args.queries, "r", encoding="utf-8") as f:
+        queries = [line.strip() for line in f if line.strip()]
+    if get_local_router() is None:
+        sys.exit("No local router model; train one with scripts/train_router.py first.")
+
+    embedding_function = get_embedding_function()
+    embedding_function.embed_query("warm up")
+
+    local_times, confident = [], 0
+    for query in queries:
+        (_, confidence), elapsed = timed(lambda q: predict_route(embedding_function.embed_query(q)), query)
+        local_times.append(elapsed)
+        confident += confidence >= LOCAL_ROUTER_THRESHOLD
+    print(f"local router: {latency_summary(local_times)}")
+    print(f"  {confident} of {len(queries)} queries confident enough to skip the LLM")
+
+    if not args.local_only:
+        from llm_utils import get_question_router
+
+        router = get_question_router()
+        llm_times = [timed(router.invoke, {"query": query})[1] for query in queries]
+        print(f"LLM router:   {latency_summary(llm_times)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+"""
+Web search cache under a repeated, concurrent query load, offline.
+
+Runs --requests lookups through search_cache.SearchCache against the stubbed
+FakeSearch from fake_services.py. The queries are drawn from --distinct base
+queries with a skewed popularity, and each request varies the case and the
+punctuation of its query. --concurrency of them are in flight at once. The
+report gives the searches that reached the stub, the cache hits per tier, the
+lookups coalesced into an in-flight search and the lookup latency.
+
+Usage, from the repository root:
+
+    python scripts/bench_search_cache.py --requests 500 --distinct 40 --concurrency 16
+    python scripts/bench_search_cache.py --path search_cache_bench.sqlite   # with the SQLite file
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_utils import latency_summary  # noqa: E402
+from fake_services import FakeSearch, TOPICS  # noqa: E402
+from search_cache import SearchCache  # noqa: E402
+
+
+class CountingSearch(FakeSearch):
+    """FakeSearch counting the searches that reach it."""
+
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.calls = 0
+
+    async def ainvoke(self, query: str, config=None, **kwargs) -> list:
+        self.calls += 1
+        return await super().ainvoke(query, config, **kwargs)
+
+
+def workload(requests: int, distinct: int, seed: int) -> list:
+    rng = random.Random(seed)
+    base = [f"{TOPICS[i % len(TOPICS)].split()[0]} treatment options {i}" for i in range(distinct)]
+    weights = [1 / (rank + 1) for rank in range(distinct)]
+    queries = []
+    for query in rng.choices(base, weights=weights, k=requests):
+        variant = rng.choice((query, query.capitalize(), query.upper(), f"{query}?", f"  {query} !"))
+        queries.append(variant)
+    return queries
+
+
+async def run(cache: SearchCache, search: CountingSearch, queries: list, concurrency: int) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one(query: str):
+        async with semaphore:
+            started = time.perf_counter()
+            await cache.asearch(query, search)
+            latencies.append(time.perf_counter() - started)
+
+    await asyncio.gather(*(one(query) for query in queries))
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--distinct", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.6, help="seconds per stubbed search")
+    parser.add_argument("--path", default="", help="SQLite file of the cache (default: in memory)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    cache = SearchCache(path=args.path)
+    search = CountingSearch(latency=args.latency, seed=args.seed)
+    queries = workload(args.requests, args.distinct, args.seed)
+
+    started = time.perf_counter()
+    latencies = asyncio.run(run(cache, search, queries, args.concurrency))
+    wall = time.perf_counter() - started
+
+    print(f"{len(queries)} lookups of {args.distinct} distinct queries in {wall:.1f}s")
+    print(f"searches reaching the stub: {search.calls} (without the cache: {len(queries)})")
+    print(f"cache: {cache.stats}")
+    print(f"lookup latency: {latency_summary(latencies)}")
+
+
+if __name__ == "__main__":
+    main()
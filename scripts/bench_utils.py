@@ -0,0 +1,27 @@
+"""Small helpers shared by the benchmark scripts."""
+import math
+import time
+
+
+def percentile(samples: list, q: float) -> float:
+    """Nearest-rank percentile, q in [0, 100]."""
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    rank = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[rank]
+
+
+def timed(func, *args, **kwargs) -> tuple:
+    """Returns (result, elapsed seconds)."""
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def latency_summary(samples: list) -> str:
+    return (
+        f"p50 {percentile(samples, 50) * 1000:.1f} ms, "
+        f"p95 {percentile(samples, 95) * 1000:.1f} ms, "
+        f"p99 {percentile(samples, 99) * 1000:.1f} ms (n={len(samples)})"
+    )
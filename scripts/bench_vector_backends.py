@@ -0,0 +1,133 @@
+"""
+Chroma vs. FAISS (flat / ivf / ivfpq / hnsw) on a synthetic corpus.
+
+Generates N clustered unit vectors (standing in for chunk embeddings, so no
+model is loaded), builds each backend in a temporary directory, reopens it
+from disk and reports build time, load time, on-disk size, resident memory
+added by the reopened store, queries/sec and recall@k against exact search.
+
+Usage, from the repository root:
+
+    python scripts/bench_vector_backends.py --chunks 100000 --dim 768 --queries 500
+"""
+import argparse
+import gc
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np  # noqa: E402
+from langchain_core.embeddings import Embeddings  # noqa: E402
+from bench_utils import timed  # noqa: E402
+from faiss_store import FaissStore  # noqa: E402
+from vectordb import cosine_relevance  # noqa: E402
+
+
+class LookupEmbeddings(Embeddings):
+    """Returns precomputed vectors for the synthetic texts "chunk-<i>" / "query-<i>"."""
+
+    def __init__(self, chunks: np.ndarray, queries: np.ndarray):
+        self.chunks = chunks
+        self.queries = queries
+
+    def _vector(self, text: str) -> list:
+        kind, i = text.split("-")
+        return (self.chunks if kind == "chunk" else self.queries)[int(i)].tolist()
+
+    def embed_documents(self, texts: list) -> list:
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> list:
+        return self._vector(text)
+
+
+def synthetic_vectors(n: int, queries: int, dim: int, clusters: int = 64) -> tuple:
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(clusters, dim))
+    vectors = centers[rng.integers(clusters, size=n + queries)] + 0.5 * rng.normal(size=(n + queries, dim))
+    vectors = (vectors / np.linalg.norm(vectors, axis=1, keepdims=True)).astype(np.float32)
+    return vectors[:n], vectors[n:]
+
+
+def rss_bytes() -> int:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def dir_size(path: str) -> int:
+    return sum(os.path.getsize(os.path.join(root, name)) for root, _, names in os.walk(path) for name in names)
+
+
+def build_faiss(path: str, embeddings, n: int, index_type: str, batch: int = 5000):
+    store = FaissStore(path, embeddings, index_type=index_type)
+    for start in range(0, n, batch):
+        texts = [f"chunk-{i}" for i in range(start, min(n, start + batch))]
+        store.add_texts(texts, metadatas=[{"source": t} for t in texts], ids=texts)
+    store.persist()
+
+
+def build_chroma(path: str, embeddings, n: int, batch: int = 5000):
+    from langchain_community.vectorstores import Chroma
+
+    store = Chroma(persist_directory=path, embedding_function=embeddings, relevance_score_fn=cosine_relevance)
+    for start in range(0, n, batch):
+        texts = [f"chunk-{i}" for i in range(start, min(n, start + batch))]
+        store.add_texts(texts, metadatas=[{"source": t} for t in texts], ids=texts)
+
+
+def open_store(backend: str, path: str, embeddings):
+    if backend == "chroma":
+        from langchain_community.vectorstores import Chroma
+
+        return Chroma(persist_directory=path, embedding_function=embeddings, relevance_score_fn=cosine_relevance)
+    return FaissStore(path, embeddings, index_type=backend.split("-", 1)[1])
+
+
+def measure(backend: str, path: str, embeddings, texts: list, k: int) -> tuple:
+    """(load seconds, search results, query seconds, RSS growth); the store is released on return."""
+    gc.collect()
+    before = rss_bytes()
+    store, load = timed(open_store, backend, path, embeddings)
+    results, elapsed = timed(lambda: [store.similarity_search_with_relevance_scores(text, k=k) for text in texts])
+    return load, results, elapsed, rss_bytes() - before
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=100000)
+    parser.add_argument("--dim", type=int, default=768)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=10)
+    parser.add_argument("--backends", default="chroma,faiss-flat,faiss-ivf,faiss-ivfpq,faiss-hnsw")
+    args = parser.parse_args()
+
+    chunks, queries = synthetic_vectors(args.chunks, args.queries, args.dim)
+    embeddings = LookupEmbeddings(chunks, queries)
+    truth = np.argsort(-(queries @ chunks.T), axis=1)[:, : args.k]
+    print(f"{args.chunks} chunks x {args.dim} dims, {args.queries} queries, k={args.k}")
+
+    for backend in args.backends.split(","):
+        with tempfile.TemporaryDirectory() as path:
+            if backend == "chroma":
+                _, build = timed(build_chroma, path, embeddings, args.chunks)
+            else:
+                _, build = timed(build_faiss, path, embeddings, args.chunks, backend.split("-", 1)[1])
+            texts = [f"query-{i}" for i in range(args.queries)]
+            load, results, elapsed, rss = measure(backend, path, embeddings, texts, args.k)
+            hits = sum(
+                len({int(doc.metadata["source"].split("-")[1]) for doc, _ in found} & set(expected.tolist()))
+                for found, expected in zip(results, truth)
+            )
+            print(
+                f"{backend:<12} build {build:7.1f} s  load {load:6.2f} s  disk {dir_size(path) / 2**20:8.1f} MiB  "
+                f"rss +{rss / 2**20:7.1f} MiB  {args.queries / elapsed:8.1f} q/s  "
+                f"recall@{args.k} {hits / (args.k * args.queries):.3f}"
+            )
+            del results
+            gc.collect()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Per-answer verification latency for each VERIFY_MODE.
+
+For every query in a text file (one per line) this retrieves context,
+generates one answer with the RAG chain, then times the verification of that
+answer in sequential, parallel and combined mode. The LLM response cache is
+disabled so every mode pays for real calls. Needs GROQ_API_KEY.
+
+Usage, from the repository root:
+
+    python scripts/bench_verification.py queries.txt
+"""
+import argparse
+import os
+import sys
+
+os.environ["LLM_CACHE_CHAINS"] = ""
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_utils import latency_summary, timed  # noqa: E402
+from async_utils import run_sync  # noqa: E402
+from context import build_context  # noqa: E402
+from graders import acheck_halluc_and_ans, check_ans, check_halluc, check_verification  # noqa: E402
+from llm_utils import get_rag_chain  # noqa: E402
+from vectordb import get_retriever  # noqa: E402
+
+
+def verify_sequential(documents, query, response):
+    if check_halluc(documents, response) == "no":
+        return "no", check_ans(query, response)
+    return "yes", None
+
+
+MODES = {
+    "sequential": verify_sequential,
+    "parallel": lambda documents, query, response: run_sync(acheck_halluc_and_ans(documents, query, response)),
+    "combined": check_verification,
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("queries", help="text file with one query per line")
+    args = parser.parse_args()
+
+    with open(args.queries, "r", encoding="utf-8") as f:
+        queries = [line.strip() for line in f if line.strip()]
+
+    retriever = get_retriever()
+    samples = []
+    for query in queries:
+        # The same context string the graph generates from and hands to the graders.
+        context = build_context(retriever.invoke(query), query)
+        samples.append((context, query, get_rag_chain().invoke({"query": query, "context": context})))
+
+    timings = {mode: [] for mode in MODES}
+    agreement = 0
+    for context, query, response in samples:
+        grades = {}
+        for mode, verify in MODES.items():
+            grades[mode], elapsed = timed(verify, context, query, response)
+            timings[mode].append(elapsed)
+        # The combined grader should reach the same verdict as the separate graders.
+        agreement += grades["combined"][0] == grades["sequential"][0]
+
+    for mode, samples_s in timings.items():
+        print(f"{mode:<10} {latency_summary(samples_s)}")
+    print(f"combined vs sequential hallucination agreement: {agreement}/{len(samples)}")
+
+
+if __name__ == "__main__":
+    main()
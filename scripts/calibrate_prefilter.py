@@ -0,0 +1,95 @@
+"""
+Calibrate PREFILTER_ACCEPT / PREFILTER_REJECT for the embedding pre-filter.
+
+Reads a JSONL file of labelled (query, chunk) pairs:
+
+    {"query": "...", "context": "...", "label": "relevant" | "irrelevant"}
+
+If the file has no labels yet, pass --label-with-llm to grade each pair once
+with graders.grader_chain (this needs GROQ_API_KEY) and write the labels back.
+
+Usage, from the repository root:
+
+    python scripts/calibrate_prefilter.py pairs.jsonl --precision 0.95
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.documents import Document  # noqa: E402
+from prefilter import score_documents  # noqa: E402
+
+
+def load_pairs(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def label_with_llm(pairs: list, path: str):
+    from graders import get_grader_chain
+    from llm_scheduler import batch
+
+    grader_chain = get_grader_chain()
+    # Queued behind interactive traffic sharing the same rate limits.
+    with batch():
+        for pair in pairs:
+            if "label" not in pair:
+                pair["label"] = grader_chain.invoke({"query": pair["query"], "context": pair["context"]}).grade
+    with open(path, "w", encoding="utf-8") as f:
+        for pair in pairs:
+            f.write(json.dumps(pair) + "\n")
+
+
+def calibrate(scored: list, precision: float) -> tuple:
+    """
+    Returns (accept, reject): the lowest accept threshold above which at least
+    `precision` of the pairs are relevant, and the highest reject threshold
+    below which at least `precision` of the pairs are irrelevant.
+    """
+    scored = sorted(scored, reverse=True)
+    accept, relevant = 1.0, 0
+    for n, (score, is_relevant) in enumerate(scored, start=1):
+        relevant += is_relevant
+        if relevant / n >= precision:
+            accept = score
+
+    scored.reverse()
+    reject, irrelevant = 0.0, 0
+    for n, (score, is_relevant) in enumerate(scored, start=1):
+        irrelevant += not is_relevant
+        if irrelevant / n >= precision:
+            reject = score
+    return accept, min(reject, accept)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pairs", help="JSONL file of query/context/label pairs")
+    parser.add_argument("--precision", type=float, default=0.95, help="required precision of local decisions")
+    parser.add_argument("--label-with-llm", action="store_true", help="label unlabelled pairs with the LLM grader")
+    args = parser.parse_args()
+
+    pairs = load_pairs(args.pairs)
+    if args.label_with_llm:
+        label_with_llm(pairs, args.pairs)
+    pairs = [pair for pair in pairs if "label" in pair]
+    if not pairs:
+        sys.exit("No labelled pairs found.")
+
+    scored = []
+    for pair in pairs:
+        [score] = score_documents([Document(page_content=pair["context"])], pair["query"])
+        scored.append((score, pair["label"] == "relevant"))
+
+    accept, reject = calibrate(scored, args.precision)
+    decided = sum(1 for score, _ in scored if score >= accept or score < reject)
+    print(f"PREFILTER_ACCEPT={accept:.3f}")
+    print(f"PREFILTER_REJECT={reject:.3f}")
+    print(f"{decided} of {len(scored)} pairs ({decided / len(scored):.0%}) would skip the LLM grader.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+"""
+Offline retrieval evaluation: dense vs hybrid.
+
+Reads a JSONL file of queries with the text that a correct chunk must
+contain (or the source URL it must come from):
+
+    {"query": "metformin starting dose", "relevant": ["metformin", "500 mg"]}
+    {"query": "...", "sources": ["https://www.webmd.com/..."]}
+
+and reports hit-rate@k for each retriever (the share of queries with at
+least one relevant chunk in the top k; the labels do not enumerate every
+relevant chunk, so recall cannot be computed), plus the share of queries that
+would fall through to the SearchEngine because no retrieved chunk is relevant. With
+--grade the fall-through is measured with the real filter (embedding
+pre-filter + LLM grader) instead of the labels.
+
+Usage, from the repository root:
+
+    python scripts/eval_retrieval.py eval.jsonl --k 3
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hybrid_retriever import HybridRetriever, get_bm25_index, get_reranker  # noqa: E402
+from vectordb import ScoredRetriever, get_vector_store  # noqa: E402
+
+
+def is_relevant(doc, example: dict) -> bool:
+    text = doc.page_content.lower()
+    if any(source == doc.metadata.get("source") for source in example.get("sources", [])):
+        return True
+    return any(snippet.lower() in text for snippet in example.get("relevant", []))
+
+
+def passes_filter(docs: list, query: str) -> bool:
+    from agents import filter_documents_node
+
+    return bool(filter_documents_node({"query": query, "documents": docs})["documents"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("examples", help="JSONL file of labelled queries")
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--grade", action="store_true", help="measure fall-through with the real document filter")
+    args = parser.parse_args()
+
+    with open(args.examples, "r", encoding="utf-8") as f:
+        examples = [json.loads(line) for line in f if line.strip()]
+
+    vector_store = get_vector_store()
+    retrievers = {
+        "dense": ScoredRetriever(vector_store=vector_store, k=args.k),
+        "hybrid": HybridRetriever(vector_store=vector_store, bm25=get_bm25_index(), k=args.k),
+    }
+    if get_reranker() is not None:
+        retrievers["hybrid+rerank"] = HybridRetriever(
+            vector_store=vector_store, bm25=get_bm25_index(), reranker=get_reranker(), k=args.k
+        )
+
+    for name, retriever in retrievers.items():
+        hits, fallbacks = 0, 0
+        for example in examples:
+            docs = retriever.invoke(example["query"])
+            hit = any(is_relevant(doc, example) for doc in docs)
+            hits += hit
+            fallbacks += not (passes_filter(docs, example["query"]) if args.grade else hit)
+        print(
+            f"{name:<14} hit-rate@{args.k} {hits / len(examples):6.1%}   "
+            f"SearchEngine fallbacks {fallbacks}/{len(examples)} ({fallbacks / len(examples):.1%})"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,327 @@
+"""
+Deterministic stand-ins for the external services, for offline benchmarks.
+
+- FakeChatModel answers as whichever chain it is called from (read from the
+  chain:<name> tag set by llm_config.get_chain_llm): tool calls for the
+  router, JSON grades for the graders, text for rag / fallback, after a
+  simulated latency.
+- FakeSearch replaces TavilySearchResults, FakeRetriever the vector store
+  retriever and HashEmbeddings the sentence-transformers model.
+- FakeGroqTransport is an httpx transport answering Groq chat completion
+  requests under synthetic request / token rate limits, with 429s and
+  Retry-After like the real API, for the LLM scheduler.
+
+Every choice is drawn from a RNG seeded by the seed, the chain, the prompt and
+how many times that prompt was seen, so runs are reproducible while a retried
+generation can still get a different verdict. `install_fakes` puts them in
+the registry.
+"""
+import asyncio
+import hashlib
+import json
+import random
+import threading
+import time
+from collections import deque
+from typing import Any, Optional
+import httpx
+import numpy as np
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage
+from langchain_core.output_parsers import PydanticOutputParser
+from langchain_core.outputs import ChatGeneration, ChatResult
+from langchain_core.retrievers import BaseRetriever
+from pydantic import Field, PrivateAttr
+
+TOPICS = (
+    "diabetes insulin glucose blood sugar",
+    "malaria fever mosquito parasite",
+    "migraine headache aura triggers",
+    "hypertension blood pressure salt",
+    "asthma inhaler airway wheezing",
+    "influenza vaccine fever cough",
+    "anemia iron fatigue hemoglobin",
+    "arthritis joint pain inflammation",
+)
+
+# Mean latency in seconds per chain; "llm" covers untagged calls.
+DEFAULT_LATENCY = {
+    "router": 0.25,
+    "grader": 0.2,
+    "rag": 1.2,
+    "fallback": 0.8,
+    "hallucination_grader": 0.3,
+    "answer_grader": 0.25,
+    "verifier": 0.35,
+    "summarizer": 0.6,
+    "llm": 0.5,
+}
+
+
+def _seeded(*parts) -> random.Random:
+    return random.Random(hashlib.sha256("|".join(map(str, parts)).encode("utf-8")).hexdigest())
+
+
+def _estimate_tokens(text: str) -> int:
+    return max(1, len(text) // 4)
+
+
+class FakeChatModel(BaseChatModel):
+    """Scripted chat model; behaviour per chain is set by the rates below."""
+
+    latency: dict = Field(default_factory=lambda: dict(DEFAULT_LATENCY))
+    jitter: float = 0.25
+    route_mix: dict = Field(default_factory=lambda: {"VectorStore": 0.6, "SearchEngine": 0.3, "llm_fallback": 0.1})
+    relevant_rate: float = 0.7
+    hallucination_rate: float = 0.1
+    unhelpful_rate: float = 0.05
+    answer_words: int = 120
+    seed: int = 0
+    _seen: dict = PrivateAttr(default_factory=dict)
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat"
+
+    def _chain(self) -> str:
+        return next((tag.split(":", 1)[1] for tag in self.tags or [] if tag.startswith("chain:")), "llm")
+
+    def _respond(self, messages: list) -> tuple:
+        chain = self._chain()
+        prompt = "\n".join(str(message.content) for message in messages)
+        key = (chain, prompt)
+        attempt = self._seen[key] = self._seen.get(key, 0) + 1
+        rng = _seeded(self.seed, chain, prompt, attempt)
+        delay = self.latency.get(chain, self.latency.get("llm", 0.5)) * rng.uniform(1 - self.jitter, 1 + self.jitter)
+
+        if chain == "router":
+            route = rng.choices(list(self.route_mix), weights=list(self.route_mix.values()))[0]
+            if route == "llm_fallback":
+                message = AIMessage(content="not medical")
+            else:
+                call = {"id": f"call_{attempt}", "type": "function", "function": {"name": route, "arguments": "{}"}}
+                message = AIMessage(
+                    content="",
+                    additional_kwargs={"tool_calls": [call]},
+                    tool_calls=[{"id": call["id"], "name": route, "args": {}}],
+                )
+        elif chain == "grader":
+            message = AIMessage(content=json.dumps({"grade": "relevant" if rng.random() < self.relevant_rate else "irrelevant"}))
+        elif chain == "hallucination_grader":
+            message = AIMessage(content=json.dumps({"grade": "yes" if rng.random() < self.hallucination_rate else "no"}))
+        elif chain == "answer_grader":
+            message = AIMessage(content=json.dumps({"grade": "no" if rng.random() < self.unhelpful_rate else "yes"}))
+        elif chain == "verifier":
+            grades = {
+                "hallucination": "yes" if rng.random() < self.hallucination_rate else "no",
+                "answer": "no" if rng.random() < self.unhelpful_rate else "yes",
+            }
+            message = AIMessage(content=json.dumps(grades))
+        else:
+            words = " ".join(rng.choice(TOPICS).split() * (self.answer_words // 4))
+            message = AIMessage(content=f"General information ({chain}): {words}.")
+
+        usage = {"prompt_tokens": _estimate_tokens(prompt), "completion_tokens": _estimate_tokens(str(message.content))}
+        message.usage_metadata = {
+            "input_tokens": usage["prompt_tokens"],
+            "output_tokens": usage["completion_tokens"],
+            "total_tokens": usage["prompt_tokens"] + usage["completion_tokens"],
+        }
+        return ChatResult(generations=[ChatGeneration(message=message)], llm_output={"token_usage": usage}), delay
+
+    def _generate(self, messages: list, stop: Optional[list] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        result, delay = self._respond(messages)
+        time.sleep(delay)
+        return result
+
+    async def _agenerate(self, messages: list, stop: Optional[list] = None, run_manager=None, **kwargs: Any) -> ChatResult:
+        result, delay = self._respond(messages)
+        await asyncio.sleep(delay)
+        return result
+
+    def bind_tools(self, tools: list, **kwargs: Any):
+        return self.bind(tools=[getattr(tool, "__name__", str(tool)) for tool in tools], **kwargs)
+
+    def with_structured_output(self, schema, **kwargs: Any):
+        return self.bind(response_format={"type": "json_object"}) | PydanticOutputParser(pydantic_object=schema)
+
+
+class FakeSearch:
+    """TavilySearchResults stand-in returning `results` snippets after `latency` seconds."""
+
+    def __init__(self, latency: float = 0.6, results: int = 5, seed: int = 0):
+        self.latency = latency
+        self.results = results
+        self.seed = seed
+
+    def _results(self, query: str) -> list:
+        rng = _seeded(self.seed, "search", query)
+        return [
+            {
+                "url": f"https://example.org/{rng.randrange(10**6)}",
+                "content": f"{query}. " + " ".join(rng.choice(TOPICS).split() * 12),
+            }
+            for _ in range(self.results)
+        ]
+
+    def invoke(self, query: str, config: Optional[dict] = None, **kwargs: Any) -> list:
+        time.sleep(self.latency)
+        return self._results(query)
+
+    async def ainvoke(self, query: str, config: Optional[dict] = None, **kwargs: Any) -> list:
+        await asyncio.sleep(self.latency)
+        return self._results(query)
+
+
+class FakeRetriever(BaseRetriever):
+    """Returns `k` synthetic chunks with relevance scores spread across the pre-filter bands."""
+
+    k: int = 3
+    latency: float = 0.03
+    seed: int = 0
+
+    def _documents(self, query: str) -> list:
+        rng = _seeded(self.seed, "retriever", query)
+        return [
+            Document(
+                page_content=f"{rng.choice(TOPICS)}. " + " ".join(rng.choice(TOPICS).split() * 20),
+                metadata={"source": f"https://example.org/chunk/{rng.randrange(10**6)}", "relevance_score": rng.uniform(0.1, 0.9)},
+            )
+            for _ in range(self.k)
+        ]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> list:
+        time.sleep(self.latency)
+        return self._documents(query)
+
+    async def _aget_relevant_documents(self, query: str, *, run_manager=None) -> list:
+        await asyncio.sleep(self.latency)
+        return self._documents(query)
+
+
+def _prompt_tokens(body: dict) -> int:
+    return _estimate_tokens("".join(str(message.get("content") or "") for message in body.get("messages", [])))
+
+
+class FakeGroqTransport(httpx.BaseTransport, httpx.AsyncBaseTransport):
+    """
+    Groq-compatible chat completions endpoint enforcing `requests` and `tokens`
+    per `window` seconds (a sliding window, like the per-minute limits of the
+    real API at a shorter time scale). Over the limit it answers 429 with a
+    Retry-After; otherwise it answers after `latency` seconds, with the
+    x-ratelimit-remaining-* headers.
+    """
+
+    def __init__(self, requests: int = 30, tokens: int = 6000, window: float = 60.0, latency: float = 0.3, seed: int = 0):
+        self.requests = requests
+        self.tokens = tokens
+        self.window = window
+        self.latency = latency
+        self.stats = {"requests": 0, "rate_limited": 0}
+        self._rng = random.Random(seed)
+        self._log = deque()  # (time, tokens) of the accepted requests in the window
+        self._lock = threading.Lock()
+
+    def _admit(self, body: dict) -> tuple:
+        """(429 response or None, completion tokens, remaining (requests, tokens))."""
+        completion = body.get("max_tokens") or 150
+        cost = _prompt_tokens(body) + completion
+        now = time.monotonic()
+        with self._lock:
+            self.stats["requests"] += 1
+            while self._log and now - self._log[0][0] >= self.window:
+                self._log.popleft()
+            used = sum(tokens for _, tokens in self._log)
+            if len(self._log) >= self.requests or used + cost > self.tokens:
+                self.stats["rate_limited"] += 1
+                retry_after = self.window - (now - self._log[0][0]) if self._log else self.window
+                return httpx.Response(
+                    429,
+                    headers={"retry-after": f"{retry_after:.2f}"},
+                    json={"error": {"message": "Rate limit reached", "type": "tokens", "code": "rate_limit_exceeded"}},
+                ), 0, None
+            self._log.append((now, cost))
+            return None, completion, (self.requests - len(self._log), self.tokens - used - cost)
+
+    def _completion(self, body: dict, completion: int, remaining: tuple) -> httpx.Response:
+        prompt_tokens = _prompt_tokens(body)
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion, "total_tokens": prompt_tokens + completion}
+        headers = {
+            "x-ratelimit-remaining-requests": str(remaining[0]),
+            "x-ratelimit-remaining-tokens": str(remaining[1]),
+        }
+        created, model = int(time.time()), body.get("model", "fake")
+        message = {"role": "assistant", "content": "ok " * min(completion, 20)}
+        if body.get("stream"):
+            chunk = {
+                "id": "chatcmpl-fake",
+                "object": "chat.completion.chunk",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "delta": message, "finish_reason": "stop"}],
+                "x_groq": {"usage": usage},
+            }
+            content = f"data: {json.dumps(chunk)}\n\ndata: [DONE]\n\n".encode("utf-8")
+            return httpx.Response(200, headers={**headers, "content-type": "text/event-stream"}, content=content)
+        return httpx.Response(
+            200,
+            headers=headers,
+            json={
+                "id": "chatcmpl-fake",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{"index": 0, "message": message, "finish_reason": "stop"}],
+                "usage": usage,
+            },
+        )
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.read() or b"{}")
+        limited, completion, remaining = self._admit(body)
+        if limited is not None:
+            return limited
+        time.sleep(self.latency * self._rng.uniform(0.75, 1.25))
+        return self._completion(body, completion, remaining)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        body = json.loads(await request.aread() or b"{}")
+        limited, completion, remaining = self._admit(body)
+        if limited is not None:
+            return limited
+        await asyncio.sleep(self.latency * self._rng.uniform(0.75, 1.25))
+        return self._completion(body, completion, remaining)
+
+
+class HashEmbeddings(Embeddings):
+    """Bag-of-words hashed into `dim` buckets, L2-normalized."""
+
+    def __init__(self, dim: int = 256):
+        self.dim = dim
+
+    def _embed(self, text: str) -> list:
+        vector = np.zeros(self.dim, dtype=np.float32)
+        for word in text.lower().split():
+            vector[int(hashlib.md5(word.encode("utf-8")).hexdigest(), 16) % self.dim] += 1.0
+        return (vector / max(float(np.linalg.norm(vector)), 1e-12)).tolist()
+
+    def embed_documents(self, texts: list) -> list:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> list:
+        return self._embed(text)
+
+
+def install_fakes(llm: Optional[FakeChatModel] = None, search: Optional[FakeSearch] = None, retriever: Optional[FakeRetriever] = None):
+    """Registers the fakes in place of the LLM, web search, retriever, embeddings, tokenizer and local router."""
+    import registry
+
+    registry.override("llm", llm or FakeChatModel())
+    registry.override("tavily_search", search or FakeSearch())
+    registry.override("retriever", retriever or FakeRetriever())
+    registry.override("embedding_function", HashEmbeddings())
+    registry.override("tokenizer", None)
+    registry.override("local_router", None)
@@ -0,0 +1,105 @@
+"""
+Simulates a long conversation through the fallback prompt and checks that
+the history part of the prompt stays flat.
+
+Each turn appends a user message and a reply, renders the fallback prompt
+the way the app does (recent messages + rolling summary) and, for
+comparison, with the whole conversation joined in. The summarizer LLM is
+replaced by a stub that keeps the start of each folded message, so no API key
+is needed. Exits non-zero if the windowed history ever exceeds
+HISTORY_MAX_TOKENS.
+
+Usage, from the repository root:
+
+    python scripts/simulate_history.py --turns 200
+"""
+import argparse
+import os
+import random
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from langchain_core.messages import AIMessage, HumanMessage  # noqa: E402
+from langchain_core.runnables import RunnableLambda  # noqa: E402
+from config import HISTORY_MAX_TOKENS  # noqa: E402
+from history import new_memory, recent_messages, fold_history, render_history, format_message  # noqa: E402
+from llm_utils import fallback_prompt  # noqa: E402
+from tokens import count_tokens  # noqa: E402
+import registry  # noqa: E402
+
+TOPICS = ["sleep", "running", "diet", "stress", "headaches", "vitamins", "hydration", "posture", "allergies"]
+summarizer_calls = 0
+
+
+def stub_summarizer(inputs: dict) -> str:
+    global summarizer_calls
+    summarizer_calls += 1
+    previous = "" if inputs["summary"] == "(none)" else inputs["summary"]
+    new = "; ".join(line[:60] for line in inputs["messages"].splitlines())
+    return f"{previous} {new}".strip()
+
+
+def simulate(turns: int, report_every: int = 0) -> dict:
+    """
+    Runs `turns` turns; returns the prompt sizes (windowed and full history),
+    the largest rendered history, the first turn whose history exceeded
+    HISTORY_MAX_TOKENS (or None) and the number of summarizer calls.
+    """
+    global summarizer_calls
+    summarizer_calls = 0
+    registry.override("history_summarizer", RunnableLambda(stub_summarizer))
+    rng = random.Random(0)
+    messages = [AIMessage(content="Hello, I am a bot. How can I help you?")]
+    memory = new_memory()
+    windowed, full, max_history, exceeded = [], [], 0, None
+
+    for turn in range(1, turns + 1):
+        topic = rng.choice(TOPICS)
+        query = f"Turn {turn}: what should I know about {topic}? " + "I have been wondering about it. " * rng.randint(1, 6)
+        messages.append(HumanMessage(content=query))
+
+        history = render_history(recent_messages(messages, memory), memory["summary"])
+        windowed.append(count_tokens(fallback_prompt.format(chat_history=history, query=query)))
+        full_history = "\n".join(format_message(msg) for msg in messages)
+        full.append(count_tokens(fallback_prompt.format(chat_history=full_history, query=query)))
+        max_history = max(max_history, count_tokens(history))
+        if exceeded is None and count_tokens(history) > HISTORY_MAX_TOKENS:
+            exceeded = turn
+
+        reply = f"Here is some general information about {topic}. " * rng.randint(2, 10)
+        messages.append(AIMessage(content=reply))
+        memory = fold_history(messages, memory)
+
+        if report_every and turn % report_every == 0:
+            print(f"turn {turn:4d}: prompt {windowed[-1]:6d} tokens windowed, {full[-1]:7d} tokens full history")
+
+    return {
+        "windowed": windowed,
+        "full": full,
+        "max_history": max_history,
+        "exceeded": exceeded,
+        "summarizer_calls": summarizer_calls,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--turns", type=int, default=200)
+    parser.add_argument("--report-every", type=int, default=20)
+    args = parser.parse_args()
+
+    result = simulate(args.turns, args.report_every)
+    windowed = result["windowed"]
+    tail = windowed[len(windowed) // 2 :]
+    print(
+        f"windowed prompt: max {max(windowed)} tokens, second half {min(tail)}-{max(tail)}; "
+        f"history max {result['max_history']} tokens; full history grew to {result['full'][-1]} tokens; "
+        f"{result['summarizer_calls']} summarizer calls"
+    )
+    if result["exceeded"] is not None:
+        sys.exit(f"Turn {result['exceeded']}: history exceeds {HISTORY_MAX_TOKENS} tokens.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Train the local query router from logged LLM router decisions.
+
+Reads ROUTER_LOG_PATH (JSONL with "query" and "route"), embeds the queries
+with the index's embedding model, fits a logistic-regression classifier and
+reports held-out accuracy, plus the coverage and accuracy of the predictions
+confident enough to skip the LLM router.
+
+Usage, from the repository root:
+
+    python scripts/train_router.py --log router_log.jsonl --out local_router.joblib
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import LOCAL_ROUTER_MODEL_PATH, LOCAL_ROUTER_THRESHOLD, ROUTER_LOG_PATH  # noqa: E402
+from vectordb import get_embedding_function  # noqa: E402
+
+
+def load_decisions(path: str) -> tuple:
+    """Latest logged route per distinct query."""
+    routes = {}
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                routes[record["query"].strip()] = record["route"]
+    queries = list(routes)
+    return queries, [routes[q] for q in queries]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--log", default=ROUTER_LOG_PATH, help="JSONL file of logged router decisions")
+    parser.add_argument("--out", default=LOCAL_ROUTER_MODEL_PATH, help="where to save the trained model")
+    parser.add_argument("--threshold", type=float, default=LOCAL_ROUTER_THRESHOLD, help="confidence needed to skip the LLM")
+    parser.add_argument("--test-size", type=float, default=0.2)
+    args = parser.parse_args()
+
+    import joblib
+    import numpy as np
+    from sklearn.linear_model import LogisticRegression
+    from sklearn.model_selection import train_test_split
+
+    queries, routes = load_decisions(args.log)
+    if len(set(routes)) < 2:
+        sys.exit(f"Need decisions for at least two routes, found {sorted(set(routes))} in {len(queries)} queries.")
+    vectors = np.asarray(get_embedding_function().embed_documents(queries), dtype=np.float32)
+    labels = np.asarray(routes)
+
+    x_train, x_test, y_train, y_test = train_test_split(
+        vectors, labels, test_size=args.test_size, random_state=0, stratify=labels
+    )
+    classifier = LogisticRegression(max_iter=1000, class_weight="balanced").fit(x_train, y_train)
+
+    probabilities = classifier.predict_proba(x_test)
+    predicted = classifier.classes_[probabilities.argmax(axis=1)]
+    confident = probabilities.max(axis=1) >= args.threshold
+    print(f"{len(queries)} queries, routes: { {r: routes.count(r) for r in sorted(set(routes))} }")
+    print(f"held-out accuracy: {(predicted == y_test).mean():.1%}")
+    print(f"coverage at threshold {args.threshold}: {confident.mean():.1%} of queries skip the LLM router")
+    if confident.any():
+        print(f"accuracy on those: {(predicted[confident] == y_test[confident]).mean():.1%}")
+
+    # Refit on everything for the shipped model.
+    classifier = LogisticRegression(max_iter=1000, class_weight="balanced").fit(vectors, labels)
+    joblib.dump(classifier, args.out)
+    print(f"saved {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+"""
+Web search result cache for the SearchEngine node.
+
+Results are keyed on the normalized query text (case, Unicode form,
+punctuation and whitespace folded) and looked up in an in-memory LRU, then a
+SQLite table shared by every process. Entries expire after SEARCH_CACHE_TTL
+seconds and the least recently used ones are evicted beyond
+SEARCH_CACHE_MAX_ENTRIES.
+
+Every cached result is also added to an FTS5 full-text index. A query with no
+exact entry is answered from it, without a network call, when at least
+SEARCH_CACHE_LOCAL_MIN_RESULTS unexpired past results contain all of its
+significant words.
+
+Concurrent lookups of the same query, sync or async, share one in-flight
+search. The search tool is passed to each call, so any object with
+`invoke` / `ainvoke` (e.g. scripts/fake_services.FakeSearch) can stand in for
+Tavily.
+"""
+import asyncio
+import json
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+from concurrent.futures import CancelledError, Future
+from typing import Optional
+import registry
+from config import (
+    SEARCH_CACHE_PATH,
+    SEARCH_CACHE_TTL,
+    SEARCH_CACHE_MEMORY_SIZE,
+    SEARCH_CACHE_MAX_ENTRIES,
+    SEARCH_CACHE_LOCAL_MIN_RESULTS,
+)
+
+logger = logging.getLogger(__name__)
+
+_STOPWORDS = frozenset(
+    "a an and are can could did do does for from how i in is it me my of on or should the to was what when "
+    "where which who why will with you your".split()
+)
+
+
+def normalize_query(query: str) -> str:
+    text = unicodedata.normalize("NFKC", query).casefold()
+    return " ".join(re.sub(r"[^\w\s]", " ", text).split())
+
+
+def _match_expression(key: str) -> Optional[str]:
+    """FTS5 query requiring every significant word of the normalized query, or None if it has fewer than two."""
+    terms = [
+        term for term in dict.fromkeys(key.split()) if (len(term) > 2 or term.isdigit()) and term not in _STOPWORDS
+    ]
+    if len(terms) < 2:
+        return None
+    return " ".join(f'"{term}"' for term in terms)
+
+
+class SearchCache:
+    """Two-tier (memory LRU + SQLite) search result cache with a full-text fallback and single-flight lookups."""
+
+    def __init__(
+        self,
+        path: Optional[str] = SEARCH_CACHE_PATH,
+        ttl: float = SEARCH_CACHE_TTL,
+        memory_size: int = SEARCH_CACHE_MEMORY_SIZE,
+        max_entries: int = SEARCH_CACHE_MAX_ENTRIES,
+        local_min_results: int = SEARCH_CACHE_LOCAL_MIN_RESULTS,
+    ):
+        self.ttl = ttl
+        self.memory_size = memory_size
+        self.max_entries = max_entries
+        self.local_min_results = local_min_results
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "local_hits": 0, "coalesced": 0, "misses": 0}
+        self._memory = OrderedDict()  # key -> (created, results), least recently used first
+        self._in_flight = {}  # key -> Future of the search in progress
+        self._lock = threading.Lock()
+        # Without a path the table and the full-text index live in memory.
+        self._conn = sqlite3.connect(path or ":memory:", timeout=30, check_same_thread=False)
+        if path:
+            self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS search_cache "
+            "(key TEXT PRIMARY KEY, results TEXT NOT NULL, created REAL NOT NULL, used REAL NOT NULL)"
+        )
+        self._fts = True
+        try:
+            self._conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS search_fts USING fts5(key UNINDEXED, url, content)")
+        except sqlite3.OperationalError as e:
+            logger.warning("SQLite has no FTS5 (%s), past web results will not answer new queries.", e)
+            self._fts = False
+        self._conn.commit()
+
+    def _remember(self, key: str, created: float, results: list):
+        self._memory[key] = (created, results)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _local(self, key: str) -> Optional[list]:
+        expression = _match_expression(key) if self._fts and self.local_min_results > 0 else None
+        if expression is None:
+            return None
+        rows = self._conn.execute(
+            "SELECT f.url, f.content FROM search_fts AS f JOIN search_cache AS c ON c.key = f.key "
+            "WHERE search_fts MATCH ? AND c.created >= ? ORDER BY bm25(search_fts) LIMIT ?",
+            (expression, time.time() - self.ttl, self.local_min_results * 2),
+        ).fetchall()
+        results, seen = [], set()
+        for url, content in rows:
+            if url not in seen:
+                seen.add(url)
+                results.append({"url": url, "content": content})
+        return results if len(results) >= self.local_min_results else None
+
+    def lookup(self, query: str) -> tuple:
+        """Returns (results, tier) with tier "memory", "disk" or "local", or (None, None) on a miss."""
+        key = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            if key in self._memory:
+                created, results = self._memory[key]
+                if now - created <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return results, "memory"
+                del self._memory[key]
+            row = self._conn.execute(
+                "SELECT results, created FROM search_cache WHERE key = ? AND created >= ?", (key, now - self.ttl)
+            ).fetchone()
+            if row is not None:
+                results = json.loads(row[0])
+                self._remember(key, row[1], results)
+                self._conn.execute("UPDATE search_cache SET used = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+                self.stats["disk_hits"] += 1
+                return results, "disk"
+            results = self._local(key)
+            if results is not None:
+                self.stats["local_hits"] += 1
+                return results, "local"
+            self.stats["misses"] += 1
+            return None, None
+
+    def store(self, query: str, results: list):
+        key = normalize_query(query)
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, results)
+            self._conn.execute(
+                "INSERT OR REPLACE INTO search_cache (key, results, created, used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(results), now, now),
+            )
+            if self._fts:
+                self._conn.execute("DELETE FROM search_fts WHERE key = ?", (key,))
+                self._conn.executemany(
+                    "INSERT INTO search_fts (key, url, content) VALUES (?, ?, ?)",
+                    [(key, result.get("url", ""), result.get("content", "")) for result in results],
+                )
+            self._evict(now)
+            self._conn.commit()
+
+    def _evict(self, now: float):
+        stale = [
+            row[0]
+            for row in self._conn.execute(
+                "SELECT key FROM search_cache WHERE created < ? OR key IN "
+                "(SELECT key FROM search_cache ORDER BY used DESC LIMIT -1 OFFSET ?)",
+                (now - self.ttl, self.max_entries),
+            )
+        ]
+        if stale:
+            self._conn.executemany("DELETE FROM search_cache WHERE key = ?", [(key,) for key in stale])
+            if self._fts:
+                self._conn.executemany("DELETE FROM search_fts WHERE key = ?", [(key,) for key in stale])
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            self._conn.execute("DELETE FROM search_cache")
+            if self._fts:
+                self._conn.execute("DELETE FROM search_fts")
+            self._conn.commit()
+
+    def _join_or_lead(self, query: str) -> tuple:
+        """(future, leader): the caller runs the search when it is the leader, otherwise waits on the future."""
+        key = normalize_query(query)
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.stats["coalesced"] += 1
+                return future, False
+            future = self._in_flight[key] = Future()
+            return future, True
+
+    def _settle(self, query: str, future: Future, results: Optional[list] = None, error: Optional[BaseException] = None):
+        with self._lock:
+            self._in_flight.pop(normalize_query(query), None)
+        if isinstance(error, asyncio.CancelledError):
+            # Waiting callers run the search themselves.
+            future.cancel()
+            return
+        # Tavily returns an error string instead of raising; only cache real results.
+        if error is None and isinstance(results, list) and results:
+            self.store(query, results)
+        if future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(results)
+
+    def search(self, query: str, tool) -> tuple:
+        """`tool.invoke(query)` behind the cache; returns (results, cache tier or None)."""
+        results, tier = self.lookup(query)
+        if results is not None:
+            return results, tier
+        future, leader = self._join_or_lead(query)
+        if not leader:
+            try:
+                return future.result(), "coalesced"
+            except CancelledError:
+                return self.search(query, tool)
+        try:
+            results = tool.invoke(query)
+        except BaseException as e:
+            self._settle(query, future, error=e)
+            raise
+        self._settle(query, future, results)
+        return results, None
+
+    async def asearch(self, query: str, tool) -> tuple:
+        """`await tool.ainvoke(query)` behind the cache; returns (results, cache tier or None)."""
+        results, tier = await asyncio.to_thread(self.lookup, query)
+        if results is not None:
+            return results, tier
+        future, leader = self._join_or_lead(query)
+        if not leader:
+            try:
+                # Shielded: a waiter's own cancellation must not cancel the future shared with the others.
+                return await asyncio.shield(asyncio.wrap_future(future)), "coalesced"
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # The leader was cancelled; run the search ourselves.
+                return await self.asearch(query, tool)
+        try:
+            results = await tool.ainvoke(query)
+        except BaseException as e:
+            # Also on cancellation, so that waiting callers are released.
+            self._settle(query, future, error=e)
+            raise
+        await asyncio.to_thread(self._settle, query, future, results)
+        return results, None
+
+
+@registry.register("search_cache")
+def get_search_cache():
+    return SearchCache()
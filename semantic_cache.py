@@ -0,0 +1,191 @@
+"""
+Semantic answer cache in front of the LangGraph app.
+
+Queries are embedded with the index's embedding model and looked up in a
+small FAISS inner-product index of previously answered queries. A hit above
+the similarity threshold returns the stored generation without running the
+graph.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+import registry
+import vectordb
+from query_embeddings import embed_query
+from config import (
+    SEMANTIC_CACHE_PATH,
+    SEMANTIC_CACHE_THRESHOLD,
+    SEMANTIC_CACHE_TTL,
+    SEMANTIC_CACHE_MAX_ENTRIES,
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _normalize(vector) -> np.ndarray:
+    vector = np.asarray(vector, dtype=np.float32).reshape(1, -1)
+    return vector / max(float(np.linalg.norm(vector)), 1e-12)
+
+
+class SemanticCache:
+    """FAISS-backed query -> answer cache with TTL, LRU eviction and on-disk persistence."""
+
+    def __init__(self, path: str, threshold: float, ttl: float, max_entries: int):
+        self.path = path
+        self.threshold = threshold
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._lock = threading.RLock()
+        self._index = None
+        self._entries = OrderedDict()  # id -> entry, least recently used first
+        self._next_id = 0
+        self._fingerprint = None
+        self._manifest_stat = False  # never equal to a real stat, forces the first check
+        self._load()
+
+    @property
+    def _index_path(self) -> str:
+        return self.path + ".faiss"
+
+    @property
+    def _entries_path(self) -> str:
+        return self.path + ".json"
+
+    def _load(self):
+        import faiss
+
+        if os.path.exists(self._index_path) and os.path.exists(self._entries_path):
+            with open(self._entries_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            self._index = faiss.read_index(self._index_path)
+            self._entries = OrderedDict((int(k), v) for k, v in data["entries"])
+            self._next_id = data["next_id"]
+            self._fingerprint = data["fingerprint"]
+        self._check_index_changed()
+
+    def save(self):
+        import faiss
+
+        with self._lock:
+            if self._index is None:
+                return
+            faiss.write_index(self._index, self._index_path + ".tmp")
+            os.replace(self._index_path + ".tmp", self._index_path)
+            with open(self._entries_path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(
+                    {
+                        "entries": list(self._entries.items()),
+                        "next_id": self._next_id,
+                        "fingerprint": self._fingerprint,
+                    },
+                    f,
+                )
+            os.replace(self._entries_path + ".tmp", self._entries_path)
+
+    def clear(self):
+        with self._lock:
+            self._index = None
+            self._entries.clear()
+            for path in (self._index_path, self._entries_path):
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def _check_index_changed(self):
+        """Drop every cached answer once the vector store manifest changes."""
+        try:
+            stat = os.stat(vectordb.manifest_path)
+            manifest_stat = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            manifest_stat = None
+        if manifest_stat == self._manifest_stat:
+            return
+        self._manifest_stat = manifest_stat
+        fingerprint = vectordb.index_fingerprint()
+        if fingerprint != self._fingerprint:
+            if self._entries:
+                logger.info("Vector index changed, clearing the semantic cache.")
+            self.clear()
+            self._fingerprint = fingerprint
+
+    def _remove(self, ids: list):
+        if ids:
+            self._index.remove_ids(np.asarray(ids, dtype=np.int64))
+            for entry_id in ids:
+                self._entries.pop(entry_id, None)
+
+    def _evict(self):
+        now = time.time()
+        expired = [i for i, entry in self._entries.items() if now - entry["created"] > self.ttl]
+        self._remove(expired)
+        overflow = len(self._entries) - self.max_entries
+        if overflow > 0:
+            self._remove(list(self._entries)[:overflow])
+
+    def lookup(self, query_vector):
+        """Returns the cached entry most similar to the query vector, or None."""
+        with self._lock:
+            self._check_index_changed()
+            if self._index is None or not self._entries:
+                return None
+            scores, ids = self._index.search(_normalize(query_vector), 1)
+            entry_id, score = int(ids[0][0]), float(scores[0][0])
+            entry = self._entries.get(entry_id)
+            if entry is None or score < self.threshold:
+                return None
+            if time.time() - entry["created"] > self.ttl:
+                self._remove([entry_id])
+                return None
+            self._entries.move_to_end(entry_id)
+            return entry
+
+    def store(self, query: str, query_vector, generation: str):
+        import faiss
+
+        with self._lock:
+            self._check_index_changed()
+            vector = _normalize(query_vector)
+            if self._index is None:
+                self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(vector.shape[1]))
+            entry_id = self._next_id
+            self._next_id += 1
+            self._index.add_with_ids(vector, np.asarray([entry_id], dtype=np.int64))
+            self._entries[entry_id] = {"query": query, "generation": generation, "created": time.time()}
+            self._evict()
+            self.save()
+
+
+@registry.register("semantic_cache")
+def get_semantic_cache():
+    return SemanticCache(
+        SEMANTIC_CACHE_PATH,
+        threshold=SEMANTIC_CACHE_THRESHOLD,
+        ttl=SEMANTIC_CACHE_TTL,
+        max_entries=SEMANTIC_CACHE_MAX_ENTRIES,
+    )
+
+
+def lookup_answer(query: str) -> tuple:
+    """
+    Returns (cached entry or None, query vector); the vector goes into the
+    graph inputs ("query_vector") and is reused by `remember_answer`.
+    """
+    query_vector = embed_query(query)
+    entry = get_semantic_cache().lookup(query_vector)
+    if entry is not None:
+        logger.info("---SEMANTIC CACHE HIT: %r---", entry["query"])
+    return entry, query_vector
+
+
+def remember_answer(inputs: dict, query_vector, response: dict):
+    """
+    Caches the graph's response. Only answers grounded in retrieved documents
+    and accepted by the verifier are cached: fallback answers depend on the
+    chat history, and a request stopped by its budget may end on a rejected one.
+    """
+    verified = response.get("verdict") == "useful" and not (response.get("stats") or {}).get("stopped")
+    if verified and response.get("documents") and response.get("generation"):
+        get_semantic_cache().store(inputs["query"], query_vector, response["generation"])
@@ -0,0 +1,106 @@
+"""
+Speculative routing: run the cheap retrieval branches concurrently with the
+router LLM call and commit to whichever branch the router picks.
+"""
+import asyncio
+import logging
+import threading
+import time
+from agents import aquestion_router_node, aretrieve_node, aweb_search_node
+from async_utils import run_sync
+from config import SPECULATIVE_WEB_SEARCH
+from query_embeddings import query_vector
+from tracing import observe_speculation
+
+logger = logging.getLogger(__name__)
+
+_stats_lock = threading.Lock()
+_stats = {
+    "requests": 0,
+    "branches_started": 0,
+    "branches_used": 0,
+    "branches_discarded": 0,
+    "latency_saved_s": 0.0,
+    "wasted_work_s": 0.0,
+}
+
+
+def speculation_stats() -> dict:
+    """
+    Counters of speculative work: how much latency it saved and how much was
+    thrown away. Also exported through the metrics server (see tracing.py).
+    """
+    with _stats_lock:
+        return dict(_stats)
+
+
+def _record(**deltas):
+    with _stats_lock:
+        for key, value in deltas.items():
+            _stats[key] += value
+
+
+async def _timed(coro) -> tuple:
+    started = time.perf_counter()
+    result = await coro
+    return result, time.perf_counter() - started
+
+
+async def aspeculative_router_node(state: dict) -> dict:
+    started = time.perf_counter()
+    # Embedded once up front: the local router, the retriever and the later
+    # nodes all take it from the state or the query LRU.
+    state = {**state, "query_vector": await asyncio.to_thread(query_vector, state)}
+    branches = {"VectorStore": asyncio.create_task(_timed(aretrieve_node(state)))}
+    if SPECULATIVE_WEB_SEARCH:
+        branches["SearchEngine"] = asyncio.create_task(_timed(aweb_search_node(state)))
+
+    route = await aquestion_router_node(state)
+    router_elapsed = time.perf_counter() - started
+
+    prefetched, saved, wasted, used, discarded = {}, 0.0, 0.0, 0, 0
+    for name, task in branches.items():
+        if name == route:
+            try:
+                result, elapsed = await task
+            except Exception as e:
+                # The node will run the branch again on its own.
+                logger.error("Speculative %s branch failed: %s", name, e)
+                discarded += 1
+                continue
+            prefetched[name] = result.get("documents", [])
+            # The part of the branch that overlapped with the router call is latency saved.
+            saved += min(elapsed, router_elapsed)
+            used += 1
+        elif name == "SearchEngine" and route == "VectorStore" and task.done() and not task.exception():
+            # Already paid for; keep it in case filtering sends us to the web anyway.
+            result, _ = task.result()
+            prefetched[name] = result.get("documents", [])
+        elif task.done():
+            if not task.exception():
+                wasted += task.result()[1]
+            discarded += 1
+        else:
+            task.cancel()
+            wasted += time.perf_counter() - started
+            discarded += 1
+
+    logger.info("---SPECULATION: route=%s, saved %.2fs, wasted %.2fs---", route, saved, wasted)
+    _record(
+        requests=1,
+        branches_started=len(branches),
+        branches_used=used,
+        branches_discarded=discarded,
+        latency_saved_s=saved,
+        wasted_work_s=wasted,
+    )
+    observe_speculation(len(branches), used, discarded, saved, wasted)
+    return {"route": route, "prefetched": prefetched, "query_vector": state["query_vector"]}
+
+
+def speculative_router_node(state: dict) -> dict:
+    return run_sync(aspeculative_router_node(state))
+
+
+def route_decision(state: dict) -> str:
+    return state["route"]
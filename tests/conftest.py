@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Token counts from the length estimate: no tokenizer download in tests.
+os.environ.setdefault("TOKENIZER_MODEL", "")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path[:0] = [ROOT, os.path.join(ROOT, "scripts")]
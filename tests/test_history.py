@@ -0,0 +1,18 @@
+import pytest
+
+pytest.importorskip("langchain")
+
+from config import HISTORY_MAX_TOKENS, HISTORY_TURNS  # noqa: E402
+from simulate_history import simulate  # noqa: E402
+
+
+def test_history_stays_under_ceiling_for_200_turns():
+    result = simulate(200)
+    assert result["exceeded"] is None, f"history exceeded {HISTORY_MAX_TOKENS} tokens at turn {result['exceeded']}"
+    assert result["max_history"] <= HISTORY_MAX_TOKENS
+
+
+def test_history_folds_in_batches():
+    result = simulate(200)
+    # About one summarizer call every HISTORY_TURNS turns, not one per turn.
+    assert result["summarizer_calls"] <= 200 // HISTORY_TURNS + 5
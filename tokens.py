@@ -0,0 +1,34 @@
+import logging
+import registry
+from config import TOKENIZER_MODEL
+
+logger = logging.getLogger(__name__)
+
+
+@registry.register("tokenizer")
+def get_tokenizer():
+    """The LLM's tokenizer, or None to fall back to estimating from length."""
+    if not TOKENIZER_MODEL:
+        return None
+    try:
+        from transformers import AutoTokenizer
+
+        return AutoTokenizer.from_pretrained(TOKENIZER_MODEL)
+    except Exception as e:
+        logger.warning("Tokenizer %s unavailable (%s), estimating token counts.", TOKENIZER_MODEL, e)
+        return None
+
+
+def tokenizer_name() -> str:
+    """The tokenizer counts actually come from: TOKENIZER_MODEL, or "chars/4" when estimating."""
+    return TOKENIZER_MODEL if get_tokenizer() is not None else "chars/4"
+
+
+def count_tokens(text: str) -> int:
+    """LLM token count; about four characters per token when the tokenizer is unavailable."""
+    if not text:
+        return 0
+    tokenizer = get_tokenizer()
+    if tokenizer is None:
+        return max(1, len(text) // 4)
+    return len(tokenizer.encode(text, add_special_tokens=False))
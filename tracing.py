@@ -0,0 +1,336 @@
+"""
+Request tracing, structured logging and metrics.
+
+A `RequestTrace` collects, for one graph run, the wall time of every node and
+LLM call, token usage, response-cache hits, retries and the route taken.
+Its callback handler is passed in the run config:
+
+    trace = RequestTrace()
+    output = app.invoke(inputs, config=trace.config())
+    trace.finish(output)
+
+`finish` logs the trace as one "request" record (a JSON line with
+LOG_FORMAT=json) and, when METRICS_PORT is set and prometheus_client is
+installed, updates the metrics served on that port.
+"""
+import contextvars
+import json
+import logging
+import threading
+import time
+import uuid
+from typing import Any, Optional
+from langchain_core.callbacks import BaseCallbackHandler
+from config import LOG_LEVEL, LOG_FORMAT, METRICS_PORT, LLM_INPUT_PRICE, LLM_OUTPUT_PRICE
+
+logger = logging.getLogger(__name__)
+
+# The LLM call in progress in the current task, so the response cache can
+# mark it as a hit.
+_current_call = contextvars.ContextVar("current_llm_call", default=None)
+_configured = False
+_metrics = None
+_metrics_lock = threading.Lock()
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per record; fields passed as `extra={"fields": {...}}` are merged in."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": round(record.created, 3),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def configure_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT):
+    """Configures the root logger once per process."""
+    global _configured
+    if _configured:
+        return
+    handler = logging.StreamHandler()
+    if fmt == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    root = logging.getLogger()
+    root.addHandler(handler)
+    root.setLevel(level.upper())
+    _configured = True
+
+
+def record_cache_hit(tier: str):
+    """Called by the response cache: the current LLM call was served from `tier`."""
+    call = _current_call.get()
+    if call is not None:
+        call["cached"] = tier
+
+
+def record_queue_wait(seconds: float):
+    """Called by the LLM scheduler: the current LLM call waited `seconds` for a rate limit grant."""
+    call = _current_call.get()
+    if call is not None:
+        call["queued"] = call.get("queued", 0.0) + seconds
+
+
+class TraceCallbackHandler(BaseCallbackHandler):
+    """LangChain callbacks feeding a RequestTrace."""
+
+    # Run in the caller's task (not an executor) so `_current_call` is visible to the cache lookup.
+    run_inline = True
+
+    def __init__(self, trace: "RequestTrace"):
+        self.trace = trace
+        self._nodes = {}
+        self._calls = {}
+
+    def on_chain_start(self, serialized, inputs, *, run_id, metadata=None, **kwargs: Any):
+        node = (metadata or {}).get("langgraph_node")
+        # Only the node's own run, not the runnables nested in it.
+        if node and kwargs.get("name") == node:
+            self._nodes[run_id] = (node, time.perf_counter())
+
+    def _end_node(self, run_id, error: Optional[BaseException] = None):
+        started = self._nodes.pop(run_id, None)
+        if started is not None:
+            node, t0 = started
+            self.trace.add_node(node, time.perf_counter() - t0, error)
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs: Any):
+        self._end_node(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs: Any):
+        self._end_node(run_id, error)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, tags=None, **kwargs: Any):
+        chain = next((tag.split(":", 1)[1] for tag in tags or [] if tag.startswith("chain:")), "llm")
+        call = {"chain": chain, "started": time.perf_counter(), "cached": None}
+        self._calls[run_id] = call
+        _current_call.set(call)
+
+    def on_llm_start(self, serialized, prompts, *, run_id, tags=None, **kwargs: Any):
+        self.on_chat_model_start(serialized, [], run_id=run_id, tags=tags, **kwargs)
+
+    def on_llm_end(self, response, *, run_id, **kwargs: Any):
+        call = self._calls.pop(run_id, None)
+        if call is not None:
+            input_tokens, output_tokens = _usage(response)
+            self.trace.add_llm_call(call, input_tokens, output_tokens)
+
+    def on_llm_error(self, error, *, run_id, **kwargs: Any):
+        call = self._calls.pop(run_id, None)
+        if call is not None:
+            call["error"] = type(error).__name__
+            self.trace.add_llm_call(call, 0, 0)
+
+    def on_retry(self, retry_state, *, run_id, **kwargs: Any):
+        self.trace.add_retry("llm")
+
+
+def _usage(response) -> tuple:
+    """(input tokens, output tokens) reported by the provider for an LLMResult."""
+    usage = (response.llm_output or {}).get("token_usage") or {}
+    if usage:
+        return usage.get("prompt_tokens", 0), usage.get("completion_tokens", 0)
+    for generations in response.generations:
+        for generation in generations:
+            metadata = getattr(getattr(generation, "message", None), "usage_metadata", None)
+            if metadata:
+                return metadata.get("input_tokens", 0), metadata.get("output_tokens", 0)
+    return 0, 0
+
+
+class RequestTrace:
+    """Timings, token usage, cache hits, retries and route of one request."""
+
+    def __init__(self, request_id: Optional[str] = None):
+        self.request_id = request_id or uuid.uuid4().hex[:12]
+        self.started = time.perf_counter()
+        self.nodes = []
+        self.llm_calls = []
+        self.cache_hits = {}
+        self.retries = {}
+        self.route = None
+        self._lock = threading.Lock()
+
+    def config(self, **extra: Any) -> dict:
+        """Run config attaching this trace to a graph invocation."""
+        return {"callbacks": [TraceCallbackHandler(self)], "metadata": {"request_id": self.request_id}, **extra}
+
+    def add_node(self, node: str, seconds: float, error: Optional[BaseException] = None):
+        entry = {"node": node, "seconds": round(seconds, 4)}
+        if error is not None:
+            entry["error"] = type(error).__name__
+        with self._lock:
+            self.nodes.append(entry)
+
+    def add_llm_call(self, call: dict, input_tokens: int, output_tokens: int):
+        entry = {
+            "chain": call["chain"],
+            "seconds": round(time.perf_counter() - call["started"], 4),
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cached": call["cached"],
+        }
+        if call.get("queued"):
+            entry["queued_seconds"] = round(call["queued"], 4)
+        if call.get("error"):
+            entry["error"] = call["error"]
+        with self._lock:
+            self.llm_calls.append(entry)
+            if call["cached"]:
+                self.cache_hits[f"llm_{call['cached']}"] = self.cache_hits.get(f"llm_{call['cached']}", 0) + 1
+
+    def add_cache_hit(self, cache: str):
+        with self._lock:
+            self.cache_hits[cache] = self.cache_hits.get(cache, 0) + 1
+
+    def add_retry(self, kind: str):
+        with self._lock:
+            self.retries[kind] = self.retries.get(kind, 0) + 1
+
+    def finish(self, output: Optional[dict] = None, error: Optional[BaseException] = None) -> dict:
+        """Logs the trace, updates the metrics and returns the trace as a dict."""
+        output = output or {}
+        stats = output.get("stats") or {}
+        if output.get("cached"):
+            self.add_cache_hit("semantic")
+            self.route = self.route or "semantic_cache"
+        if stats.get("search_cache_hits"):
+            self.cache_hits["search"] = stats["search_cache_hits"]
+        # Loops through rag / SearchEngine beyond the first visit are retries.
+        if stats.get("generations", 0) > 1:
+            self.retries["generation"] = stats["generations"] - 1
+        if stats.get("web_searches", 0) > 1:
+            self.retries["web_search"] = stats["web_searches"] - 1
+        path = [entry["node"] for entry in self.nodes]
+        route = self.route or output.get("route") or next(
+            (node for node in path if node in ("VectorStore", "SearchEngine", "fallback")), None
+        )
+        input_tokens = sum(call["input_tokens"] for call in self.llm_calls if not call["cached"])
+        output_tokens = sum(call["output_tokens"] for call in self.llm_calls if not call["cached"])
+        summary = {
+            "event": "request",
+            "request_id": self.request_id,
+            "seconds": round(time.perf_counter() - self.started, 4),
+            "route": route,
+            "path": path,
+            "nodes": self.nodes,
+            "llm_calls": self.llm_calls,
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "cost_usd": round((input_tokens * LLM_INPUT_PRICE + output_tokens * LLM_OUTPUT_PRICE) / 1e6, 6),
+            "cache_hits": self.cache_hits,
+            "retries": self.retries,
+            "stopped": stats.get("stopped"),
+            "error": type(error).__name__ if error is not None else None,
+        }
+        logger.info(
+            "request %s finished in %.2fs via %s", self.request_id, summary["seconds"], route, extra={"fields": summary}
+        )
+        _observe(summary)
+        return summary
+
+
+def start_metrics_server(port: int = METRICS_PORT) -> bool:
+    """Serves Prometheus metrics on `port` (once per process); False if disabled or unavailable."""
+    global _metrics
+    if not port:
+        return False
+    with _metrics_lock:
+        if _metrics is not None:
+            return True
+        try:
+            from prometheus_client import Counter, Gauge, Histogram, start_http_server
+        except ImportError:
+            logger.warning("prometheus_client is not installed, metrics endpoint disabled.")
+            return False
+        _metrics = {
+            "requests": Counter("medbot_requests_total", "Graph requests", ["route", "status"]),
+            "request_seconds": Histogram("medbot_request_seconds", "Request wall time"),
+            "node_seconds": Histogram("medbot_node_seconds", "Graph node wall time", ["node"]),
+            "llm_seconds": Histogram("medbot_llm_seconds", "LLM call wall time", ["chain"]),
+            "llm_tokens": Counter("medbot_llm_tokens_total", "LLM tokens", ["chain", "direction"]),
+            "cache_hits": Counter("medbot_cache_hits_total", "Cache hits", ["cache"]),
+            "retries": Counter("medbot_retries_total", "Retries", ["kind"]),
+            "cost": Counter("medbot_llm_cost_usd_total", "Estimated LLM cost in USD"),
+            "llm_queue_depth": Gauge("medbot_llm_queue_depth", "LLM calls waiting for a rate limit grant", ["priority"]),
+            "llm_queue_seconds": Histogram("medbot_llm_queue_seconds", "LLM call wait for a grant", ["priority"]),
+            "llm_rate_limited": Counter("medbot_llm_rate_limited_total", "LLM responses with HTTP 429"),
+            "llm_cache_lookups": Counter(
+                "medbot_llm_cache_lookups_total", "LLM response cache lookups", ["chain", "result"]
+            ),
+            "speculative_branches": Counter(
+                "medbot_speculative_branches_total", "Speculative retrieval branches", ["outcome"]
+            ),
+            "speculation_saved": Counter(
+                "medbot_speculation_saved_seconds_total", "Router latency overlapped by speculative branches"
+            ),
+            "speculation_wasted": Counter(
+                "medbot_speculation_wasted_seconds_total", "Work spent on discarded speculative branches"
+            ),
+        }
+        try:
+            start_http_server(port)
+        except OSError as e:
+            # e.g. another worker process of the same server already serves the port.
+            logger.warning("Metrics port %d unavailable (%s), not serving metrics from this process.", port, e)
+            return False
+        logger.info("Serving metrics on port %d", port)
+        return True
+
+
+def _observe(summary: dict):
+    if _metrics is None:
+        return
+    _metrics["requests"].labels(str(summary["route"]), "error" if summary["error"] else "ok").inc()
+    _metrics["request_seconds"].observe(summary["seconds"])
+    for entry in summary["nodes"]:
+        _metrics["node_seconds"].labels(entry["node"]).observe(entry["seconds"])
+    for call in summary["llm_calls"]:
+        _metrics["llm_seconds"].labels(call["chain"]).observe(call["seconds"])
+        if not call["cached"]:
+            _metrics["llm_tokens"].labels(call["chain"], "input").inc(call["input_tokens"])
+            _metrics["llm_tokens"].labels(call["chain"], "output").inc(call["output_tokens"])
+    for cache, hits in summary["cache_hits"].items():
+        _metrics["cache_hits"].labels(cache).inc(hits)
+    for kind, count in summary["retries"].items():
+        _metrics["retries"].labels(kind).inc(count)
+    _metrics["cost"].inc(summary["cost_usd"])
+
+
+def observe_llm_queue(priority: str, depth: int, waited: Optional[float] = None):
+    """Called by the LLM scheduler when a call of class `priority` joins or leaves its queue."""
+    if _metrics is None:
+        return
+    _metrics["llm_queue_depth"].labels(priority).set(depth)
+    if waited is not None:
+        _metrics["llm_queue_seconds"].labels(priority).observe(waited)
+
+
+def observe_llm_rate_limited():
+    if _metrics is not None:
+        _metrics["llm_rate_limited"].inc()
+
+
+def observe_llm_cache(chain: str, result: str):
+    """Called by the LLM response cache on every lookup; `result` is memory_hits, disk_hits or misses."""
+    if _metrics is not None:
+        _metrics["llm_cache_lookups"].labels(chain, result).inc()
+
+
+def observe_speculation(started: int, used: int, discarded: int, saved: float, wasted: float):
+    """Called by the speculative router once per request."""
+    if _metrics is None:
+        return
+    _metrics["speculative_branches"].labels("started").inc(started)
+    _metrics["speculative_branches"].labels("used").inc(used)
+    _metrics["speculative_branches"].labels("discarded").inc(discarded)
+    _metrics["speculation_saved"].inc(saved)
+    _metrics["speculation_wasted"].inc(wasted)
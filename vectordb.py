@@ -1,40 +1,250 @@
-from langchain_community.document_loaders import WebBaseLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_community.vectorstores import Chroma
-from langchain_huggingface import HuggingFaceEmbeddings
+from contextlib import contextmanager
+from typing import Any
+from langchain_core.retrievers import BaseRetriever
 from data.data_URL import urls
+import hashlib
+import json
+import logging
 import os
+import registry
+from config import RETRIEVER_MODE, RETRIEVER_K, VECTOR_BACKEND, FAISS_INDEX_PATH
+
+logger = logging.getLogger(__name__)
 
 persist_dir = os.getenv("CHROMA_DB_PATH", "./chroma_db")
+# Directory of the store in use; each backend keeps its own manifest.
+index_dir = FAISS_INDEX_PATH if VECTOR_BACKEND == "faiss" else persist_dir
+# The manifest lives next to the index directory and records, per source URL,
+# the hash of the fetched page and the ids (content hashes) of its chunks.
+manifest_path = os.getenv(
+    "CHROMA_MANIFEST_PATH", index_dir.rstrip("/\\") + "_manifest.json"
+)
+# Re-fetch every source and re-embed the chunks that changed.
+refresh_index = os.getenv("CHROMA_REFRESH", "0") == "1"
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def load_manifest() -> dict:
+    if not os.path.exists(manifest_path):
+        return {}
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def index_fingerprint() -> str:
+    """Hash of the manifest; changes whenever the indexed content changes."""
+    if not os.path.exists(manifest_path):
+        return ""
+    with open(manifest_path, "rb") as f:
+        return hashlib.sha256(f.read()).hexdigest()
+
+
+def save_manifest(manifest: dict):
+    tmp_path = manifest_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path)
+
+
+def split_page(url: str, html: str) -> tuple:
+    """
+    Split a page into chunks keyed by the hash of their source and content.
+    Returns (page hash, {chunk id: chunk}); the page hash covers the chunker
+    settings so a settings change re-chunks the page.
+    """
+    from chunking import chunk_page, chunker_signature
+
+    text, chunk_list = chunk_page(url, html)
+    chunks = {content_hash(f"{url}\n{chunk.page_content}"): chunk for chunk in chunk_list}
+    return content_hash(f"{chunker_signature()}\n{text}"), chunks
+
+
+@contextmanager
+def index_lock():
+    """
+    Exclusive lock on the on-disk index while it is opened and synced, so
+    several server worker processes sharing it do not write it at once.
+    """
+    import fcntl
+
+    with open(index_dir.rstrip("/\\") + ".lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def count_chunks(store) -> int:
+    if hasattr(store, "_collection"):
+        return store._collection.count()
+    return store.count()
+
+
+def sync_index(store, page_urls: list, refresh: bool = False) -> dict:
+    """
+    Bring the vector store in line with `page_urls`.
+
+    Only sources that are new (or every source when `refresh` is set) are
+    fetched, with conditional GETs. Chunks whose hash is already indexed are
+    not embedded again and chunks of changed or removed sources are deleted.
+    Chunks that nearly duplicate an indexed chunk of any source are skipped.
+    A source that fails to download keeps its indexed chunks.
+    """
+    from crawler import crawl, parse_and_split
+    from chunking import chunker_signature, NearDuplicateIndex
 
+    manifest = load_manifest()
+    signature = chunker_signature()
 
-loader = WebBaseLoader(urls, bs_get_text_kwargs={"strip": True})
-try:
-    
-    docs = loader.load()
-    if not docs:
-        print("No documents were loaded. Please check the URLs.")
-except Exception as e:
-    print(f"Error loading documents: {e}")
-    docs = []
+    if not manifest and count_chunks(store) > 0:
+        # Store built without a manifest: its ids are unknown and it may hold
+        # duplicates from earlier restarts, so rebuild it from scratch.
+        logger.warning("Index has no manifest, rebuilding it.")
+        store.delete(ids=store.get(include=[])["ids"])
+    elif manifest and count_chunks(store) == 0:
+        # The index directory was wiped but the manifest survived.
+        manifest = {}
 
+    for url in [url for url in manifest if url not in page_urls]:
+        logger.info("Removing chunks of dropped source: %s", url)
+        store.delete(ids=manifest.pop(url)["chunks"])
 
-text_splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-chunks = text_splitter.split_documents(docs) if docs else []
+    def current(url):
+        return url in manifest and manifest[url].get("chunker") == signature
 
-embedding_function = HuggingFaceEmbeddings()
+    # Pages chunked with other settings are re-chunked from the HTML cache.
+    to_fetch = [url for url in page_urls if refresh or not current(url)]
+    results = crawl(to_fetch) if to_fetch else []
+    pages = [
+        (result.url, result.html)
+        for result in results
+        if result.html is not None and not (result.not_modified and current(result.url))
+    ]
+    failed = [result.url for result in results if result.html is None]
+    if failed:
+        logger.warning("%d of %d sources could not be fetched.", len(failed), len(to_fetch))
 
-if not chunks:
-    print("No chunks available for embedding. Please check the document loading process.")
-    vector_store = None  # Ensure vector_store is not defined if chunks are empty
-else:
-    vector_store = Chroma.from_documents(documents=chunks, embedding=embedding_function, persist_directory=persist_dir)
+    duplicates = NearDuplicateIndex()
+    for url, entry in manifest.items():
+        for fingerprint in entry.get("fingerprints", []):
+            duplicates.add(url, int(fingerprint, 16))
 
-if vector_store is not None:
-    retriever = vector_store.as_retriever(search_kwargs={"k": 3})
-else:
-    retriever = None  # Handle the case where vector_store is not defined
+    added, removed, skipped = 0, 0, 0
+    for url, page_hash, page_chunks, fingerprints in parse_and_split(pages):
+        entry = manifest.get(url, {"hash": None, "chunks": []})
+        if entry["hash"] == page_hash:
+            continue
 
+        duplicates.remove(url)
+        chunks = {}
+        for chunk_id, chunk in page_chunks.items():
+            if duplicates.find(fingerprints[chunk_id]) is not None:
+                skipped += 1
+                continue
+            duplicates.add(url, fingerprints[chunk_id])
+            chunks[chunk_id] = chunk
 
+        old_ids = set(entry["chunks"])
+        new_ids = [chunk_id for chunk_id in chunks if chunk_id not in old_ids]
+        stale_ids = [chunk_id for chunk_id in old_ids if chunk_id not in chunks]
+        if new_ids:
+            store.add_documents(documents=[chunks[i] for i in new_ids], ids=new_ids)
+        if stale_ids:
+            store.delete(ids=stale_ids)
+        added += len(new_ids)
+        removed += len(stale_ids)
+        manifest[url] = {
+            "hash": page_hash,
+            "chunks": list(chunks),
+            "fingerprints": [f"{fingerprints[chunk_id]:016x}" for chunk_id in chunks],
+            "chunker": signature,
+        }
+
+    if not hasattr(store, "_collection"):
+        # FaissStore rebuilds its index once per sync, before the manifest points at it.
+        store.persist()
+    if manifest != load_manifest():
+        save_manifest(manifest)
+    if added or removed:
+        logger.info("Index updated: %d chunks embedded, %d chunks deleted.", added, removed)
+    if skipped:
+        logger.info("Skipped %d near-duplicate chunks.", skipped)
+    return manifest
+
+
+@registry.register("embedding_function")
+def get_embedding_function():
+    from embeddings import CachedEmbeddings
+
+    return CachedEmbeddings()
+
+
+def cosine_relevance(distance: float) -> float:
+    """Chroma's default space is squared L2; on unit-length embeddings 1 - d/2 is the cosine similarity."""
+    return 1.0 - distance / 2.0
+
+
+class ScoredRetriever(BaseRetriever):
+    """Dense retriever that keeps each hit's relevance score in `metadata["relevance_score"]`."""
+
+    vector_store: Any
+    k: int = 3
+
+    def _get_relevant_documents(self, query: str, *, run_manager=None) -> list:
+        documents = []
+        for doc, score in self.vector_store.similarity_search_with_relevance_scores(query, k=self.k):
+            doc.metadata["relevance_score"] = score
+            documents.append(doc)
+        return documents
+
+
+@registry.register("vector_store")
+def get_vector_store():
+    """Open the persisted store and sync it with the source URLs; None if it ends up empty."""
+    # Workers that wait here find the index already synced by the first one.
+    with index_lock():
+        if VECTOR_BACKEND == "faiss":
+            from faiss_store import FaissStore
+
+            vector_store = FaissStore(FAISS_INDEX_PATH, get_embedding_function())
+        else:
+            from langchain_community.vectorstores import Chroma
+
+            vector_store = Chroma(
+                persist_directory=persist_dir,
+                embedding_function=get_embedding_function(),
+                relevance_score_fn=cosine_relevance,
+            )
+        sync_index(vector_store, urls, refresh=refresh_index)
+
+    if count_chunks(vector_store) == 0:
+        logger.error("No chunks available for embedding. Please check the document loading process.")
+        return None
+    return vector_store
+
+
+@registry.register("retriever")
 def get_retriever():
-    return retriever
+    vector_store = get_vector_store()
+    if vector_store is None:
+        return None  # Handle the case where vector_store is not defined
+    if RETRIEVER_MODE == "hybrid":
+        from hybrid_retriever import get_hybrid_retriever
+
+        return get_hybrid_retriever(vector_store)
+    return ScoredRetriever(vector_store=vector_store, k=RETRIEVER_K)
+
+
+def __getattr__(name):
+    # Keep `from vectordb import retriever` working without building anything at import.
+    if name == "retriever":
+        return get_retriever()
+    if name == "vector_store":
+        return get_vector_store()
+    if name == "embedding_function":
+        return get_embedding_function()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")